@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Finite-difference check of the analytic chi^2 gradients used by L-BFGS-B.
+
+For each fused value-and-gradient objective
+
+    fdb_fit.chi2_model_and_grad        (rotmod and kernel models)
+    fdb_fit_multi.chi2_multi_and_grad
+    fdb2_fit.chi2_v2_and_grad
+    fdb2_fit_multi.total_chi2_multi_and_grad
+
+the gradient is compared with central differences at random points inside
+the fit bounds, and the value with the plain chi^2 function.  Parameters
+pinned by their bounds are skipped.  Exits non-zero if any relative error
+exceeds --rtol.
+
+Usage:
+  python scripts/check_gradients.py build/NGC2403_sparc.csv build/DDO170_sparc.csv
+  python scripts/check_gradients.py --multi      # also the joint objectives (reads build/)
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from functools import partial
+from typing import Callable, List, Sequence, Tuple
+
+import numpy as np
+
+
+def check_gradient(
+    fun_and_grad: Callable[[np.ndarray], Tuple[float, np.ndarray]],
+    fun: Callable[[np.ndarray], float],
+    x: np.ndarray,
+    bounds: Sequence[Tuple[float, float]],
+    rel_step: float = 1e-6,
+) -> Tuple[float, float]:
+    """
+    (value error, max gradient error) at x, both relative.
+
+    The gradient error of component i is |g_i - fd_i| / max(|fd_i|, scale)
+    with scale = 1e-6 * max(|g|_inf, 1), so that components that are
+    numerically zero do not blow up the ratio.  Steps are shrunk to stay inside
+    the bounds (one-sided at a bound).
+    """
+    x = np.asarray(x, dtype=float)
+    f, g = fun_and_grad(x)
+    f_ref = fun(x)
+    val_err = abs(f - f_ref) / max(abs(f_ref), 1.0)
+    fd = np.zeros_like(x)
+    for i, (lo, hi) in enumerate(bounds):
+        if hi <= lo:
+            continue
+        h = rel_step * max(abs(x[i]), hi - lo)
+        up = min(h, hi - x[i])
+        dn = min(h, x[i] - lo)
+        xp = x.copy()
+        xm = x.copy()
+        xp[i] += up
+        xm[i] -= dn
+        fd[i] = (fun(xp) - fun(xm)) / (up + dn)
+    free = np.array([hi > lo for lo, hi in bounds])
+    scale = 1e-6 * max(np.max(np.abs(g[free])) if free.any() else 0.0, 1.0)
+    grad_err = np.max(np.abs(g - fd)[free] / np.maximum(np.abs(fd[free]), scale)) if free.any() else 0.0
+    return float(val_err), float(grad_err)
+
+
+def random_points(x0: np.ndarray, bounds: Sequence[Tuple[float, float]], n: int, seed: int = 0) -> List[np.ndarray]:
+    """x0 plus n uniform points inside the bounds (pinned entries kept at their bound)."""
+    rng = np.random.default_rng(seed)
+    lo = np.array([b[0] for b in bounds], dtype=float)
+    hi = np.array([b[1] for b in bounds], dtype=float)
+    pts = [np.clip(np.asarray(x0, dtype=float), lo, hi)]
+    for _ in range(n):
+        pts.append(lo + rng.random(lo.size) * (hi - lo))
+    return pts
+
+
+def run_check(name: str, fun_and_grad, fun, x0, bounds, n_points: int, rtol: float) -> bool:
+    worst_val = worst_grad = 0.0
+    for x in random_points(x0, bounds, n_points):
+        f = fun(x)
+        if not np.isfinite(f) or f >= 1e29:
+            continue
+        v, g = check_gradient(fun_and_grad, fun, x, bounds)
+        worst_val = max(worst_val, v)
+        worst_grad = max(worst_grad, g)
+    ok = worst_val <= rtol and worst_grad <= rtol
+    print(f"{'ok  ' if ok else 'FAIL'} {name:40s} value {worst_val:.1e}  gradient {worst_grad:.1e}")
+    return ok
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Check analytic chi^2 gradients against finite differences.")
+    ap.add_argument("sparc_csv", nargs="*", help="galaxy CSVs for the single-galaxy objectives")
+    ap.add_argument("--multi", action="store_true", help="also check the joint multi-galaxy objectives")
+    ap.add_argument("--points", type=int, default=8, help="random points per objective")
+    ap.add_argument("--rtol", type=float, default=1e-4)
+    args = ap.parse_args()
+
+    import fdb_fit
+    import fdb2_fit
+
+    ok = True
+    for path in args.sparc_csv:
+        for model in ("rotmod", "kernel"):
+            prob = fdb_fit.prepare_fit(path, model=model)
+            kw = prob.objective_kwargs()
+            ok &= run_check(
+                f"chi2_model[{prob.tag}, {model}]",
+                partial(fdb_fit.chi2_model_and_grad, **kw),
+                partial(fdb_fit.chi2_model, **kw),
+                prob.x0,
+                prob.bounds,
+                args.points,
+                args.rtol,
+            )
+        tag, g = fdb2_fit.prepare_galaxy_v2(path)
+        ok &= run_check(
+            f"chi2_v2[{tag}]",
+            partial(fdb2_fit.chi2_v2_and_grad, g=fdb2_fit.FitContext.from_galaxy(g)),
+            partial(fdb2_fit.chi2_v2, g=g),
+            np.array([1e4]),
+            [(1.0, 5e4)],
+            args.points,
+            args.rtol,
+        )
+
+    if args.multi:
+        import fdb_fit_multi
+        import fdb2_fit_multi
+
+        gals = fdb_fit_multi.load_galaxies(fdb_fit_multi.DEFAULT_GALAXIES)
+        x0, bounds = fdb_fit_multi.initial_guess(len(gals))
+        ok &= run_check(
+            "chi2_multi",
+            partial(fdb_fit_multi.chi2_multi_and_grad, gals=gals),
+            partial(fdb_fit_multi.chi2_multi, gals=gals),
+            x0,
+            bounds,
+            args.points,
+            args.rtol,
+        )
+        galaxies = fdb2_fit_multi.load_galaxies()
+        x0, bounds = fdb2_fit_multi.initial_guess(galaxies)
+        ok &= run_check(
+            "total_chi2_multi",
+            partial(fdb2_fit_multi.total_chi2_multi_and_grad, galaxies=fdb2_fit_multi.fit_contexts(galaxies)),
+            partial(fdb2_fit_multi.total_chi2_multi, galaxies=galaxies),
+            x0,
+            bounds,
+            args.points,
+            args.rtol,
+        )
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 import argparse
 import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
 from pathlib import Path
 
 import numpy as np
+from scipy.special import erf
 
 from helpers_sparc import glob_rotmods, load_sparc_catalog, parse_rotmod_file
 
@@ -34,13 +39,58 @@ def load_btfr(btfr_json: str) -> float:
     return float(data["A_BTFR_median"])
 
 
-def S_switch(r_kpc, lambda_kpc):
-    lam = max(lambda_kpc, 1e-3)
-    return 1.0 - np.exp(-np.asarray(r_kpc) / lam)
+def load_btfr_unc(btfr_json: str) -> float:
+    with open(btfr_json) as f:
+        data = json.load(f)
+    return float(data.get("A_BTFR_median_unc", 0.0))
+
+
+# Switch kernels S(x; p), x = r / lambda_C, S(0) = 0, S -> 1 for x >> 1.
+# p is a shape parameter (sharpness / width); "exp" with p = 1 is the
+# original 1 - exp(-r/lambda).  Every kernel broadcasts over (x, p).
+def _switch_exp(x, p):
+    return 1.0 - np.exp(-(x ** p))
+
+
+def _switch_erf(x, p):
+    return erf(x ** p)
+
+
+def _switch_tanh(x, p):
+    return np.tanh(x ** p)
+
+
+def _switch_logistic(x, p):
+    # logistic step at r = lambda_C with width p * lambda_C, shifted/rescaled to S(0) = 0
+    s0 = 1.0 / (1.0 + np.exp(1.0 / p))
+    with np.errstate(over="ignore"):
+        s = 1.0 / (1.0 + np.exp(-(x - 1.0) / p))
+    return (s - s0) / (1.0 - s0)
+
+
+def _switch_power(x, p):
+    y = x ** p
+    return y / (1.0 + y)
+
 
+# name -> (kernel, default shape grid)
+SWITCH_FAMILIES = {
+    "exp": (_switch_exp, (1.0,)),
+    "erf": (_switch_erf, (1.0, 2.0)),
+    "tanh": (_switch_tanh, (1.0, 2.0)),
+    "logistic": (_switch_logistic, (0.25, 0.5)),
+    "power": (_switch_power, (1.0, 2.0, 4.0)),
+}
 
-def v_model_sq(vbar_sq, vflat, r_kpc, lambda_kpc):
-    return vbar_sq + (vflat ** 2) * S_switch(r_kpc, lambda_kpc)
+
+def S_switch(r_kpc, lambda_kpc, family="exp", shape=1.0):
+    lam = np.maximum(lambda_kpc, 1e-3)
+    kernel, _ = SWITCH_FAMILIES[family]
+    return kernel(np.asarray(r_kpc) / lam, shape)
+
+
+def v_model_sq(vbar_sq, vflat, r_kpc, lambda_kpc, family="exp", shape=1.0):
+    return vbar_sq + (vflat ** 2) * S_switch(r_kpc, lambda_kpc, family, shape)
 
 
 def galaxy_residual(df, vflat, lambda_kpc, error_floor):
@@ -82,51 +132,339 @@ def prepare_galaxies(rotmod_dir, catalog_path, A_btfr):
     return galaxies
 
 
+@dataclass
+class PackedGalaxies:
+    """
+    Rotation curves padded to (n_gal, n_max); pad entries have mask False.
+    sw = sqrt(w / median(w)) is the per-point scaling of robust_cost.
+    """
+    names: list
+    vflat: np.ndarray    # (n_gal,)
+    r: np.ndarray
+    vbar_sq: np.ndarray
+    v_obs: np.ndarray
+    sw: np.ndarray
+    mask: np.ndarray
+    n: np.ndarray        # valid points per galaxy
+
+
+def pack_galaxies(galaxies, error_floor):
+    n = np.array([len(df) for _, _, df in galaxies], dtype=int)
+    shape = (len(galaxies), int(n.max()) if len(n) else 0)
+    r, vbar_sq, v_obs, sw = (np.zeros(shape) for _ in range(4))
+    mask = np.zeros(shape, dtype=bool)
+    for i, (_, _, df) in enumerate(galaxies):
+        k = n[i]
+        e = np.maximum(df["e_obs"].fillna(error_floor).values, error_floor)
+        w = 1.0 / (e ** 2)
+        r[i, :k] = df["r_kpc"].values
+        vbar_sq[i, :k] = (df["v_gas"] ** 2 + df["v_disk"] ** 2 + df["v_bulge"] ** 2).values
+        v_obs[i, :k] = df["v_obs"].values
+        sw[i, :k] = np.sqrt(w / np.median(w)) if k else 0.0
+        mask[i, :k] = True
+    names = [name for name, _, _ in galaxies]
+    vflat = np.array([vflat for _, vflat, _ in galaxies], dtype=float)
+    return PackedGalaxies(names, vflat, r, vbar_sq, v_obs, sw, mask, n)
+
+
+def masked_median(a, n):
+    """
+    Median over the last axis of the first n[i] entries of each row (rows
+    along axis 0; a is (n_gal, ..., n_max) with pads already at +inf).
+    Uses np.partition at the distinct middle ranks instead of a full sort.
+    """
+    lo = np.maximum(n - 1, 0) // 2
+    hi = n // 2
+    ranks = np.unique(np.concatenate([lo, hi]))
+    part = np.partition(a, ranks, axis=-1)
+    shape = (len(n),) + (1,) * (a.ndim - 1)
+    a_lo = np.take_along_axis(part, lo.reshape(shape), axis=-1)[..., 0]
+    a_hi = np.take_along_axis(part, hi.reshape(shape), axis=-1)[..., 0]
+    return 0.5 * (a_lo + a_hi)
+
+
+def robust_cost_batch(packed, S, vflat_sq_scale=1.0):
+    """
+    robust_cost of every galaxy for a batch of switch profiles S, shape
+    (n_gal, ..., n_max) (e.g. one lambda_C per middle index) -> (n_gal, ...).
+    vflat_sq_scale multiplies v_flat^2 and broadcasts against the middle axes
+    (v_flat^2 = sqrt(A_BTFR Mbar), so an A_BTFR axis is sqrt(A / A_0)).
+    """
+    extra = (slice(None),) + (None,) * (S.ndim - 2) + (slice(None),)
+    vflat_sq = (packed.vflat ** 2).reshape((-1,) + (1,) * (S.ndim - 2)) * vflat_sq_scale
+    vmod = np.sqrt(packed.vbar_sq[extra] + vflat_sq[..., None] * S)
+    scaled = (packed.v_obs[extra] - vmod) * packed.sw[extra]
+    pad = ~packed.mask[extra]
+    scaled = np.where(pad, np.inf, scaled)
+    med = masked_median(scaled, packed.n)
+    dev = np.where(pad, np.inf, np.abs(scaled - med[..., None]))
+    cost = 1.4826 * masked_median(dev, packed.n)
+    cost[packed.n == 0] = np.inf
+    return cost
+
+
+def misfit_matrix(packed, grid, family="exp", shape=1.0):
+    """robust_cost of every galaxy at every lambda_C: (n_gal, n_grid)."""
+    grid = np.asarray(grid, dtype=float)
+    return robust_cost_batch(packed, S_switch(packed.r[:, None, :], grid[None, :, None], family, shape))
+
+
+def family_misfit(packed, grid, families, shapes=None):
+    """
+    Per-galaxy misfit of several switch families on a shared lambda_C grid.
+    Each family is evaluated over its whole (shape x lambda_C x r) block at
+    once.  Returns {family: (shape values, M of shape (n_gal, n_shape, n_grid))}.
+    """
+    grid = np.asarray(grid, dtype=float)
+    out = {}
+    for fam in families:
+        p = np.asarray(shapes if shapes is not None else SWITCH_FAMILIES[fam][1], dtype=float)
+        S = S_switch(packed.r[:, None, None, :], grid[None, None, :, None], fam, p[None, :, None, None])
+        out[fam] = (p, robust_cost_batch(packed, S))
+    return out
+
+
+def misfit_surface(packed_floors, grid, a_ratio, family="exp", shape=1.0, block=4_000_000):
+    """
+    Sample misfit (median over galaxies of robust_cost) on the
+    (error floor x A_BTFR x lambda_C) grid: packed_floors holds one
+    PackedGalaxies per error floor, a_ratio = A_BTFR / A_0 of the v_flat used
+    when packing.  The switch profiles are computed once per floor; A_BTFR
+    blocks are sized to keep the residual cube under `block` elements.
+    """
+    grid = np.asarray(grid, dtype=float)
+    a_ratio = np.asarray(a_ratio, dtype=float)
+    out = np.empty((len(packed_floors), len(a_ratio), len(grid)))
+    for f, packed in enumerate(packed_floors):
+        S = S_switch(packed.r[:, None, None, :], grid[None, None, :, None], family, shape)
+        step = max(1, block // max(S.size, 1))
+        for a0 in range(0, len(a_ratio), step):
+            scale = np.sqrt(a_ratio[a0 : a0 + step])[:, None]
+            out[f, a0 : a0 + step] = np.median(robust_cost_batch(packed, S, scale), axis=0)
+    return out
+
+
+def marginal_interval(grid, surface, weights, n_fine=2000):
+    """
+    lambda_C interval with the A_BTFR (and error-floor) uncertainty
+    propagated: each row of `surface` (rows = (floor, A) nodes, flattened)
+    contributes its curvature fit as a split normal in log10(lambda_C)
+    with the node weight.  Rows whose minimum sits on the first or last grid
+    point, whose vertex falls outside the grid, or without a usable
+    curvature fit carry no interval and are left out of the mixture.
+    Returns the 16/50/84 percentiles of the mixture (NaN if no row is
+    usable), the per-row (lo, hat, hi) (curvature_interval fallback for the
+    excluded rows) and the per-row status: 0 used, 1 boundary, 2 no fit.
+    """
+    rows = np.empty((len(surface), 3))
+    status = np.zeros(len(surface), dtype=int)
+    for k, c in enumerate(surface):
+        i = int(np.argmin(c))
+        fit = curvature_fit(grid, c, i)
+        rows[k] = curvature_interval(grid, c, i) if fit is None else fit
+        if i in (0, len(grid) - 1) or not grid[0] <= rows[k, 1] <= grid[-1]:
+            status[k] = 1
+        elif fit is None:
+            status[k] = 2
+    used = status == 0
+    if not np.any(used):
+        return (float("nan"),) * 3, rows, status
+    x_lo, x0, x_hi = np.log10(rows[used]).T
+    s_lo = np.maximum(x0 - x_lo, 1e-6)
+    s_hi = np.maximum(x_hi - x0, 1e-6)
+    x = np.linspace(np.log10(grid[0]) - 1.0, np.log10(grid[-1]) + 1.0, n_fine)
+    # split-normal CDF, normalised so both halves carry half of the mass
+    z = x[None, :] - x0[:, None]
+    sig = np.where(z < 0, s_lo[:, None], s_hi[:, None])
+    cdf = 0.5 * (1.0 + erf(z / (np.sqrt(2.0) * sig)))
+    w = np.asarray(weights, dtype=float)[used]
+    mix = (w / np.sum(w)) @ cdf
+    lo, med, hi = (10 ** float(np.interp(q, mix, x)) for q in (0.16, 0.5, 0.84))
+    return (lo, med, hi), rows, status
+
+
+class AdaptiveSweep:
+    """
+    Adaptive lambda_C search for one switch kernel.  Per-galaxy misfit
+    columns are memoized by log10(lambda_C); each round evaluates all new
+    points in one misfit_matrix batch.
+
+    run(): coarse log grid, then repeated bisection of the brackets around
+    the lowest local minima (and of non-convex stretches of the cost curve
+    below the median cost) until the brackets are narrower than xtol dex or
+    max_eval is reached.  The interval comes from curvature_interval on five
+    points at the reference grid spacing around the refined minimum.
+    """
+
+    def __init__(self, packed, family="exp", shape=1.0):
+        self.packed = packed
+        self.family = family
+        self.shape = shape
+        self._cols = {}
+
+    @property
+    def n_eval(self):
+        return len(self._cols)
+
+    def evaluate(self, x_log10):
+        new = sorted({round(float(x), 12) for x in x_log10} - set(self._cols))
+        if new:
+            M = misfit_matrix(self.packed, 10.0 ** np.array(new), self.family, self.shape)
+            for k, x in enumerate(new):
+                self._cols[x] = M[:, k]
+
+    def matrix(self):
+        """(evaluated lambda_C, sorted; per-galaxy misfit (n_gal, n_eval))."""
+        xs = sorted(self._cols)
+        return 10.0 ** np.array(xs), np.stack([self._cols[x] for x in xs], axis=1)
+
+    def _proposals(self, x, c, xtol, n_candidates):
+        new = set()
+        interior = [i for i in range(len(c))
+                    if (i == 0 or c[i] <= c[i - 1]) and (i == len(c) - 1 or c[i] <= c[i + 1])]
+        for i in sorted(interior, key=lambda i: c[i])[:n_candidates]:
+            for j in (i - 1, i + 1):
+                if 0 <= j < len(x) and abs(x[j] - x[i]) > xtol:
+                    new.add(0.5 * (x[i] + x[j]))
+        level = np.median(c)
+        for i in range(1, len(c) - 1):
+            if c[i] > level:
+                continue
+            # divided second difference < 0: concave (non-convex) stretch
+            d2 = (c[i + 1] - c[i]) / (x[i + 1] - x[i]) - (c[i] - c[i - 1]) / (x[i] - x[i - 1])
+            if d2 < 0:
+                for j in (i - 1, i + 1):
+                    if abs(x[j] - x[i]) > 8 * xtol:
+                        new.add(0.5 * (x[i] + x[j]))
+        return new
+
+    def run(self, lam_min, lam_max, n_coarse=9, xtol=1e-3, max_eval=80, n_candidates=3, ref_step=None):
+        x_lo, x_hi = np.log10(lam_min), np.log10(lam_max)
+        self.evaluate(np.linspace(x_lo, x_hi, n_coarse))
+        while self.n_eval < max_eval:
+            grid, M = self.matrix()
+            new = self._proposals(np.log10(grid), np.median(M, axis=0), xtol, n_candidates)
+            if not new:
+                break
+            # closest to the current minimum first when the budget runs out
+            x_best = np.log10(grid[int(np.argmin(np.median(M, axis=0)))])
+            self.evaluate(sorted(new, key=lambda x: abs(x - x_best))[: max_eval - self.n_eval])
+        grid, M = self.matrix()
+        i = int(np.argmin(np.median(M, axis=0)))
+        step = ref_step if ref_step is not None else (x_hi - x_lo) / (n_coarse - 1)
+        stencil = np.log10(grid[i]) + step * np.arange(-2, 3)
+        stencil = stencil[(stencil >= x_lo - 1e-12) & (stencil <= x_hi + 1e-12)]
+        self.evaluate(stencil)
+        cols = np.stack([self._cols[round(float(x), 12)] for x in stencil], axis=1)
+        c = np.median(cols, axis=0)
+        interval = curvature_interval(10.0 ** stencil, c, int(np.argmin(c)))
+        grid, M = self.matrix()
+        return grid, M, interval
+
+
+def costs_from_matrix(M):
+    costs = np.median(M, axis=0)
+    return costs, int(np.argmin(costs))
+
+
 def sweep_lambda(galaxies, grid, error_floor):
-    costs = []
-    for lam in grid:
-        c = []
-        for _, vflat, df in galaxies:
-            resid, w = galaxy_residual(df, vflat, lam, error_floor)
-            c.append(robust_cost(resid, w))
-        costs.append(float(np.median(c)))
-    costs = np.array(costs)
-    idx = int(np.argmin(costs))
-    return costs, idx
+    return costs_from_matrix(misfit_matrix(pack_galaxies(galaxies, error_floor), grid))
 
 
-def curvature_interval(grid, costs, idx):
+def curvature_fit(grid, costs, idx):
+    """
+    Parabola in log10(lambda_C) through the five points around idx:
+    (lo, hat, hi), or None when it has no usable curvature (fewer than three
+    points, a <= 0 or a perfect fit).
+    """
     j0 = max(idx - 2, 0)
     j1 = min(idx + 3, len(grid))
     x = np.log10(grid[j0:j1])
     y = costs[j0:j1]
     if len(x) < 3:
-        lam = grid[idx]
-        return lam / 2, lam, lam * 2
+        return None
     A = np.vstack([x ** 2, x, np.ones_like(x)]).T
     a, b, c = np.linalg.lstsq(A, y, rcond=None)[0]
     if a <= 0:
-        lam = grid[idx]
-        return lam / 2, lam, lam * 2
+        return None
     x0 = -b / (2 * a)
-    lam_hat = 10 ** x0
-    y_hat = a * x0 * x0 + b * x0 + c
     scatter = np.std(y - (a * x ** 2 + b * x + c))
     if scatter <= 0:
-        return lam_hat / 2, lam_hat, lam_hat * 2
+        return None
     dx = np.sqrt(scatter / a)
-    return 10 ** (x0 - dx), lam_hat, 10 ** (x0 + dx)
-
-
-def bootstrap_lambda(galaxies, grid, error_floor, n_boot=200, seed=1234):
-    rng = np.random.default_rng(seed)
-    samples = []
-    for _ in range(n_boot):
-        idx = rng.integers(0, len(galaxies), len(galaxies))
-        sel = [galaxies[i] for i in idx]
-        costs, imin = sweep_lambda(sel, grid, error_floor)
-        samples.append(float(grid[imin]))
-    samples = np.array(samples)
+    return 10 ** (x0 - dx), 10 ** x0, 10 ** (x0 + dx)
+
+
+def curvature_interval(grid, costs, idx):
+    fit = curvature_fit(grid, costs, idx)
+    if fit is None:
+        lam = grid[idx]
+        return lam / 2, lam, lam * 2
+    return fit
+
+
+# Resampling.  Every global cost is a median over rows of the per-galaxy
+# misfit matrix M, so a bootstrap / k-fold / leave-one-out replicate is just a
+# row selection of M.  Bootstrap replicates come in fixed-size blocks, each
+# with its own SeedSequence-spawned stream, so the samples do not depend on
+# n_jobs.
+BOOT_BLOCK = 256
+
+_RESAMPLE_M = None
+
+
+def bootstrap_block(M, seed_seq, n):
+    """argmin grid index of n bootstrap replicates (rows of M drawn with replacement)."""
+    rng = np.random.default_rng(seed_seq)
+    idx = rng.integers(0, M.shape[0], (n, M.shape[0]))
+    return np.argmin(np.median(M[idx], axis=1), axis=1)
+
+
+def _init_resample(M):
+    global _RESAMPLE_M
+    _RESAMPLE_M = M
+
+
+def _bootstrap_task(seed_seq, n):
+    return bootstrap_block(_RESAMPLE_M, seed_seq, n)
+
+
+def bootstrap_indices(M, n_boot, seed=1234, n_jobs=1, done=(), on_block=None):
+    """
+    argmin grid indices of n_boot replicates.  `done` holds the results of
+    blocks already computed (resume); on_block(parts) is called after every
+    further block, in block order.
+    """
+    sizes = [min(BOOT_BLOCK, n_boot - k) for k in range(0, n_boot, BOOT_BLOCK)]
+    streams = np.random.SeedSequence(seed).spawn(len(sizes))
+    parts = list(done)
+    todo = range(len(parts), len(sizes))
+    if n_jobs <= 1 or len(todo) <= 1:
+        for k in todo:
+            parts.append(bootstrap_block(M, streams[k], sizes[k]))
+            if on_block is not None:
+                on_block(parts)
+    else:
+        import concurrent.futures as cf
+
+        with cf.ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_resample, initargs=(M,)) as ex:
+            futures = [ex.submit(_bootstrap_task, streams[k], sizes[k]) for k in todo]
+            for fut in futures:
+                parts.append(fut.result())
+                if on_block is not None:
+                    on_block(parts)
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=int)
+
+
+def split_blocks(idx):
+    """Inverse of the concatenation in bootstrap_indices (full blocks of BOOT_BLOCK)."""
+    return [idx[k : k + BOOT_BLOCK] for k in range(0, len(idx), BOOT_BLOCK)]
+
+
+def bootstrap_lambda(galaxies, grid, error_floor, n_boot=200, seed=1234, M=None, n_jobs=1, done=(), on_block=None):
+    if M is None:
+        M = misfit_matrix(pack_galaxies(galaxies, error_floor), grid)
+    samples = np.asarray(grid)[bootstrap_indices(M, n_boot, seed, n_jobs, done, on_block)]
     return {
         "lambdaC_kpc_bootstrap_lo": float(np.percentile(samples, 16)),
         "lambdaC_kpc_bootstrap_hi": float(np.percentile(samples, 84)),
@@ -134,6 +472,97 @@ def bootstrap_lambda(galaxies, grid, error_floor, n_boot=200, seed=1234):
     }
 
 
+# Checkpoints (.npz): the main sweep (grid, per-galaxy misfit M, interval,
+# family summary) and the finished bootstrap blocks.  Bootstrap block k always
+# uses the k-th SeedSequence child, so the RNG state is the block count and a
+# resumed run reproduces the uninterrupted output exactly.  `config` (the
+# result-relevant arguments and galaxy list) must match on --resume.
+def save_checkpoint(path, **arrays):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix="." + path.stem + ".", suffix=".npz")
+    with os.fdopen(fd, "wb") as fh:
+        np.savez(fh, **arrays)
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path, config):
+    if not Path(path).exists():
+        return None
+    with np.load(path, allow_pickle=False) as z:
+        ckpt = {k: z[k] for k in z.files}
+    if str(ckpt.get("config")) != config:
+        raise SystemExit(f"{path}: checkpoint was written with different settings; remove it or drop --resume")
+    return ckpt
+
+
+def kfold_splits(n_gal, k, seed=1234):
+    """Test-row index arrays of k folds over a seeded permutation (k = n_gal: leave-one-out)."""
+    if k >= n_gal:
+        return [np.array([i]) for i in range(n_gal)]
+    perm = np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0]).permutation(n_gal)
+    return np.array_split(perm, k)
+
+
+def kfold_lambda(M, grid, folds):
+    """
+    For each fold: lambda_C from the training rows and the held-out median
+    misfit at that lambda_C.  Returns (lambda per fold, test misfit per fold).
+    """
+    lams, test = [], []
+    for rows in folds:
+        train = np.ones(M.shape[0], dtype=bool)
+        train[rows] = False
+        _, imin = costs_from_matrix(M[train])
+        lams.append(float(grid[imin]))
+        test.append(float(np.median(M[rows, imin])))
+    return np.array(lams), np.array(test)
+
+
+def main_sweep(args, packed, grid, families, shapes):
+    """
+    Family comparison on the fixed grid and the main lambda_C sweep (first
+    family at its best shape; adaptive with --adaptive).  Returns (grid, M,
+    (lo, hat, hi), switch summary, family, shape, number of evaluated lambda_C).
+    """
+    # (n_gal x n_shape x n_grid) robust misfit per family, computed once; an
+    # adaptive run with a single kernel does not need the fixed grid at all
+    single = len(families) == 1 and len(shapes or SWITCH_FAMILIES[families[0]][1]) == 1
+    fam_M = {} if args.adaptive and single else family_misfit(packed, grid, families, shapes)
+    switch = {}
+    for fam, (p, Mf) in fam_M.items():
+        curves = np.median(Mf, axis=0)
+        j, i = np.unravel_index(int(np.argmin(curves)), curves.shape)
+        lo, hat, hi = curvature_interval(grid, curves[j], i)
+        switch[fam] = {
+            "shape": p.tolist(),
+            "misfit": curves.tolist(),
+            "best_shape": float(p[j]),
+            "misfit_min": float(curves[j, i]),
+            "lambdaC_kpc_hat": hat,
+            "lambdaC_kpc_lo": lo,
+            "lambdaC_kpc_hi": hi,
+        }
+    # main estimate: first family at its best shape
+    fam0 = families[0]
+    if fam0 in switch:
+        shape0 = switch[fam0]["best_shape"]
+    else:
+        shape0 = float((shapes or SWITCH_FAMILIES[fam0][1])[0])
+    if args.adaptive:
+        ref_step = np.log10(args.grid_max_kpc / args.grid_min_kpc) / (args.n_grid - 1)
+        sweep = AdaptiveSweep(packed, fam0, shape0)
+        grid, M, interval = sweep.run(
+            args.grid_min_kpc, args.grid_max_kpc, xtol=args.adaptive_xtol,
+            max_eval=args.adaptive_max_eval, ref_step=ref_step,
+        )
+        return grid, M, interval, switch, fam0, shape0, sweep.n_eval
+    p0, M0 = fam_M[fam0]
+    M = M0[:, p0.tolist().index(shape0), :]
+    costs, idx = costs_from_matrix(M)
+    return grid, M, curvature_interval(grid, costs, idx), switch, fam0, shape0, len(grid)
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--rotmod_dir", required=True)
@@ -145,6 +574,27 @@ def main():
     ap.add_argument("--error_floor", type=float, default=5.0)
     ap.add_argument("--n_boot", type=int, default=200)
     ap.add_argument("--crossfold", action="store_true", help="run simple 2-fold diagnostic")
+    ap.add_argument("--kfold", type=int, default=0, help="k-fold cross-validation over galaxies (k >= 2)")
+    ap.add_argument("--loo", action="store_true", help="leave-one-galaxy-out lambda_C estimates")
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--n_jobs", type=int, default=1, help="processes for the bootstrap")
+    ap.add_argument("--switch", default="exp",
+                    help="comma-separated switch families (%s) or 'all'; the first one sets the main estimate"
+                         % ",".join(SWITCH_FAMILIES))
+    ap.add_argument("--switch_shapes", default=None,
+                    help="comma-separated shape parameters for every family (default: per-family grid)")
+    ap.add_argument("--n_abtfr", type=int, default=0,
+                    help="A_BTFR grid points for the joint (lambda_C, A_BTFR) surface (0: off)")
+    ap.add_argument("--abtfr_nsigma", type=float, default=3.0, help="A_BTFR grid half-width in sigma")
+    ap.add_argument("--error_floors", default=None,
+                    help="comma-separated error floors for an extra surface axis (default: --error_floor)")
+    ap.add_argument("--adaptive", action="store_true",
+                    help="adaptive lambda_C refinement instead of the fixed --n_grid grid")
+    ap.add_argument("--adaptive_xtol", type=float, default=1e-3, help="bracket width in dex for --adaptive")
+    ap.add_argument("--adaptive_max_eval", type=int, default=80, help="lambda_C evaluations for --adaptive")
+    ap.add_argument("--checkpoint", default=None, help="resumable .npz checkpoint of the sweep and bootstrap")
+    ap.add_argument("--checkpoint_every", type=float, default=30.0, help="seconds between bootstrap checkpoints")
+    ap.add_argument("--resume", action="store_true", help="continue from --checkpoint if it exists")
     ap.add_argument("--out_json", required=True)
     ap.add_argument("--out_plot", default=None)
     args = ap.parse_args()
@@ -152,8 +602,50 @@ def main():
     A_btfr = load_btfr(args.btfr_json)
     galaxies = prepare_galaxies(args.rotmod_dir, args.catalog, A_btfr)
     grid = np.geomspace(args.grid_min_kpc, args.grid_max_kpc, args.n_grid)
-    costs, idx = sweep_lambda(galaxies, grid, args.error_floor)
-    lam_lo, lam_hat, lam_hi = curvature_interval(grid, costs, idx)
+    # the family curves, resampling and the A_BTFR surface stay on this fixed
+    # grid even when --adaptive replaces `grid`: their argmins and curvature
+    # fits assume the reference spacing, not the clustered adaptive points
+    ref_grid = grid
+    families = list(SWITCH_FAMILIES) if args.switch == "all" else [f.strip() for f in args.switch.split(",")]
+    for fam in families:
+        if fam not in SWITCH_FAMILIES:
+            ap.error(f"unknown switch family {fam!r}")
+    shapes = [float(v) for v in args.switch_shapes.split(",")] if args.switch_shapes else None
+    skip = {"out_json", "out_plot", "checkpoint", "checkpoint_every", "resume", "n_jobs"}
+    config = json.dumps(
+        {"args": {k: v for k, v in sorted(vars(args).items()) if k not in skip},
+         "galaxies": [name for name, _, _ in galaxies]},
+        sort_keys=True,
+    )
+    ckpt = load_checkpoint(args.checkpoint, config) if args.checkpoint and args.resume else None
+    if ckpt is not None:
+        grid, M = ckpt["grid"], ckpt["M"]
+        lam_lo, lam_hat, lam_hi = (float(v) for v in ckpt["interval"])
+        switch = json.loads(str(ckpt["switch"]))
+        fam0, shape0, n_eval = families[0], float(ckpt["shape0"]), int(ckpt["n_eval"])
+        print(f"[resume] {args.checkpoint}: sweep done, {int(ckpt['boot_blocks'])} bootstrap blocks")
+    else:
+        grid, M, (lam_lo, lam_hat, lam_hi), switch, fam0, shape0, n_eval = main_sweep(
+            args, pack_galaxies(galaxies, args.error_floor), ref_grid, families, shapes
+        )
+        ckpt = {"boot_idx": np.zeros(0, dtype=int), "boot_blocks": np.array(0)}
+    stage = {
+        "config": np.array(config),
+        "grid": grid,
+        "M": M,
+        "interval": np.array([lam_lo, lam_hat, lam_hi]),
+        "switch": np.array(json.dumps(switch)),
+        "shape0": np.array(shape0),
+        "n_eval": np.array(n_eval),
+    }
+    if args.checkpoint:
+        save_checkpoint(args.checkpoint, **stage, boot_idx=ckpt["boot_idx"], boot_blocks=ckpt["boot_blocks"])
+    costs, idx = costs_from_matrix(M)
+    resample = args.n_boot > 0 or args.crossfold or args.kfold >= 2 or args.loo
+    if args.adaptive and resample:
+        M_ref = misfit_matrix(pack_galaxies(galaxies, args.error_floor), ref_grid, fam0, shape0)
+    else:
+        M_ref = M
 
     m_hat = m_from_lambda_kpc(lam_hat)
     m_lo = m_from_lambda_kpc(lam_hi)
@@ -172,10 +664,36 @@ def main():
         "m_gamma_eV_lo": eV_from_kg(m_lo),
         "m_gamma_eV_hi": eV_from_kg(m_hi),
         "N_galaxies": len(galaxies),
+        "switch_family": fam0,
+        "switch_shape": shape0,
     }
+    if args.adaptive:
+        result["n_eval"] = n_eval
+        result["lambdaC_kpc_ref_grid"] = ref_grid.tolist()
+    if len(families) > 1 or shapes is not None:
+        result["switch_grid"] = ref_grid.tolist()
+        result["switch_families"] = switch
 
     if args.n_boot > 0:
-        boot = bootstrap_lambda(galaxies, grid, args.error_floor, args.n_boot)
+        done = split_blocks(ckpt["boot_idx"])[: int(ckpt["boot_blocks"])]
+        state = {"parts": done, "saved": time.monotonic()}
+
+        def save_boot():
+            parts = state["parts"]
+            boot_idx = np.concatenate(parts) if parts else np.zeros(0, dtype=int)
+            save_checkpoint(args.checkpoint, **stage, boot_idx=boot_idx, boot_blocks=np.array(len(parts)))
+            state["saved"] = time.monotonic()
+
+        def on_block(parts):
+            state["parts"] = parts
+            # checkpoint at most every --checkpoint_every seconds
+            if args.checkpoint and time.monotonic() - state["saved"] >= args.checkpoint_every:
+                save_boot()
+
+        boot = bootstrap_lambda(galaxies, ref_grid, args.error_floor, args.n_boot, args.seed, M=M_ref,
+                                n_jobs=args.n_jobs, done=done, on_block=on_block)
+        if args.checkpoint:
+            save_boot()
         result.update(boot)
         lam_med = np.median(boot["lambdaC_samples"])
         result["m_gamma_kg_bootstrap_med"] = m_from_lambda_kpc(lam_med)
@@ -183,19 +701,73 @@ def main():
 
     if args.crossfold:
         fold_vals = []
-        fold_grid = np.geomspace(args.grid_min_kpc, args.grid_max_kpc, args.n_grid)
-        even = [galaxies[i] for i in range(len(galaxies)) if i % 2 == 0]
-        odd = [galaxies[i] for i in range(len(galaxies)) if i % 2 == 1]
-        for subset in (even, odd):
-            if not subset:
+        for parity in (0, 1):
+            rows = M_ref[parity::2]
+            if not len(rows):
                 continue
-            _, idx_fold = sweep_lambda(subset, fold_grid, args.error_floor)
-            fold_vals.append(float(fold_grid[idx_fold]))
+            _, idx_fold = costs_from_matrix(rows)
+            fold_vals.append(float(ref_grid[idx_fold]))
         if fold_vals:
             result["lambdaC_kpc_crossfold"] = fold_vals
             result["m_gamma_kg_crossfold"] = [m_from_lambda_kpc(l) for l in fold_vals]
             result["m_gamma_eV_crossfold"] = [eV_from_kg(m) for m in result["m_gamma_kg_crossfold"]]
 
+    if args.kfold >= 2:
+        lams, test = kfold_lambda(M_ref, ref_grid, kfold_splits(len(galaxies), args.kfold, args.seed))
+        result["kfold_k"] = args.kfold
+        result["lambdaC_kpc_kfold"] = lams.tolist()
+        result["misfit_kfold_test"] = test.tolist()
+        result["misfit_kfold_test_mean"] = float(np.mean(test))
+
+    if args.loo:
+        lams, test = kfold_lambda(M_ref, ref_grid, kfold_splits(len(galaxies), len(galaxies)))
+        result["lambdaC_kpc_loo"] = lams.tolist()
+        result["lambdaC_kpc_loo_lo"] = float(np.percentile(lams, 16))
+        result["lambdaC_kpc_loo_hi"] = float(np.percentile(lams, 84))
+        result["misfit_loo_test"] = test.tolist()
+
+    if args.n_abtfr > 0:
+        A_unc = load_btfr_unc(args.btfr_json)
+        a_grid = A_btfr + A_unc * np.linspace(-args.abtfr_nsigma, args.abtfr_nsigma, args.n_abtfr)
+        a_grid = a_grid[a_grid > 0]
+        floors = [float(v) for v in args.error_floors.split(",")] if args.error_floors else [args.error_floor]
+        surface = misfit_surface(
+            [pack_galaxies(galaxies, fl) for fl in floors], ref_grid, a_grid / A_btfr, fam0, shape0
+        )
+        # Gaussian prior on A_BTFR from the calibration, flat over the error floors
+        w_a = np.exp(-0.5 * ((a_grid - A_btfr) / A_unc) ** 2) if A_unc > 0 else np.ones_like(a_grid)
+        weights = np.tile(w_a, len(floors))
+        (lam_m_lo, lam_m, lam_m_hi), rows, status = marginal_interval(
+            ref_grid, surface.reshape(-1, len(ref_grid)), weights
+        )
+        n_boundary, n_nofit = int(np.sum(status == 1)), int(np.sum(status == 2))
+        if n_boundary or n_nofit:
+            print(f"[warn] marginal interval: {n_boundary} of {len(status)} (error floor, A_BTFR) nodes have "
+                  f"their minimum at the lambda_C grid edge and {n_nofit} have no curvature fit; they are "
+                  f"left out of the mixture (widen --grid_min_kpc/--grid_max_kpc if the edge nodes matter)")
+        f_best, a_best, l_best = np.unravel_index(int(np.argmin(surface)), surface.shape)
+        result.update({
+            "A_BTFR_grid": a_grid.tolist(),
+            "A_BTFR_prior": [A_btfr, A_unc],
+            "error_floor_grid": floors,
+            "misfit_surface": surface.tolist(),
+            "lambdaC_kpc_hat_vs_A": rows[:, 1].reshape(len(floors), len(a_grid)).tolist(),
+            "surface_min": {
+                "error_floor": floors[f_best],
+                "A_BTFR": float(a_grid[a_best]),
+                "lambdaC_kpc": float(ref_grid[l_best]),
+                "misfit": float(surface[f_best, a_best, l_best]),
+            },
+            # 0: in the mixture, 1: minimum on the grid edge, 2: no curvature fit
+            "marg_node_status": status.reshape(len(floors), len(a_grid)).tolist(),
+            "marg_weight_used": float(np.sum(weights[status == 0]) / np.sum(weights)),
+            "lambdaC_kpc_marg_lo": lam_m_lo,
+            "lambdaC_kpc_marg_med": lam_m,
+            "lambdaC_kpc_marg_hi": lam_m_hi,
+            "m_gamma_kg_marg": [m_from_lambda_kpc(l) for l in (lam_m_hi, lam_m, lam_m_lo)],
+            "m_gamma_eV_marg": [eV_from_kg(m_from_lambda_kpc(l)) for l in (lam_m_hi, lam_m, lam_m_lo)],
+        })
+
     Path(args.out_json).parent.mkdir(parents=True, exist_ok=True)
     with open(args.out_json, "w") as f:
         json.dump(result, f, indent=2)
@@ -205,7 +777,14 @@ def main():
             import matplotlib.pyplot as plt
 
             plt.figure()
-            plt.plot(grid, costs)
+            if len(families) > 1:
+                for fam in families:
+                    sw = switch[fam]
+                    j = sw["shape"].index(sw["best_shape"])
+                    plt.plot(ref_grid, sw["misfit"][j], label=f"{fam} (p={sw['best_shape']:g})")
+                plt.legend()
+            else:
+                plt.plot(grid, costs)
             plt.xscale("log")
             plt.xlabel(r"$\lambda_C$ [kpc]")
             plt.ylabel("robust misfit (MAD)")
@@ -18,6 +18,27 @@ Outputs (JSON):
     - per-galaxy statistics for diagnostics
 
 This script is intentionally lightweight (no non-linear optimisation).
+
+With --n_mc N the inversion is repeated for N Monte Carlo draws of V_obs
+(Gaussian, e_obs), the stellar M/L (lognormal, --ml_dex) and A_BTFR
+(calibration error, shared by all galaxies in a draw), as (n_point x n_draw)
+arrays in memory-bounded chunks that are streamed into quantile sketches;
+per-galaxy and global (median over galaxies per draw) lambda_C posteriors are
+added to the JSON.  The posterior is conditional on the selection of the
+point estimate: the same galaxies and, within each, the same radii (those in
+the Delta window at the nominal data) enter every draw.  A draw that pushes
+a selected point to Delta >= 1 or Delta <= 0 has no finite lambda there; the
+point is kept as censored at lambda = 0 or +inf, which the medians handle
+as ranks.  Censored fractions (points, galaxy medians, global medians) are
+reported as [lambda = 0, lambda = inf] pairs.
+
+Weighted medians and the global median/MAD go through the mergeable
+quantile_sketch.QuantileSketch (exact for up to its exact_limit samples).
+With --shard K/N and --sketch_out, shards run in separate processes and
+quantile_sketch.py --interval merges their sketches into the same global
+interval and m_gamma as an unsharded run.  The
+per-draw global median of --n_mc needs all galaxies of a draw in one process,
+so --n_mc and --shard are mutually exclusive.
 """
 
 from __future__ import annotations
@@ -25,12 +46,13 @@ from __future__ import annotations
 import argparse
 import json
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Tuple
 
 import numpy as np
 import pandas as pd
 
 from helpers_sparc import glob_rotmods, load_sparc_catalog, parse_rotmod_file
+from quantile_sketch import QuantileSketch
 
 # Physical constants (SI)
 HBAR = 1.054_571_817e-34  # J s
@@ -40,8 +62,10 @@ KG_TO_EV = 1.0 / 1.782_661_92e-36  # eV per kg
 
 
 def m_from_lambda_kpc(lam_kpc: float) -> float:
-    lam_m = lam_kpc * KPC
-    return HBAR / (C * lam_m)
+    lam_m = np.float64(lam_kpc) * KPC
+    # censored Monte Carlo quantiles: lambda = 0 -> inf, lambda = inf -> 0
+    with np.errstate(divide="ignore"):
+        return float(HBAR / (C * lam_m))
 
 
 def eV_from_kg(m_kg: float) -> float:
@@ -51,24 +75,60 @@ def eV_from_kg(m_kg: float) -> float:
 def weighted_median(values: np.ndarray, weights: np.ndarray) -> float:
     if values.size == 0:
         raise ValueError("no data for weighted median")
-    sorter = np.argsort(values)
-    v = values[sorter]
-    w = weights[sorter]
-    cum = np.cumsum(w)
-    cutoff = 0.5 * cum[-1]
-    idx = np.searchsorted(cum, cutoff)
-    return float(v[min(idx, len(v) - 1)])
+    return QuantileSketch.from_samples(values, weights).quantile(0.5)
 
 
 def robust_interval(samples: np.ndarray) -> Tuple[float, float, float]:
     """Return (median, lo, hi) using MAD*1.4826 as 1 sigma equivalent."""
-    med = float(np.median(samples))
-    mad = 1.4826 * np.median(np.abs(samples - med))
+    return sketch_interval(QuantileSketch.from_samples(samples))
+
+
+def sketch_interval(sketch: QuantileSketch) -> Tuple[float, float, float]:
+    """robust_interval from a (possibly merged) sketch of the galaxy medians; NaN if empty."""
+    if sketch.n == 0:
+        return float("nan"), float("nan"), float("nan")
+    med = sketch.median()
+    mad = 1.4826 * sketch.mad(med)
     lo = med - mad
     hi = med + mad
     return med, max(lo, 1e-6), max(hi, 1e-6)
 
 
+def censored_quantiles(sketch: QuantileSketch, n_inf: int, qs) -> np.ndarray:
+    """Quantiles of the sketch's samples plus n_inf samples at +inf (inf where q falls among them)."""
+    n = sketch.n
+    total = n + n_inf
+    out = []
+    for q in qs:
+        if total == 0:
+            out.append(np.nan)
+        elif q * total > n:
+            out.append(np.inf)
+        else:
+            out.append(sketch.quantile(q * total / n, midpoint=True))
+    return np.array(out)
+
+
+def interval_summary(sketch: QuantileSketch) -> Dict[str, float]:
+    """The lambda_C / m_gamma fields of the JSON from a sketch of galaxy medians (quantile_sketch.py uses it too)."""
+    lam_med, lam_lo, lam_hi = sketch_interval(sketch)
+    m_med = m_from_lambda_kpc(lam_med)
+    m_lo = m_from_lambda_kpc(lam_hi)  # hi lambda => low mass
+    m_hi = m_from_lambda_kpc(lam_lo)
+    return {
+        "lambdaC_kpc_median": lam_med,
+        "lambdaC_kpc_lo": lam_lo,
+        "lambdaC_kpc_hi": lam_hi,
+        "lambdaC_kpc_mad": 0.5 * (lam_hi - lam_lo),
+        "m_gamma_kg_median": m_med,
+        "m_gamma_kg_lo": m_lo,
+        "m_gamma_kg_hi": m_hi,
+        "m_gamma_eV_median": eV_from_kg(m_med),
+        "m_gamma_eV_lo": eV_from_kg(m_lo),
+        "m_gamma_eV_hi": eV_from_kg(m_hi),
+    }
+
+
 def prepare_catalog(rotmod_dir: str, catalog_path: str, A_btfr: float,
                     min_points: int) -> List[Tuple[str, float, pd.DataFrame]]:
     cat = load_sparc_catalog(catalog_path)
@@ -89,13 +149,12 @@ def prepare_catalog(rotmod_dir: str, catalog_path: str, A_btfr: float,
     return galaxies
 
 
-def per_point_lambda(df: pd.DataFrame, vflat: float,
-                     delta_min: float, delta_max: float,
-                     error_floor: float) -> Tuple[np.ndarray, np.ndarray]:
+def point_selection(df: pd.DataFrame, vflat: float,
+                    delta_min: float, delta_max: float,
+                    error_floor: float) -> Tuple[np.ndarray, np.ndarray]:
+    """(mask of the points per_point_lambda uses, their lambda(r)); also the fixed Monte Carlo selection."""
     r = df["r_kpc"].values
     vobs = df["v_obs"].values
-    eobs = df["e_obs"].fillna(error_floor).values
-    eobs = np.maximum(eobs, error_floor)
     vbar_sq = (df["v_gas"] ** 2 + df["v_disk"] ** 2 + df["v_bulge"] ** 2).values
     delta = (vobs ** 2 - vbar_sq) / max(vflat ** 2, 1e-12)
 
@@ -106,18 +165,125 @@ def per_point_lambda(df: pd.DataFrame, vflat: float,
         (~np.isnan(delta)) &
         (np.abs(vobs - np.sqrt(vbar_sq)) > 0.1)  # avoid exact cancellation
     )
-    if not np.any(mask):
-        return np.array([]), np.array([])
-    delta = delta[mask]
-    r = r[mask]
-    eobs = eobs[mask]
-
-    denom = np.log(1.0 - delta)
+    lam = np.full(r.shape, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        denom = np.log(1.0 - delta[mask])
     denom = np.where(denom == 0, np.nan, denom)
-    lam = -r / denom
-    lam = lam[np.isfinite(lam) & (lam > 0)]
-    w = 1.0 / (eobs[:len(lam)] ** 2) if len(lam) else np.array([])
-    return lam, w
+    lam[mask] = -r[mask] / denom
+    mask &= np.isfinite(lam) & (lam > 0)
+    return mask, lam
+
+
+def per_point_lambda(df: pd.DataFrame, vflat: float,
+                     delta_min: float, delta_max: float,
+                     error_floor: float) -> Tuple[np.ndarray, np.ndarray]:
+    mask, lam = point_selection(df, vflat, delta_min, delta_max, error_floor)
+    eobs = np.maximum(df["e_obs"].fillna(error_floor).values, error_floor)
+    # weights follow the same selection as the points they belong to
+    return lam[mask], 1.0 / (eobs[mask] ** 2)
+
+
+def weighted_median_columns(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    weighted_median of every column of (n_point, n_draw) arrays; entries with
+    zero weight are ignored, columns without any weight give NaN.  Each call
+    sorts one Monte Carlo block only (at most --mc_max_elems elements).
+    """
+    v = np.where(weights > 0, values, np.inf)
+    sorter = np.argsort(v, axis=0)
+    v = np.take_along_axis(v, sorter, axis=0)
+    cum = np.cumsum(np.take_along_axis(weights, sorter, axis=0), axis=0)
+    idx = np.argmax(cum >= 0.5 * cum[-1], axis=0)
+    out = v[idx, np.arange(v.shape[1])]
+    return np.where(cum[-1] > 0, out, np.nan)
+
+
+def stellar_fraction(df: pd.DataFrame) -> float:
+    """
+    Stellar share of the baryonic mass, from v_star^2 / v_bar^2 at the last
+    radius (enclosed mass ~ r v^2); used to carry an M/L draw into Mbar.
+    """
+    vgas_sq = float(df["v_gas"].values[-1] ** 2)
+    vstar_sq = float(df["v_disk"].values[-1] ** 2 + df["v_bulge"].values[-1] ** 2)
+    return vstar_sq / (vgas_sq + vstar_sq) if vgas_sq + vstar_sq > 0 else 0.0
+
+
+def mc_point_lambda(df: pd.DataFrame, sel: np.ndarray, vflat_sq: np.ndarray, ml: np.ndarray,
+                    z: np.ndarray, error_floor: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-galaxy lambda_C for a batch of draws over the fixed points `sel`
+    (point_selection at the nominal data): column d perturbs V_obs by
+    e_obs * z[:, d], scales the stellar (disk + bulge) v^2 by ml[d] and uses
+    v_flat^2 = vflat_sq[d].  A point with Delta >= 1 (Delta <= 0) in a draw
+    counts as lambda = 0 (+inf) with its usual weight.  Returns the weighted
+    median per draw, which may itself be 0 or inf, and the number of
+    censored points per draw, shape (2, n_draw).
+    """
+    eobs = np.maximum(df["e_obs"].fillna(error_floor).values, error_floor)[sel, None]
+    vobs = df["v_obs"].values[sel, None] + eobs * z[sel]
+    vgas_sq = (df["v_gas"] ** 2).values[sel, None]
+    vstar_sq = (df["v_disk"] ** 2 + df["v_bulge"] ** 2).values[sel, None]
+    vbar_sq = vgas_sq + ml[None, :] * vstar_sq
+    delta = (vobs ** 2 - vbar_sq) / np.maximum(vflat_sq, 1e-12)[None, :]
+    low, high = delta >= 1.0, delta <= 0.0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lam = -df["r_kpc"].values[sel, None] / np.log(1.0 - delta)
+    lam = np.where(low, 0.0, np.where(high, np.inf, lam))
+    w = np.broadcast_to(1.0 / eobs ** 2, lam.shape)
+    return weighted_median_columns(lam, w), np.stack([low.sum(axis=0), high.sum(axis=0)])
+
+
+def mc_lambda_blocks(galaxies: List[Tuple[str, float, pd.DataFrame]], n_draw: int, A_rel_unc: float,
+                     ml_dex: float, delta_min: float, delta_max: float, error_floor: float,
+                     seed: int = 1234, max_elems: int = 2_000_000
+                     ) -> Iterator[Tuple[int, int, np.ndarray, np.ndarray]]:
+    """
+    Monte Carlo lambda_C of every galaxy, streamed as (d0, d1, block, cens)
+    with block (n_gal, d1 - d0) (0 / inf where the median is censored, NaN
+    for a galaxy without selected points) and cens (n_gal, 2, d1 - d0) the
+    censored point counts of mc_point_lambda.  Each galaxy uses its nominal
+    point selection in every draw.  V_obs errors and M/L (lognormal, ml_dex)
+    are drawn per galaxy from its own SeedSequence streams; the M/L draw
+    also rescales the stellar part of Mbar (stellar_fraction), and with it
+    v_flat^2 ~ sqrt(A Mbar).  The A_BTFR draw (relative Gaussian error
+    A_rel_unc) is shared by all galaxies within a draw.  A block holds at
+    most max_elems (n_point x draw) elements per galaxy; every stream is
+    consumed in draw order, so the draws do not depend on the chunking.
+    """
+    ss = np.random.SeedSequence(seed)
+    a_stream, *gal_streams = ss.spawn(1 + len(galaxies))
+    a_rng = np.random.default_rng(a_stream)
+    rngs = [tuple(np.random.default_rng(s) for s in gs.spawn(2)) for gs in gal_streams]
+    sels = [point_selection(df, vflat, delta_min, delta_max, error_floor)[0] for _, vflat, df in galaxies]
+    f_star = [stellar_fraction(df) for _, _, df in galaxies]
+    n_max = max((len(df) for _, _, df in galaxies), default=1)
+    chunk = max(1, max_elems // max(n_max, 1))
+    for d0 in range(0, n_draw, chunk):
+        d1 = min(d0 + chunk, n_draw)
+        a_ratio = np.clip(1.0 + A_rel_unc * a_rng.standard_normal(d1 - d0), 1e-3, None)
+        block = np.full((len(galaxies), d1 - d0), np.nan)
+        cens = np.zeros((len(galaxies), 2, d1 - d0), dtype=np.int64)
+        for i, ((_, vflat, df), (v_rng, ml_rng)) in enumerate(zip(galaxies, rngs)):
+            ml = 10.0 ** (ml_dex * ml_rng.standard_normal(d1 - d0))
+            # (draw, point) order keeps the stream independent of the chunk size
+            z = v_rng.standard_normal((d1 - d0, len(df))).T
+            if not sels[i].any():
+                continue
+            mbar_ratio = 1.0 + f_star[i] * (ml - 1.0)
+            vflat_sq = vflat ** 2 * np.sqrt(a_ratio * mbar_ratio)
+            block[i], cens[i] = mc_point_lambda(df, sels[i], vflat_sq, ml, z, error_floor)
+        yield d0, d1, block, cens
+
+
+def mc_lambda(galaxies: List[Tuple[str, float, pd.DataFrame]], n_draw: int, A_rel_unc: float,
+              ml_dex: float, delta_min: float, delta_max: float, error_floor: float,
+              seed: int = 1234, max_elems: int = 2_000_000) -> np.ndarray:
+    """All Monte Carlo draws of mc_lambda_blocks as one (n_gal, n_draw) array."""
+    out = np.full((len(galaxies), n_draw), np.nan)
+    for d0, d1, block, _ in mc_lambda_blocks(galaxies, n_draw, A_rel_unc, ml_dex, delta_min, delta_max,
+                                             error_floor, seed=seed, max_elems=max_elems):
+        out[:, d0:d1] = block
+    return out
 
 
 def main():
@@ -129,15 +295,32 @@ def main():
     ap.add_argument("--delta_max", type=float, default=0.85)
     ap.add_argument("--error_floor", type=float, default=5.0)
     ap.add_argument("--min_points", type=int, default=5)
+    ap.add_argument("--n_mc", type=int, default=0, help="Monte Carlo draws for error propagation (0: off)")
+    ap.add_argument("--ml_dex", type=float, default=0.1, help="lognormal M/L scatter of disk+bulge (dex)")
+    ap.add_argument("--no_btfr_unc", action="store_true", help="keep A_BTFR fixed in the Monte Carlo")
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--mc_max_elems", type=int, default=2_000_000, help="elements per Monte Carlo chunk")
+    ap.add_argument("--shard", default=None, help="K/N: only every N-th galaxy starting at K (0-based)")
+    ap.add_argument("--sketch_out", default=None,
+                    help="save the sketch of galaxy medians (.npz) for quantile_sketch.py merging")
     ap.add_argument("--out_json", required=True)
     args = ap.parse_args()
+    if args.shard and args.n_mc > 0:
+        # the per-draw global median needs every galaxy of a draw in one process
+        ap.error("--n_mc cannot be combined with --shard")
 
     with open(args.btfr_json) as f:
-        A_btfr = float(json.load(f)["A_BTFR_median"])
+        btfr = json.load(f)
+    A_btfr = float(btfr["A_BTFR_median"])
+    A_rel_unc = 0.0 if args.no_btfr_unc else float(btfr.get("A_BTFR_median_unc", 0.0)) / A_btfr
 
     galaxies = prepare_catalog(args.rotmod_dir, args.catalog, A_btfr, args.min_points)
+    if args.shard:
+        k, n = (int(v) for v in args.shard.split("/"))
+        galaxies = galaxies[k::n]
     gal_results: Dict[str, Dict[str, float]] = {}
-    lam_gal = []
+    # galaxy medians are streamed into a sketch instead of being collected
+    lam_sketch = QuantileSketch()
 
     for name, vflat, df in galaxies:
         lam_pts, weights = per_point_lambda(
@@ -145,39 +328,70 @@ def main():
         )
         if lam_pts.size == 0:
             continue
-        try:
-            lam_med = weighted_median(lam_pts, weights if weights.size else np.ones_like(lam_pts))
-        except ValueError:
-            continue
-        lam_gal.append(lam_med)
+        lam_med = QuantileSketch.from_samples(lam_pts, weights).quantile(0.5)
+        lam_sketch.add(lam_med)
         gal_results[name] = {
             "lambdaC_kpc_median": float(lam_med),
             "n_points": int(lam_pts.size)
         }
 
-    lam_gal = np.array(lam_gal)
-    lam_med, lam_lo, lam_hi = robust_interval(lam_gal)
-    m_med = m_from_lambda_kpc(lam_med)
-    m_lo = m_from_lambda_kpc(lam_hi)  # hi lambda => low mass
-    m_hi = m_from_lambda_kpc(lam_lo)
-
+    if args.sketch_out:
+        Path(args.sketch_out).parent.mkdir(parents=True, exist_ok=True)
+        lam_sketch.save(args.sketch_out)
     result = {
         "lambdaC_kpc_galaxies": gal_results,
-        "lambdaC_kpc_median": lam_med,
-        "lambdaC_kpc_lo": lam_lo,
-        "lambdaC_kpc_hi": lam_hi,
-        "lambdaC_kpc_mad": 0.5 * (lam_hi - lam_lo),
-        "m_gamma_kg_median": m_med,
-        "m_gamma_kg_lo": m_lo,
-        "m_gamma_kg_hi": m_hi,
-        "m_gamma_eV_median": eV_from_kg(m_med),
-        "m_gamma_eV_lo": eV_from_kg(m_lo),
-        "m_gamma_eV_hi": eV_from_kg(m_hi),
+        **interval_summary(lam_sketch),
         "N_galaxies": int(len(gal_results)),
         "delta_window": [args.delta_min, args.delta_max],
         "error_floor_kms": args.error_floor,
     }
 
+    if args.n_mc > 0:
+        # the posterior covers the same galaxies and points as the point
+        # estimate; draws are streamed into sketches, never held as (n_gal x n_mc)
+        mc_galaxies = [g for g in galaxies if g[0] in gal_results]
+        gal_sketches = [QuantileSketch() for _ in mc_galaxies]
+        gal_inf = np.zeros(len(mc_galaxies), dtype=np.int64)
+        gal_zero = np.zeros(len(mc_galaxies), dtype=np.int64)
+        glob_sketch = QuantileSketch()
+        glob_cens = np.zeros(2, dtype=np.int64)
+        point_cens = np.zeros(2, dtype=np.int64)
+        for _, _, block, cens in mc_lambda_blocks(
+            mc_galaxies, args.n_mc, A_rel_unc, args.ml_dex, args.delta_min, args.delta_max,
+            args.error_floor, seed=args.seed, max_elems=args.mc_max_elems,
+        ):
+            # censored medians: 0 stays in the sketch as the lowest value, +inf is counted
+            for sk, row in zip(gal_sketches, block):
+                sk.add(row)
+            gal_zero += (block == 0).sum(axis=1)
+            gal_inf += np.isinf(block).sum(axis=1)
+            point_cens += cens.sum(axis=(0, 2))
+            glob = np.median(block, axis=0)
+            glob_sketch.add(glob)
+            glob_cens += [(glob == 0).sum(), np.isinf(glob).sum()]
+        for k, ((name, _, _), sk) in enumerate(zip(mc_galaxies, gal_sketches)):
+            lo, med, hi = censored_quantiles(sk, int(gal_inf[k]), [0.16, 0.5, 0.84])
+            gal_results[name].update({
+                "lambdaC_kpc_mc_median": float(med),
+                "lambdaC_kpc_mc_lo": float(lo),
+                "lambdaC_kpc_mc_hi": float(hi),
+                "mc_censored_fraction": [float(gal_zero[k] / args.n_mc), float(gal_inf[k] / args.n_mc)],
+            })
+        lo, med, hi = (float(v) for v in censored_quantiles(glob_sketch, int(glob_cens[1]), [0.16, 0.5, 0.84]))
+        n_points = args.n_mc * sum(gal_results[name]["n_points"] for name, _, _ in mc_galaxies)
+        result.update({
+            "n_mc": args.n_mc,
+            "mc_ml_dex": args.ml_dex,
+            "mc_A_BTFR_rel_unc": A_rel_unc,
+            "mc_point_censored_fraction": (point_cens / max(n_points, 1)).tolist(),
+            "mc_censored_fraction": (glob_cens / args.n_mc).tolist(),
+            "lambdaC_kpc_mc_median": med,
+            "lambdaC_kpc_mc_lo": lo,
+            "lambdaC_kpc_mc_hi": hi,
+            "m_gamma_kg_mc": [m_from_lambda_kpc(l) for l in (hi, med, lo)],
+            "m_gamma_eV_mc": [eV_from_kg(m_from_lambda_kpc(l)) for l in (hi, med, lo)],
+        })
+
     Path(args.out_json).parent.mkdir(parents=True, exist_ok=True)
     with open(args.out_json, "w") as f:
         json.dump(result, f, indent=2)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Fit the whole sample with fdb2_fit in one process pool and record the results
+in an append-only JSONL ledger.
+
+Each worker runs fdb2_fit.fit_galaxy_v2 for one galaxy.  Its stdout goes to
+<log-dir>/fdb2_<tag>.log, the same file the per-galaxy shell loop used to
+produce.  The parent appends one JSON line per finished galaxy to the ledger
+(default out/fdb2_ledger.jsonl) and flushes it.  Fields: tag, status,
+Vflat2, chi2 (fit/outer/inner/all), rescale factors, timings, finished_at.
+Only the parent writes the ledger, so lines never interleave.  An
+interrupted run loses at most the galaxies still in flight.
+
+Every line also records the input signature of the fit ("input": CSV
+mtime/size, the SPARC HSB list signature, n_starts and sigma_model).  On
+restart, galaxies that already have an "ok" or "blacklisted" line with the
+current signature are skipped; a changed CSV, HSB list or setting refits.  Failed galaxies ("error" lines with the exception text) are retried
+unless --skip-errors is given.  If a tag appears more than once, the last line
+wins.
+
+make_all_v2.py reads the outer chi^2 ranking from the ledger.
+
+Usage:
+  python scripts/fdb2_batch.py --workers 8
+  python scripts/fdb2_batch.py build/NGC2403_sparc.csv build/DDO170_sparc.csv
+  python scripts/fdb2_batch.py --rerun --no-plots
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures as cf
+import contextlib
+import glob
+import json
+import os
+import time
+import traceback
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_LEDGER = os.path.join("out", "fdb2_ledger.jsonl")
+DONE_STATUSES = {"ok", "blacklisted"}
+SIGMA_MODEL = 8.0  # km/s, the model error fit_galaxy_v2 adds in quadrature
+HSB_LIST = os.path.join("data", "sparc", "sets", "hsb.txt")
+
+
+def galaxy_tag(csv_path: str) -> str:
+    return os.path.splitext(os.path.basename(csv_path))[0].replace("_sparc", "")
+
+
+def read_ledger(path: str = DEFAULT_LEDGER) -> Dict[str, dict]:
+    """tag -> last ledger record.  A truncated final line (crash mid-write) is ignored."""
+    records: Dict[str, dict] = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "tag" in rec:
+                records[rec["tag"]] = rec
+    return records
+
+
+def input_signature(csv_path: str, n_starts: int) -> dict:
+    """What a ledger record depends on; a record is reused only if this matches."""
+    from sample_index import _signature
+
+    mtime_ns, size = _signature(csv_path)
+    hsb_mtime_ns, hsb_size = _signature(HSB_LIST)
+    return {
+        "csv_mtime_ns": mtime_ns,
+        "csv_size": size,
+        "hsb_mtime_ns": hsb_mtime_ns,
+        "hsb_size": hsb_size,
+        "n_starts": int(n_starts),
+        "sigma_model": SIGMA_MODEL,
+    }
+
+
+def append_record(fh, rec: dict) -> None:
+    fh.write(json.dumps(rec, sort_keys=True, allow_nan=True) + "\n")
+    fh.flush()
+    os.fsync(fh.fileno())
+
+
+def _fit_task(csv_path: str, log_dir: Optional[str], n_starts: int, plot: bool) -> dict:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from fdb2_fit import fit_galaxy_v2
+
+    tag = galaxy_tag(csv_path)
+    # taken before the fit, so an input edited mid-fit leaves a stale record
+    signature = input_signature(csv_path, n_starts)
+    t0 = time.perf_counter()
+    log = open(os.path.join(log_dir, f"fdb2_{tag}.log"), "w", encoding="utf-8") if log_dir else open(os.devnull, "w")
+    with log, contextlib.redirect_stdout(log):
+        try:
+            rec = fit_galaxy_v2(csv_path, n_starts=n_starts, plot=plot)
+        except Exception as e:
+            traceback.print_exc(file=log)
+            rec = {"tag": tag, "status": "error", "error": f"{type(e).__name__}: {e}"}
+    rec.setdefault("t_total", time.perf_counter() - t0)
+    rec["csv"] = csv_path
+    rec["input"] = signature
+    return rec
+
+
+def pending_paths(
+    paths: Iterable[str], ledger: Dict[str, dict], skip_errors: bool = False, n_starts: int = 1
+) -> List[str]:
+    done = set(DONE_STATUSES) | ({"error"} if skip_errors else set())
+
+    def is_done(p: str) -> bool:
+        rec = ledger.get(galaxy_tag(p), {})
+        return rec.get("status") in done and rec.get("input") == input_signature(p, n_starts)
+
+    return [p for p in paths if not is_done(p)]
+
+
+def run_batch(
+    paths: List[str],
+    ledger_path: str = DEFAULT_LEDGER,
+    n_workers: int = 1,
+    log_dir: Optional[str] = "/tmp",
+    n_starts: int = 1,
+    plot: bool = True,
+    rerun: bool = False,
+    skip_errors: bool = False,
+) -> Dict[str, dict]:
+    """Fit the pending galaxies of `paths`; returns the updated ledger (tag -> record)."""
+    ledger = {} if rerun else read_ledger(ledger_path)
+    todo = paths if rerun else pending_paths(paths, ledger, skip_errors, n_starts)
+    print(f"# {len(paths)} galaxies, {len(paths) - len(todo)} up to date in {ledger_path}, {len(todo)} to fit")
+    if not todo:
+        return ledger
+    os.makedirs(os.path.dirname(ledger_path) or ".", exist_ok=True)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+
+    def report(rec: dict) -> None:
+        ledger[rec["tag"]] = rec
+        chi2 = rec.get("chi2_outer")
+        note = f"chi2_outer={chi2:.3f}" if chi2 is not None else rec.get("error", "")
+        print(f"  [{len(ledger)}] {rec['tag']:12s} {rec['status']:11s} {note}  ({rec['t_total']:.1f} s)")
+
+    with open(ledger_path, "a", encoding="utf-8") as fh:
+        if n_workers <= 1:
+            for p in todo:
+                rec = _fit_task(p, log_dir, n_starts, plot)
+                rec["finished_at"] = time.time()
+                append_record(fh, rec)
+                report(rec)
+        else:
+            with cf.ProcessPoolExecutor(max_workers=n_workers) as ex:
+                futures = [ex.submit(_fit_task, p, log_dir, n_starts, plot) for p in todo]
+                for fut in cf.as_completed(futures):
+                    rec = fut.result()
+                    rec["finished_at"] = time.time()
+                    append_record(fh, rec)
+                    report(rec)
+    return ledger
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Batch fdb2 fits with a resumable JSONL ledger.")
+    ap.add_argument("sparc_csv", nargs="*", help="galaxy CSVs (default: build/*_sparc.csv)")
+    ap.add_argument("--build-dir", default="build")
+    ap.add_argument("--ledger", default=DEFAULT_LEDGER)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--log-dir", default="/tmp", help="per-galaxy stdout logs; '' to discard")
+    ap.add_argument("--multistart", type=int, default=1, help="L-BFGS-B starts per galaxy")
+    ap.add_argument("--no-plots", action="store_true")
+    ap.add_argument("--rerun", action="store_true", help="ignore the ledger and fit everything again")
+    ap.add_argument("--skip-errors", action="store_true", help="do not retry galaxies that failed before")
+    args = ap.parse_args()
+
+    paths = args.sparc_csv or sorted(glob.glob(os.path.join(args.build_dir, "*_sparc.csv")))
+    t0 = time.perf_counter()
+    ledger = run_batch(
+        paths,
+        ledger_path=args.ledger,
+        n_workers=args.workers,
+        log_dir=args.log_dir or None,
+        n_starts=args.multistart,
+        plot=not args.no_plots,
+        rerun=args.rerun,
+        skip_errors=args.skip_errors,
+    )
+    tags = {galaxy_tag(p) for p in paths}
+    counts: Dict[str, int] = {}
+    for tag, rec in ledger.items():
+        if tag in tags:
+            counts[rec["status"]] = counts.get(rec["status"], 0) + 1
+    print(f"# done in {time.perf_counter() - t0:.1f} s: " + ", ".join(f"{v} {k}" for k, v in sorted(counts.items())))
+
+
+if __name__ == "__main__":
+    main()
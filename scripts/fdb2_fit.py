@@ -19,25 +19,25 @@ where:
 This file fits NGC 2403 as a first v2 test case.
 """
 
-import sys
+import argparse
 import os
-import glob
+import time
 from dataclasses import dataclass
-from typing import Tuple
+from functools import partial
+from typing import Optional, Tuple
 
 import numpy as np
 import pandas as pd
 from scipy.optimize import minimize
 import matplotlib.pyplot as plt
 
+import sample_index
+
 # Provisional global thickness of the evanescent shell [kpc].
 # In FDB picture this should be set by ULE-EM frequency / Compton scale and
 # is expected to be roughly common across similar galaxies.
 D_R_CONST_KPC = 1.0
 
-_GLOBAL_SIGMA_GAS_MAX: float | None = None
-_HSB_TAGS: set[str] | None = None
-
 
 @dataclass
 class GalaxyData:
@@ -49,6 +49,8 @@ class GalaxyData:
     Vbul: np.ndarray
     Sigma_gas: np.ndarray
     Sigma_star: np.ndarray
+    # (Rd, R_bulge_edge, Vmax) from the sample index; None -> recomputed
+    scales: Optional[Tuple[float, float, float]] = None
 
 
 def load_sparc_csv(path: str) -> GalaxyData:
@@ -65,6 +67,22 @@ def load_sparc_csv(path: str) -> GalaxyData:
     )
 
 
+def attach_index_scales(g: GalaxyData, csv_path: str) -> GalaxyData:
+    """Set g.scales from the sample index row of csv_path (if indexed and unchanged)."""
+    row = sample_index.csv_stats(csv_path)
+    if row is not None and np.isfinite(row["Rd"]) and np.isfinite(row["vmax"]):
+        g.scales = (float(row["Rd"]), float(row["R_bulge_edge"]), float(row["vmax"]))
+    return g
+
+
+def galaxy_scales(g: GalaxyData) -> Tuple[float, float, float]:
+    """(Rd, R_bulge_edge, Vmax): the indexed values when attached, else computed from g."""
+    if g.scales is not None:
+        return g.scales
+    Rd, R_bulge_edge = estimate_Rd_and_bulge_edge(g.R_kpc, g.Sigma_star, g.Vbul, g.Vdisk)
+    return Rd, R_bulge_edge, float(np.nanmax(g.Vobs))
+
+
 def estimate_transition_radius(R: np.ndarray, Sigma_gas: np.ndarray) -> Tuple[float, float]:
     """
     Diagnostic helper: estimate (R_t_est, dR_est) from Sigma_gas.
@@ -153,9 +171,13 @@ def coupling_from_scale(R: np.ndarray, Rd: float, lambda_c_kpc: float = 30.0) ->
 
     This is a placeholder analytic form for the "how much of the 1/r tail
     is available at this radius" coupling.
+
+    R, Rd and lambda_c_kpc broadcast against each other, so a (n_lambda, 1)
+    column of λ_C against R gives the (λ_C × R) weight matrix used by
+    fdb2_lambda_scan.py.
     """
     L = np.maximum(R, Rd)
-    x = L / max(lambda_c_kpc, 1e-3)
+    x = L / np.maximum(lambda_c_kpc, 1e-3)
     return x / (1.0 + x)
 
 
@@ -184,60 +206,25 @@ def global_sigma_gas_max(build_dir: str = "build") -> float:
     """
     Return a global max Sigma_gas across all *_sparc.csv files in build/.
     Used only for plotting normalization so that gas profiles are comparable
-    across galaxies.
+    across galaxies.  Read from the sample index (sample_index.py), which
+    only re-reads CSVs that changed.
     """
-    global _GLOBAL_SIGMA_GAS_MAX
-    if _GLOBAL_SIGMA_GAS_MAX is not None:
-        return _GLOBAL_SIGMA_GAS_MAX
-    max_val = 0.0
-    pattern = os.path.join(build_dir, "*_sparc.csv")
-    for path in glob.glob(pattern):
-        try:
-            df = pd.read_csv(path)
-        except Exception:
-            continue
-        if "Sigma_gas" not in df.columns:
-            continue
-        vals = df["Sigma_gas"].to_numpy()
-        if vals.size == 0:
-            continue
-        local_max = np.nanmax(vals)
-        if np.isfinite(local_max):
-            max_val = max(max_val, float(local_max))
-    if max_val <= 0.0:
-        max_val = 1.0
-    _GLOBAL_SIGMA_GAS_MAX = max_val
-    return _GLOBAL_SIGMA_GAS_MAX
+    return sample_index.sigma_gas_max(build_dir)
 
 
 def load_hsb_tags(sp_arc_dir: str = "data/sparc") -> set[str]:
     """
     Load the list of high-surface-brightness (HSB) galaxies from
-    SPARC's sets/hsb.txt. Used to decide where an inner stellar
-    mass rescaling is appropriate.
+    SPARC's sets/hsb.txt (via the sample index). Used to decide where an
+    inner stellar mass rescaling is appropriate.  A missing list gives an
+    empty set, i.e. no HSB-based corrections.
     """
-    global _HSB_TAGS
-    if _HSB_TAGS is not None:
-        return _HSB_TAGS
-    hsb_path = os.path.join(sp_arc_dir, "sets", "hsb.txt")
-    tags: set[str] = set()
-    try:
-        with open(hsb_path, "r", encoding="utf-8") as f:
-            for line in f:
-                name = line.strip()
-                if not name:
-                    continue
-                # SPARC names may include spaces; our tags drop spaces.
-                tag = name.replace(" ", "")
-                tags.add(tag.upper())
-    except FileNotFoundError:
-        # Fail silently; we simply won't apply HSB-based corrections.
-        tags = set()
-    _HSB_TAGS = tags
-    return _HSB_TAGS
-
-
-def rescale_stellar_inner(galaxy_tag: str, g: GalaxyData, sigma_model: float = 8.0) -> GalaxyData:
+    return sample_index.hsb_tags(sparc_dir=sp_arc_dir)
+
+
+def rescale_stellar_inner(
+    galaxy_tag: str, g: GalaxyData, sigma_model: float = 8.0, info: dict | None = None
+) -> GalaxyData:
     """
     For HSB + bulge galaxies, rescale the stellar contribution
     (disk + bulge) in the inner region so that Newton and Vobs
@@ -246,7 +233,8 @@ def rescale_stellar_inner(galaxy_tag: str, g: GalaxyData, sigma_model: float = 8
     This is a lightweight 1-parameter adjustment:
         V_newt_corr^2 = s * (Vdisk^2 + Vbul^2) + Vgas^2
     with s<=1, fitted only for R <= R_cut_inner. Dwarfs/LSB are left
-    untouched.
+    untouched.  If given, `info` receives rescale_s and rescale_R_cut when
+    the correction is applied.
     """
     tags_hsb = load_hsb_tags()
     if galaxy_tag.upper() not in tags_hsb:
@@ -257,7 +245,7 @@ def rescale_stellar_inner(galaxy_tag: str, g: GalaxyData, sigma_model: float = 8
     eV = g.eVobs
 
     # Estimate Rd for an inner cut in physical units
-    Rd, _ = estimate_Rd_and_bulge_edge(R, g.Sigma_star, g.Vbul, g.Vdisk)
+    Rd = galaxy_scales(g)[0]
     # Inner region: up to min(3 kpc, 2 Rd) to avoid polluting with outer disk
     R_cut_inner = min(3.0, 2.0 * Rd)
     mask_inner = np.isfinite(R) & (R <= R_cut_inner)
@@ -305,6 +293,9 @@ def rescale_stellar_inner(galaxy_tag: str, g: GalaxyData, sigma_model: float = 8
         return g
 
     print(f"[{galaxy_tag}] Applying inner stellar rescale s={s_hat:.3f} (R<= {R_cut_inner:.2f} kpc)")
+    if info is not None:
+        info["rescale_s"] = s_hat
+        info["rescale_R_cut"] = R_cut_inner
 
     # Apply a radial taper: full s_hat at R<=R_cut_inner, smoothly ->1 outside ~2*R_cut_inner
     R_taper_start = R_cut_inner
@@ -332,12 +323,74 @@ def rescale_stellar_inner(galaxy_tag: str, g: GalaxyData, sigma_model: float = 8
         Vbul=Vbul_new,
         Sigma_gas=g.Sigma_gas,
         Sigma_star=g.Sigma_star,
+        scales=g.scales,
     )
 
 
+@dataclass
+class FitContext:
+    """
+    The Vflat2-independent part of chi2_v2 for one galaxy, built once.
+
+    Rd (np.polyfit on Sigma_star), the bulge scan, Vn, f_geom, the error
+    vector and the outer-disk fit mask do not depend on Vflat2.  On the fit
+    points the objective is then just
+
+        V = sqrt((1 - W) Vn^2 + W Vflat2),   chi2 = sum (Vobs - V)^2 / err^2.
+
+    chi2_v2 / chi2_v2_and_grad / chi2_v2_batch accept a FitContext anywhere
+    they accept a GalaxyData.
+    """
+    galaxy: GalaxyData
+    sigma_model: float
+    Rd: float
+    R_star_edge: float
+    mask: np.ndarray       # fit points on the full radius grid
+    W: np.ndarray          # f_geom at the fit points
+    base2: np.ndarray      # (1 - W) Vn^2 at the fit points
+    Vobs: np.ndarray       # at the fit points
+    inv_err2: np.ndarray   # 1 / (eVobs^2 + sigma_model^2) at the fit points
+
+    @classmethod
+    def from_galaxy(cls, g: GalaxyData, sigma_model: float = 8.0) -> "FitContext":
+        R = g.R_kpc
+        Vn2 = np.clip(g.Vdisk**2 + g.Vgas**2 + g.Vbul**2, 0, None)
+        # Disk scale from stellar profile
+        Rd, _, vmax = galaxy_scales(g)
+        # Fit only beyond stellar disk: R > 2 Rd for dwarfs (Vmax < 80 km/s), R > 3 Rd for L* spirals
+        R_star_edge = (2.0 if vmax < 80.0 else 3.0) * Rd
+        mask = R > R_star_edge
+        # geometric coupling f(L/λ_C) based on Rd (L ~ max(R,Rd))
+        W = coupling_from_scale(R[mask], Rd)
+        return cls(
+            galaxy=g,
+            sigma_model=float(sigma_model),
+            Rd=float(Rd),
+            R_star_edge=float(R_star_edge),
+            mask=mask,
+            W=W,
+            base2=(1.0 - W) * Vn2[mask],
+            Vobs=g.Vobs[mask],
+            inv_err2=1.0 / (g.eVobs[mask] ** 2 + sigma_model**2),
+        )
+
+    @property
+    def n_fit(self) -> int:
+        return int(self.W.size)
+
+
+def as_fit_context(g, sigma_model: float = 8.0) -> FitContext:
+    """g itself if it is a FitContext for sigma_model, otherwise a fresh one."""
+    if isinstance(g, FitContext):
+        if g.sigma_model == sigma_model:
+            return g
+        g = g.galaxy
+    return FitContext.from_galaxy(g, sigma_model)
+
+
 def chi2_v2(
     vec: np.ndarray,
-    g: GalaxyData,
+    g,
     sigma_model: float = 8.0,
 ) -> float:
     """
@@ -349,58 +402,92 @@ def chi2_v2(
         v_tot^2(R) = (1 - f_geom(R)) * v_Newt^2(R) + f_geom(R) * Vflat2,
 
     so that幾何カップリング f_geom(L/λ_C) が 1/r^2→1/r への再配分を一意に決める。
+    g is a GalaxyData or (for repeated evaluation) a FitContext.
     """
     Vflat2 = float(vec[0])
     if Vflat2 <= 0:
         return 1e30
-
-    R = g.R_kpc
-    Vobs = g.Vobs
-    eV = g.eVobs
-    Vn = np.sqrt(np.clip(g.Vdisk**2 + g.Vgas**2 + g.Vbul**2, 0, None))
-
-    # Disk scale from stellar profile
-    Rd, _ = estimate_Rd_and_bulge_edge(R, g.Sigma_star, g.Vbul, g.Vdisk)
-    # geometric coupling f(L/λ_C) based on Rd (L ~ max(R,Rd))
-    f_geom = coupling_from_scale(R, Rd)
-    W = f_geom
-    # convex combination between Newtonian v^2 and flat tail Vflat2
-    v2_tot = (1.0 - W) * (Vn**2) + W * Vflat2
-    V_tot = np.sqrt(np.clip(v2_tot, 0.0, None))
-
-    err = np.sqrt(eV**2 + sigma_model**2)
-    # Fit only beyond stellar disk. Dwarfs (low Vmax) use a slightly looser cut.
-    vmax = float(np.nanmax(Vobs))
-    if vmax < 80.0:
-        # dwarf / low-mass: relax to R > 2 Rd
-        R_star_edge = 2.0 * Rd
-    else:
-        # L* spirals: keep R > 3 Rd
-        R_star_edge = 3.0 * Rd
-    mask_fit = R > R_star_edge
-    if not np.any(mask_fit):
+    ctx = as_fit_context(g, sigma_model)
+    if ctx.n_fit == 0:
         return 1e30
+    resid = ctx.Vobs - np.sqrt(np.clip(ctx.base2 + ctx.W * Vflat2, 0.0, None))
+    return float(np.dot(resid * resid, ctx.inv_err2))
 
-    chi = (Vobs[mask_fit] - V_tot[mask_fit]) / err[mask_fit]
-    chi2 = float(np.sum(chi**2))
-    return chi2
 
-
-def fit_galaxy_v2(csv_path: str):
+def chi2_v2_and_grad(
+    vec: np.ndarray,
+    g,
+    sigma_model: float = 8.0,
+) -> Tuple[float, np.ndarray]:
+    """
+    chi2_v2 and its exact gradient, for L-BFGS-B with jac=True.  Only Vflat2
+    (vec[0]) enters the model; the other entries get zero gradient.
+    """
+    vec = np.asarray(vec, dtype=float)
+    grad = np.zeros_like(vec)
+    Vflat2 = float(vec[0])
+    if Vflat2 <= 0:
+        return 1e30, grad
+    ctx = as_fit_context(g, sigma_model)
+    if ctx.n_fit == 0:
+        return 1e30, grad
+
+    V_tot = np.sqrt(np.clip(ctx.base2 + ctx.W * Vflat2, 0.0, None))
+    resid = ctx.Vobs - V_tot
+    pos = V_tot > 0
+    # dchi2/dVflat2 = sum_i -2 r_i / err_i^2 * W_i / (2 V_i)
+    grad[0] = -np.dot(np.where(pos, resid * ctx.W / np.where(pos, V_tot, 1.0), 0.0), ctx.inv_err2)
+    return float(np.dot(resid * resid, ctx.inv_err2)), grad
+
+
+def chi2_v2_batch(
+    vecs: np.ndarray,
+    g,
+    sigma_model: float = 8.0,
+) -> np.ndarray:
+    """
+    chi2_v2 for a batch of parameter vectors, shape (n, >=1) -> (n,).
+    Only column 0 (Vflat2) is used; the model curves are built as (n, n_R).
+    """
+    vecs = np.atleast_2d(np.asarray(vecs, dtype=float))
+    Vflat2 = vecs[:, 0]
+    out = np.full(len(Vflat2), 1e30)
+    ctx = as_fit_context(g, sigma_model)
+    if ctx.n_fit == 0:
+        return out
+
+    V_tot = np.sqrt(np.clip(ctx.base2[None, :] + ctx.W[None, :] * Vflat2[:, None], 0.0, None))
+    resid = ctx.Vobs[None, :] - V_tot
+    chi2 = (resid * resid) @ ctx.inv_err2
+    ok = Vflat2 > 0
+    out[ok] = chi2[ok]
+    return out
+
+
+def v2_model_curve(g: GalaxyData, Vflat2: float, sigma_model: float = 8.0) -> Tuple[np.ndarray, np.ndarray, float]:
+    """(Vn, V_tot, R_star_edge) on the full radius grid for a fitted Vflat2."""
+    ctx = FitContext.from_galaxy(g, sigma_model)
+    Vn2 = np.clip(g.Vdisk**2 + g.Vgas**2 + g.Vbul**2, 0, None)
+    W = coupling_from_scale(g.R_kpc, ctx.Rd)
+    V_tot = np.sqrt(np.clip((1.0 - W) * Vn2 + W * Vflat2, 0.0, None))
+    return np.sqrt(Vn2), V_tot, ctx.R_star_edge
+
+
+def prepare_galaxy_v2(csv_path: str, info: dict | None = None) -> Tuple[str, GalaxyData]:
+    """
+    Load a galaxy as fit_galaxy_v2 sees it: inner stellar rescaling for
+    HSB + bulge systems and the Milky Way radius cut applied.  `info`
+    (optional) collects what was applied (see rescale_stellar_inner).
+    """
     galaxy_tag = os.path.splitext(os.path.basename(csv_path))[0].replace("_sparc", "")
-    # Hard blacklist for galaxies that are clearly incompatible with the
-    # simple v2 assumptions (e.g. strong counter-rotating bulges).
-    # These should be documented in memo/galaxy/blacklist.md.
-    blacklist = {"NGC7331"}
-    if galaxy_tag.upper() in blacklist:
-        print(f"[{galaxy_tag}] Skipping v2 fit (blacklisted for global stats).")
-        return
-    g_raw = load_sparc_csv(csv_path)
+    # Rd / bulge edge / Vmax come from the sample index; the inner rescaling
+    # scales Vdisk and Vbul together and leaves them unchanged
+    g_raw = attach_index_scales(load_sparc_csv(csv_path), csv_path)
 
     # Apply inner stellar rescaling for HSB + bulge galaxies before any
     # diagnostics or fitting, so that Newton and Vobs are closer in the
     # central region. Dwarfs/LSB are returned unchanged.
-    g = rescale_stellar_inner(galaxy_tag, g_raw)
+    g = rescale_stellar_inner(galaxy_tag, g_raw, info=info)
 
     # For the Milky Way, restrict the working radius range to ~30 kpc so that
     # the fit and plots are comparable to SPARC galaxies, which typically have
@@ -419,13 +506,39 @@ def fit_galaxy_v2(csv_path: str):
                 Sigma_star=g.Sigma_star[mask],
             )
             print(f"[MW] Restricted to R <= 30 kpc ({mask.sum()} points)")
+            if info is not None:
+                info["R_max_cut"] = 30.0
+
+    return galaxy_tag, g
+
+
+def fit_galaxy_v2(csv_path: str, n_starts: int = 1, n_workers: int = 1, plot: bool = True) -> dict:
+    """
+    Fit one galaxy and (optionally) write out/<tag>_v2_summary.svg.
+
+    Returns a JSON-serializable record: status ("ok" or "blacklisted"),
+    best-fit Vflat2, chi2 (fit objective, outer/inner/all radii), Rd, bulge
+    edge, fit edge, applied corrections (rescale_s, ...) and timings [s].
+    """
+    t_start = time.perf_counter()
+    galaxy_tag = os.path.splitext(os.path.basename(csv_path))[0].replace("_sparc", "")
+    # Hard blacklist for galaxies that are clearly incompatible with the
+    # simple v2 assumptions (e.g. strong counter-rotating bulges).
+    # These should be documented in memo/galaxy/blacklist.md.
+    blacklist = {"NGC7331"}
+    if galaxy_tag.upper() in blacklist:
+        print(f"[{galaxy_tag}] Skipping v2 fit (blacklisted for global stats).")
+        return {"tag": galaxy_tag, "status": "blacklisted"}
+
+    info: dict = {}
+    _, g = prepare_galaxy_v2(csv_path, info=info)
 
     # Diagnostic Sigma_gas-based transition (for logging only)
     R_t_est, dR_est = estimate_transition_radius(g.R_kpc, g.Sigma_gas)
     print(f"Sigma_gas-based transition (diagnostic): R_t ≈ {R_t_est:.2f} kpc, dR ≈ {dR_est:.2f} kpc")
 
     # Rd and bulge edge from stars (used for R_t definition)
-    Rd, R_bulge_edge = estimate_Rd_and_bulge_edge(g.R_kpc, g.Sigma_star, g.Vbul, g.Vdisk)
+    Rd, R_bulge_edge, vmax = galaxy_scales(g)
     print(f"Estimated Rd ≈ {Rd:.2f} kpc, bulge edge ≈ {R_bulge_edge:.2f} kpc")
 
     # Initial guess: Vflat2 from outer observed v^2, kappa~3
@@ -436,7 +549,6 @@ def fit_galaxy_v2(csv_path: str):
     else:
         Vflat0 = 1.0
     # Dwarf vs L* handling for kappa bounds
-    vmax = float(np.nanmax(g.Vobs))
     if vmax < 80.0:
         # dwarf / low-mass: allow R_t to start as close as 0.5 Rd
         kappa_min = 0.5
@@ -450,20 +562,29 @@ def fit_galaxy_v2(csv_path: str):
         (1.0, 5e4),      # Vflat2
     ]
 
-    res = minimize(
-        lambda x: chi2_v2(x, g),
-        x0,
-        method="L-BFGS-B",
-        bounds=bounds,
-    )
-    print("Best-fit v2 params [Vflat2]:", res.x)
-    print("chi2_v2 =", res.fun)
+    objective = partial(chi2_v2_and_grad, g=FitContext.from_galaxy(g))
+    t_fit = time.perf_counter()
+    if n_starts > 1:
+        from fdb_optim import multistart_minimize
+
+        # kappa (x0[1]) is a legacy entry that chi2_v2 does not use
+        ms = multistart_minimize(
+            objective, x0[: len(bounds)], bounds, n_starts=n_starts, jac=True, n_workers=n_workers
+        )
+        print(ms.summary())
+        best_x, best_fun = ms.x, ms.fun
+    else:
+        res = minimize(objective, x0[: len(bounds)], method="L-BFGS-B", jac=True, bounds=bounds)
+        best_x, best_fun = res.x, res.fun
+    t_fit = time.perf_counter() - t_fit
+    print("Best-fit v2 params [Vflat2]:", best_x)
+    print("chi2_v2 =", best_fun)
 
     # Build model curve
-    Vflat2 = float(res.x[0])
+    Vflat2 = float(best_x[0])
     R = g.R_kpc
     Vn = np.sqrt(np.clip(g.Vdisk**2 + g.Vgas**2 + g.Vbul**2, 0, None))
-    Rd, R_bulge_edge = estimate_Rd_and_bulge_edge(R, g.Sigma_star, g.Vbul, g.Vdisk)
+    Rd, R_bulge_edge, vmax = galaxy_scales(g)
     # R_bulge_edge は v2 では使わず、幾何スケール Rd のみを用いる
     f_geom = coupling_from_scale(R, Rd)
     g_gas = gas_smoothing_factor(g.Sigma_gas)
@@ -473,7 +594,6 @@ def fit_galaxy_v2(csv_path: str):
 
     # Report chi2 for outer (fit), inner, and all radii for evaluation
     err_all = np.sqrt(g.eVobs**2 + 8.0**2)
-    vmax = float(np.nanmax(g.Vobs))
     if vmax < 80.0:
         R_star_edge = 2.0 * Rd
     else:
@@ -492,6 +612,28 @@ def fit_galaxy_v2(csv_path: str):
     print(f"chi2_v2 (inner, R<=3Rd) = {chi2_inner:.3f}")
     print(f"chi2_v2 (all radii) = {chi2_all:.3f}")
 
+    result = {
+        "tag": galaxy_tag,
+        "status": "ok",
+        "Vflat2": float(Vflat2),
+        "chi2_fit": float(best_fun),
+        "chi2_outer": chi2_outer,
+        "chi2_inner": chi2_inner,
+        "chi2_all": chi2_all,
+        "n_outer": int(mask_outer.sum()),
+        "n_points": int(R.size),
+        "Rd": float(Rd),
+        "R_bulge_edge": float(R_bulge_edge),
+        "R_star_edge": float(R_star_edge),
+        "rescale_s": info.get("rescale_s", 1.0),
+        **{k: v for k, v in info.items() if k != "rescale_s"},
+        "n_starts": int(n_starts),
+        "t_fit": t_fit,
+    }
+    if not plot:
+        result["t_total"] = time.perf_counter() - t_start
+        return result
+
     # Plot
     os.makedirs("out", exist_ok=True)
     fig, (ax0, ax1) = plt.subplots(2, 1, figsize=(7, 6))
@@ -525,10 +667,14 @@ def fit_galaxy_v2(csv_path: str):
     plt.savefig(out_svg, format="svg")
     plt.close(fig)
     print(f"Saved {out_svg}")
+    result["t_total"] = time.perf_counter() - t_start
+    return result
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: fdb2_fit.py <sparc_csv>")
-        sys.exit(1)
-    fit_galaxy_v2(sys.argv[1])
+    ap = argparse.ArgumentParser(description="FDB v2 rotation-curve fit for a single SPARC galaxy.")
+    ap.add_argument("sparc_csv")
+    ap.add_argument("--multistart", type=int, default=1, help="number of L-BFGS-B starts (see fdb_optim.py)")
+    ap.add_argument("--workers", type=int, default=1, help="processes for --multistart")
+    args = ap.parse_args()
+    fit_galaxy_v2(args.sparc_csv, n_starts=args.multistart, n_workers=args.workers)
@@ -18,13 +18,17 @@ for each galaxy g. Here we fit:
 against the outer-disk chi^2 (the same definition as chi2_v2 in fdb2_fit.py).
 
 This script is intended as a lightweight "common kernel" test across
-the current working set of 16 galaxies (L* spirals + dwarfs).
+the current working set of 16 galaxies (L* spirals + dwarfs); other sets can
+be given with --galaxies / --tags-file.  Incremental membership changes and
+jackknife over galaxies: fdb_joint.py --model fdb2_multi.
 """
 
 from __future__ import annotations
 
+import argparse
 import os
 from dataclasses import dataclass
+from functools import partial
 from typing import List, Tuple
 
 import numpy as np
@@ -32,9 +36,14 @@ import pandas as pd
 from scipy.optimize import minimize
 
 from fdb2_fit import (
+    FitContext,
     GalaxyData,
+    attach_index_scales,
+    galaxy_scales,
     load_sparc_csv,
     chi2_v2,
+    chi2_v2_and_grad,
+    chi2_v2_batch,
 )
 
 
@@ -60,21 +69,32 @@ GALAXY_TAGS = [
 ]
 
 
-def load_galaxies() -> List[Tuple[str, GalaxyData]]:
+def load_galaxies(tags: List[str] | None = None, build_dir: str = "build") -> List[Tuple[str, GalaxyData]]:
+    """Load build/<tag>_sparc.csv for each tag (default: GALAXY_TAGS)."""
     galaxies: List[Tuple[str, GalaxyData]] = []
-    for tag in GALAXY_TAGS:
-        csv_path = os.path.join("build", f"{tag}_sparc.csv")
+    for tag in GALAXY_TAGS if tags is None else tags:
+        csv_path = os.path.join(build_dir, f"{tag}_sparc.csv")
         if not os.path.exists(csv_path):
             raise FileNotFoundError(csv_path)
-        g = load_sparc_csv(csv_path)
+        g = attach_index_scales(load_sparc_csv(csv_path), csv_path)
         galaxies.append((tag, g))
     return galaxies
 
 
+def fit_contexts(
+    galaxies: List[Tuple[str, GalaxyData]], sigma_model: float = 8.0
+) -> List[Tuple[str, FitContext]]:
+    """(tag, FitContext) per galaxy; pass these to the total_chi2_multi* objectives."""
+    return [(tag, FitContext.from_galaxy(g, sigma_model)) for tag, g in galaxies]
+
+
 def total_chi2_multi(params: np.ndarray, galaxies: List[Tuple[str, GalaxyData]]) -> float:
     """
     params = [Delta_v2, eps, kappa_0, ..., kappa_{N-1}]
     chi2 = sum_g chi2_v2([Delta_v2, eps, kappa_g], g)
+
+    galaxies may hold GalaxyData or, for repeated evaluation, FitContext
+    records (fit_contexts).
     """
     Delta_v2, eps = params[0], params[1]
     kappas = params[2:]
@@ -97,10 +117,54 @@ def total_chi2_multi(params: np.ndarray, galaxies: List[Tuple[str, GalaxyData]])
     return float(chi2_tot)
 
 
-def main():
-    galaxies = load_galaxies()
-    n_gal = len(galaxies)
+def total_chi2_multi_and_grad(
+    params: np.ndarray, galaxies: List[Tuple[str, GalaxyData]]
+) -> Tuple[float, np.ndarray]:
+    """
+    total_chi2_multi and its exact gradient, for L-BFGS-B with jac=True.
+    chi2_v2 only uses Delta_v2, so eps and the kappas get zero gradient.
+    """
+    params = np.asarray(params, dtype=float)
+    grad = np.zeros_like(params)
+    Delta_v2, eps = params[0], params[1]
+    kappas = params[2:]
+    if Delta_v2 < 0 or not (0.0 <= eps <= 0.5):
+        return 1e30, grad
+    if len(kappas) != len(galaxies):
+        return 1e30, grad
 
+    chi2_tot = 0.0
+    for (tag, g), kappa in zip(galaxies, kappas):
+        if kappa <= 0.0 or kappa > 5.0:
+            return 1e30, np.zeros_like(params)
+        chi2_g, grad_g = chi2_v2_and_grad(np.array([Delta_v2, eps, kappa]), g)
+        if not np.isfinite(chi2_g) or chi2_g >= 1e29:
+            return 1e30, np.zeros_like(params)
+        chi2_tot += chi2_g
+        grad[0] += grad_g[0]
+    return float(chi2_tot), grad
+
+
+def total_chi2_multi_batch(params: np.ndarray, galaxies: List[Tuple[str, GalaxyData]]) -> np.ndarray:
+    """total_chi2_multi for a batch of parameter vectors, shape (n, 2 + N) -> (n,)."""
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    Delta_v2, eps = params[:, 0], params[:, 1]
+    kappas = params[:, 2:]
+    if kappas.shape[1] != len(galaxies):
+        return np.full(params.shape[0], 1e30)
+    ok = (Delta_v2 >= 0) & (eps >= 0.0) & (eps <= 0.5)
+    ok &= np.all((kappas > 0.0) & (kappas <= 5.0), axis=1)
+
+    chi2_tot = np.zeros(params.shape[0])
+    for i, (tag, g) in enumerate(galaxies):
+        chi2_g = chi2_v2_batch(params[:, [0, 1, 2 + i]], g)
+        ok &= np.isfinite(chi2_g) & (chi2_g < 1e29)
+        chi2_tot += np.where(ok, chi2_g, 0.0)
+    return np.where(ok, chi2_tot, 1e30)
+
+
+def initial_guess(galaxies: List[Tuple[str, GalaxyData]]) -> Tuple[np.ndarray, List[Tuple[float, float]]]:
+    """Start vector and bounds for total_chi2_multi."""
     # Rough initial guess for Delta_v2: average of per-galaxy outer v^2 excess.
     # For simplicity we take a single representative value.
     # Here we approximate from a typical L* (can be refined if needed).
@@ -109,7 +173,7 @@ def main():
     # Initial kappa: 3 for L* spirals, 1.5 for dwarfs (vmax<80 km/s)
     kappa0 = []
     for tag, g in galaxies:
-        vmax = float(np.nanmax(g.Vobs))
+        vmax = galaxy_scales(g)[2]
         if vmax < 80.0:
             kappa0.append(1.5)
         else:
@@ -122,19 +186,43 @@ def main():
     bounds.append((0.0, 5e4))   # Delta_v2
     bounds.append((0.0, 0.5))   # eps
     for tag, g in galaxies:
-        vmax = float(np.nanmax(g.Vobs))
+        vmax = galaxy_scales(g)[2]
         if vmax < 80.0:
             bounds.append((0.5, 5.0))
         else:
             bounds.append((1.0, 5.0))
+    return x0, bounds
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Multi-galaxy FDB v2 fit.")
+    ap.add_argument("--galaxies", nargs="+", default=None, help="galaxy tags (default: GALAXY_TAGS)")
+    ap.add_argument("--tags-file", default=None, help="file with one galaxy tag per line")
+    ap.add_argument("--build-dir", default="build")
+    ap.add_argument("--multistart", type=int, default=1, help="number of L-BFGS-B starts (see fdb_optim.py)")
+    ap.add_argument("--workers", type=int, default=1, help="processes for --multistart")
+    args = ap.parse_args()
+
+    tags = args.galaxies
+    if args.tags_file:
+        with open(args.tags_file, "r", encoding="utf-8") as f:
+            tags = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    galaxies = load_galaxies(tags, build_dir=args.build_dir)
+    n_gal = len(galaxies)
+
+    x0, bounds = initial_guess(galaxies)
 
     print(f"# galaxies in multi-fit: {n_gal}")
-    res = minimize(
-        lambda v: total_chi2_multi(v, galaxies),
-        x0,
-        method="L-BFGS-B",
-        bounds=bounds,
-    )
+    objective = partial(total_chi2_multi_and_grad, galaxies=fit_contexts(galaxies))
+    if args.multistart > 1:
+        from fdb_optim import multistart_minimize
+
+        res = multistart_minimize(
+            objective, x0, bounds, n_starts=args.multistart, jac=True, n_workers=args.workers
+        )
+        print(res.summary())
+    else:
+        res = minimize(objective, x0, method="L-BFGS-B", jac=True, bounds=bounds)
 
     Delta_v2, eps = res.x[0], res.x[1]
     kappas = res.x[2:]
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Sample-wide profile-likelihood scan of the fdb2 coupling length λ_C.
+
+fdb2_fit.chi2_v2 uses the geometric coupling f(L/λ_C) of
+fdb2_fit.coupling_from_scale with λ_C fixed at 30 kpc.  Here λ_C runs over a
+log grid and, for every (galaxy, λ_C), the galaxy's Vflat2 is profiled out:
+
+    chi2_prof(λ_C) = sum_g min_{Vflat2} chi2_v2(Vflat2; g, λ_C)
+
+All galaxies are padded to a common number of fit points (pads carry zero
+weight), so the couplings are one (galaxy × λ_C × R) array and the Vflat2
+profile is a batched 1-D minimization over the (galaxy × λ_C) matrix: a
+coarse log grid over the fdb2_fit bounds [1, 5e4] brackets the minimum, then
+golden-section search narrows every bracket at once.  The fit points
+(R > 2 Rd or 3 Rd) and the error model are those of fdb2_fit.FitContext and
+do not depend on λ_C.
+
+Usage:
+  python scripts/fdb2_lambda_scan.py
+  python scripts/fdb2_lambda_scan.py --lambda-min 1 --lambda-max 1000 --n-lambda 121 --out out/lambda_scan.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from fdb2_fit import FitContext, coupling_from_scale
+from fdb2_fit_multi import fit_contexts, load_galaxies
+
+VFLAT2_BOUNDS = (1.0, 5e4)
+_GOLDEN = 0.5 * (np.sqrt(5.0) - 1.0)
+
+
+@dataclass
+class PaddedSample:
+    """Fit points of all galaxies as (n_gal, n_max) arrays; padded entries have w = 0."""
+    tags: List[str]
+    R: np.ndarray
+    Rd: np.ndarray      # (n_gal,)
+    Vn2: np.ndarray
+    Vobs: np.ndarray
+    w: np.ndarray       # 1 / (eVobs^2 + sigma_model^2), 0 on pads
+
+    @classmethod
+    def from_contexts(cls, contexts: List[Tuple[str, FitContext]]) -> "PaddedSample":
+        contexts = [(tag, ctx) for tag, ctx in contexts if ctx.n_fit > 0]
+        n_max = max((ctx.n_fit for _, ctx in contexts), default=0)
+        shape = (len(contexts), n_max)
+        R, Vn2, Vobs, w = (np.zeros(shape) for _ in range(4))
+        for i, (_, ctx) in enumerate(contexts):
+            g, n = ctx.galaxy, ctx.n_fit
+            R[i, :n] = g.R_kpc[ctx.mask]
+            Vn2[i, :n] = np.clip(g.Vdisk**2 + g.Vgas**2 + g.Vbul**2, 0, None)[ctx.mask]
+            Vobs[i, :n] = ctx.Vobs
+            w[i, :n] = ctx.inv_err2
+        Rd = np.array([ctx.Rd for _, ctx in contexts])
+        return cls([tag for tag, _ in contexts], R, Rd, Vn2, Vobs, w)
+
+    def coupling(self, lambdas: np.ndarray) -> np.ndarray:
+        """f(max(R, Rd)/λ_C) as a (n_gal, n_lambda, n_max) array."""
+        lam = np.asarray(lambdas, dtype=float)[None, :, None]
+        return coupling_from_scale(self.R[:, None, :], self.Rd[:, None, None], lam)
+
+
+def _chi2(Vflat2: np.ndarray, W: np.ndarray, S: PaddedSample) -> np.ndarray:
+    """chi2_v2 for every (galaxy, λ_C) entry of Vflat2 (shape W.shape[:2])."""
+    V2 = S.Vn2[:, None, :] + W * (Vflat2[..., None] - S.Vn2[:, None, :])
+    resid = S.Vobs[:, None, :] - np.sqrt(np.clip(V2, 0.0, None))
+    return np.einsum("glr,gr->gl", resid * resid, S.w)
+
+
+def profile_vflat2(
+    W: np.ndarray, S: PaddedSample, n_grid: int = 48, n_golden: int = 48
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vflat2 minimizing chi2_v2 for every (galaxy, λ_C); returns (Vflat2, chi2),
+    both (n_gal, n_lambda).  The coarse grid brackets the minimum between its
+    neighbours, golden-section search then shrinks the brackets by
+    0.618**n_golden (of the grid spacing in log Vflat2).
+    """
+    lo_b, hi_b = np.log(VFLAT2_BOUNDS[0]), np.log(VFLAT2_BOUNDS[1])
+    grid = np.linspace(lo_b, hi_b, n_grid)
+    coarse = np.stack([_chi2(np.full(W.shape[:2], np.exp(u)), W, S) for u in grid], axis=-1)
+    k = np.argmin(coarse, axis=-1)
+    a = grid[np.maximum(k - 1, 0)]
+    b = grid[np.minimum(k + 1, n_grid - 1)]
+
+    c = b - _GOLDEN * (b - a)
+    d = a + _GOLDEN * (b - a)
+    fc, fd = _chi2(np.exp(c), W, S), _chi2(np.exp(d), W, S)
+    for _ in range(n_golden):
+        left = fc < fd
+        a, b = np.where(left, a, c), np.where(left, d, b)
+        # one interior point carries over, the other is new
+        c, d = np.where(left, b - _GOLDEN * (b - a), d), np.where(left, c, a + _GOLDEN * (b - a))
+        f_new = _chi2(np.exp(np.where(left, c, d)), W, S)
+        fc, fd = np.where(left, f_new, fd), np.where(left, fc, f_new)
+    Vflat2 = np.clip(np.exp(0.5 * (a + b)), *VFLAT2_BOUNDS)
+    chi2 = _chi2(Vflat2, W, S)
+    # a bound can beat the interior when the minimum sits on it
+    at_edge = np.minimum(coarse[..., 0], coarse[..., -1])
+    edge_u = np.where(coarse[..., 0] <= coarse[..., -1], lo_b, hi_b)
+    use_edge = at_edge < chi2
+    return np.where(use_edge, np.exp(edge_u), Vflat2), np.where(use_edge, at_edge, chi2)
+
+
+@dataclass
+class LambdaScan:
+    tags: List[str]
+    lambdas: np.ndarray     # (n_lambda,)
+    Vflat2: np.ndarray      # (n_gal, n_lambda) profiled Vflat2
+    chi2: np.ndarray        # (n_gal, n_lambda) profiled chi2_v2
+    n_fit: int              # fit points over the sample
+
+    @property
+    def total(self) -> np.ndarray:
+        return self.chi2.sum(axis=0)
+
+    def best(self) -> Tuple[float, float]:
+        """(λ_C, chi2) at the minimum, refined by a parabola in log λ_C through the grid minimum."""
+        tot = self.total
+        k = int(np.argmin(tot))
+        if 0 < k < len(tot) - 1:
+            x = np.log(self.lambdas[k - 1 : k + 2])
+            c2, c1, c0 = np.polyfit(x, tot[k - 1 : k + 2], 2)
+            if c2 > 0:
+                x_min = -c1 / (2.0 * c2)
+                return float(np.exp(x_min)), float(c0 + c1 * x_min + c2 * x_min**2)
+        return float(self.lambdas[k]), float(tot[k])
+
+    def interval(self, delta: float = 1.0) -> Tuple[Optional[float], Optional[float]]:
+        """
+        λ_C where the profile crosses min + delta (log-linear interpolation);
+        None = not on the grid.  The minimum is the refined one of best(),
+        inserted into the profile, so the interval always contains it.
+        """
+        lam_best, chi2_best = self.best()
+        k = int(np.searchsorted(np.log(self.lambdas), np.log(lam_best)))
+        x = np.insert(np.log(self.lambdas), k, np.log(lam_best))
+        tot = np.insert(self.total, k, chi2_best)
+        level = chi2_best + delta
+
+        def crossing(idx: range) -> Optional[float]:
+            prev = k
+            for i in idx:
+                if tot[i] >= level:
+                    t = (level - tot[prev]) / (tot[i] - tot[prev])
+                    return float(np.exp(x[prev] + t * (x[i] - x[prev])))
+                prev = i
+            return None
+
+        return crossing(range(k - 1, -1, -1)), crossing(range(k + 1, len(tot)))
+
+
+def scan_lambda(
+    contexts: List[Tuple[str, FitContext]],
+    lambdas: np.ndarray,
+    n_grid: int = 48,
+    n_golden: int = 48,
+) -> LambdaScan:
+    """Profile Vflat2 out of chi2_v2 for every galaxy and λ_C in one batched job."""
+    S = PaddedSample.from_contexts(contexts)
+    lambdas = np.asarray(lambdas, dtype=float)
+    Vflat2, chi2 = profile_vflat2(S.coupling(lambdas), S, n_grid=n_grid, n_golden=n_golden)
+    return LambdaScan(S.tags, lambdas, Vflat2, chi2, int(np.count_nonzero(S.w)))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Profile-likelihood scan of λ_C for the fdb2 kernel.")
+    ap.add_argument("--galaxies", nargs="+", default=None, help="galaxy tags (default: fdb2_fit_multi.GALAXY_TAGS)")
+    ap.add_argument("--tags-file", default=None, help="file with one galaxy tag per line")
+    ap.add_argument("--build-dir", default="build")
+    ap.add_argument("--lambda-min", type=float, default=1.0, help="kpc")
+    ap.add_argument("--lambda-max", type=float, default=1000.0, help="kpc")
+    ap.add_argument("--n-lambda", type=int, default=61, help="log-spaced grid points")
+    ap.add_argument("--sigma-model", type=float, default=8.0)
+    ap.add_argument("--out", default=None, help="CSV with the per-galaxy profile chi2 and Vflat2")
+    args = ap.parse_args()
+
+    tags = args.galaxies
+    if args.tags_file:
+        with open(args.tags_file, "r", encoding="utf-8") as f:
+            tags = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    contexts = fit_contexts(load_galaxies(tags, build_dir=args.build_dir), sigma_model=args.sigma_model)
+    lambdas = np.geomspace(args.lambda_min, args.lambda_max, args.n_lambda)
+
+    t0 = time.perf_counter()
+    scan = scan_lambda(contexts, lambdas)
+    dt = time.perf_counter() - t0
+    skipped = sorted({tag for tag, _ in contexts} - set(scan.tags))
+    print(f"# {len(scan.tags)} galaxies, {scan.n_fit} fit points, {len(lambdas)} λ_C values ({dt:.2f} s)")
+    if skipped:
+        print(f"# no outer-disk points, skipped: {' '.join(skipped)}")
+
+    tot = scan.total
+    print(f"  {'λ_C[kpc]':>9s} {'chi2_prof':>11s}")
+    for lam, c in zip(lambdas, tot):
+        print(f"  {lam:9.3g} {c:11.4g}")
+    lam_best, chi2_best = scan.best()
+    lo, hi = scan.interval(1.0)
+    fmt = lambda v: f"{v:.3g}" if v is not None else "--"
+    print(f"Best λ_C = {lam_best:.4g} kpc  (chi2 = {chi2_best:.6g}, dof = {scan.n_fit - len(scan.tags) - 1})")
+    print(f"  Δchi2 = 1 interval: [{fmt(lo)}, {fmt(hi)}] kpc")
+    print("Per-galaxy λ_C minimum (grid):")
+    for i, tag in enumerate(scan.tags):
+        k = int(np.argmin(scan.chi2[i]))
+        print(f"  {tag:10s}: λ_C = {lambdas[k]:8.3g}  Vflat2 = {scan.Vflat2[i, k]:9.4g}  chi2 = {scan.chi2[i, k]:.4g}")
+
+    if args.out:
+        import pandas as pd
+
+        df = pd.DataFrame({"lambda_c_kpc": lambdas, "chi2_total": tot})
+        for i, tag in enumerate(scan.tags):
+            df[f"chi2_{tag}"] = scan.chi2[i]
+            df[f"Vflat2_{tag}"] = scan.Vflat2[i]
+        df.to_csv(args.out, index=False)
+        print(f"Saved scan to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
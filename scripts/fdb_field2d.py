@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Non-axisymmetric FDB field solver on 2-D surface-density maps.
+
+All 1-D kernels (fdb_fit.softened_kernel_accel, the v^2 mixing models) assume
+axisymmetric radial profiles.  This module takes gridded face-on maps of
+Sigma_star and Sigma_gas [Msun/pc^2] (moment maps deprojected to the disk
+plane, or synthetic disks with bars/spirals) and computes the in-plane
+acceleration field of
+
+    a(x) = sum_x' m(x') k(x - x'),
+    k(s) = -G s_vec [ (1 - f(s)) / (s^2 + eps^2)^{3/2} + f(s) / (λ_C (s^2 + eps^2)) ],
+    f(s) = x / (1 + x),  x = s / λ_C,
+
+i.e. the Newtonian 1/r^2 force blended into the 1/r FDB tail with the same
+saturating form as fdb2_fit.coupling_from_scale, but evaluated on the
+separation so that the kernel is translation invariant.  lambda_c_kpc=None
+gives the purely Newtonian thin disk.
+
+The sum is a zero-padded (linear, non-periodic) FFT convolution.  Kernel
+transforms are cached per (grid shape, pixel, eps, λ_C) in a small LRU
+(KERNEL_CACHE_SIZE entries; a 1024^2 entry is ~67 MB), so repeated solves on
+the same grid (fits) only pay for one forward and two inverse FFTs, while a
+λ_C or eps scan keeps memory bounded.  A 1024^2 map takes about 0.5 s on a CPU.
+
+From the acceleration field, circular_velocity_map() gives v_c^2 = R (-a·R_hat)
+and los_velocity_map() projects the implied tangential speed onto the line of
+sight; the inclination may be a per-pixel map to mimic warps.
+
+Usage (timing + Freeman-disk sanity check):
+  python scripts/fdb_field2d.py --n 1024 --bar 0.3
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy import fft as sfft
+
+from fdb_fit import G
+
+KERNEL_CACHE_SIZE = 4
+_KERNEL_FFT_CACHE: "OrderedDict[tuple, Tuple[np.ndarray, np.ndarray, Tuple[int, int]]]" = OrderedDict()
+
+
+def _kernel_fft(
+    shape: Tuple[int, int],
+    pixel_kpc: float,
+    eps_kpc: float,
+    lambda_c_kpc: Optional[float],
+) -> Tuple[np.ndarray, np.ndarray, Tuple[int, int]]:
+    key = (shape, float(pixel_kpc), float(eps_kpc), None if lambda_c_kpc is None else float(lambda_c_kpc))
+    cached = _KERNEL_FFT_CACHE.get(key)
+    if cached is not None:
+        _KERNEL_FFT_CACHE.move_to_end(key)
+        return cached
+    ny, nx = shape
+    fy = sfft.next_fast_len(2 * ny - 1, real=True)
+    fx = sfft.next_fast_len(2 * nx - 1, real=True)
+    # lags laid out circularly: 0..n-1 then -(n-1)..-1 at the end
+    iy = np.arange(fy)
+    ix = np.arange(fx)
+    lag_y = np.where(iy < ny, iy, iy - fy).astype(float)
+    lag_x = np.where(ix < nx, ix, ix - fx).astype(float)
+    sy = lag_y[:, None] * pixel_kpc
+    sx = lag_x[None, :] * pixel_kpc
+    s2 = sx**2 + sy**2
+    soft2 = s2 + eps_kpc**2
+    radial = 1.0 / soft2**1.5
+    if lambda_c_kpc is not None:
+        xs = np.sqrt(s2) / lambda_c_kpc
+        f = xs / (1.0 + xs)
+        radial = (1.0 - f) * radial + f / (lambda_c_kpc * soft2)
+    # lags that do not correspond to any source/target pair stay zero
+    valid = (np.abs(lag_y) < ny)[:, None] & (np.abs(lag_x) < nx)[None, :]
+    radial = np.where(valid, radial, 0.0)
+    kx = sfft.rfft2(-G * sx * radial, workers=-1)
+    ky = sfft.rfft2(-G * sy * radial, workers=-1)
+    _KERNEL_FFT_CACHE[key] = (kx, ky, (fy, fx))
+    while len(_KERNEL_FFT_CACHE) > KERNEL_CACHE_SIZE:
+        _KERNEL_FFT_CACHE.popitem(last=False)
+    return _KERNEL_FFT_CACHE[key]
+
+
+def accel_field(
+    Sigma_star: np.ndarray,
+    Sigma_gas: np.ndarray,
+    pixel_kpc: float,
+    ml_scale: float = 1.0,
+    eps_kpc: Optional[float] = None,
+    lambda_c_kpc: Optional[float] = 30.0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    In-plane acceleration (a_x, a_y) [(km/s)^2/kpc] on the map pixels.
+
+    Sigma maps are [Msun/pc^2] on a square pixel grid of size pixel_kpc;
+    x runs along axis 1 and y along axis 0.  eps_kpc defaults to one pixel.
+    """
+    Sigma = ml_scale * np.asarray(Sigma_star, dtype=float) + np.asarray(Sigma_gas, dtype=float)
+    Sigma = np.nan_to_num(Sigma, nan=0.0)
+    if eps_kpc is None:
+        eps_kpc = pixel_kpc
+    ny, nx = Sigma.shape
+    kx, ky, fshape = _kernel_fft((ny, nx), pixel_kpc, eps_kpc, lambda_c_kpc)
+    mass = Sigma * 1e6 * pixel_kpc**2  # [Msun per pixel]
+    m_hat = sfft.rfft2(mass, s=fshape, workers=-1)
+    ax = sfft.irfft2(m_hat * kx, s=fshape, workers=-1)[:ny, :nx]
+    ay = sfft.irfft2(m_hat * ky, s=fshape, workers=-1)[:ny, :nx]
+    return ax, ay
+
+
+def pixel_coords(shape: Tuple[int, int], pixel_kpc: float, center: Optional[Tuple[float, float]] = None):
+    """(x, y) [kpc] of pixel centres relative to `center` (pixel units; default map centre)."""
+    ny, nx = shape
+    if center is None:
+        center = ((nx - 1) / 2.0, (ny - 1) / 2.0)
+    x = (np.arange(nx) - center[0]) * pixel_kpc
+    y = (np.arange(ny) - center[1]) * pixel_kpc
+    return np.meshgrid(x, y)
+
+
+def circular_velocity_map(ax: np.ndarray, ay: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """v_c = sqrt(R * inward radial acceleration), zero where the force points outward."""
+    R = np.hypot(x, y)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        a_in = -(ax * x + ay * y) / np.where(R > 0, R, 1.0)
+    return np.sqrt(np.clip(R * a_in, 0.0, None))
+
+
+def los_velocity_map(
+    ax: np.ndarray,
+    ay: np.ndarray,
+    x: np.ndarray,
+    y: np.ndarray,
+    inc_deg,
+    pa_deg: float = 0.0,
+    v_sys: float = 0.0,
+    sense: int = 1,
+) -> np.ndarray:
+    """
+    Line-of-sight velocity on the disk-plane pixels.
+
+    The local circular speed is taken as the tangential velocity (no
+    streaming/epicyclic terms), so
+        v_los = v_sys + sense * v_c(x, y) * cos(phi - pa) * sin(inc),
+    with phi the disk-plane azimuth and pa the line of nodes.  inc_deg may be
+    an array of the map shape (tilted-ring style warp).
+    """
+    vc = circular_velocity_map(ax, ay, x, y)
+    phi = np.arctan2(y, x)
+    inc = np.deg2rad(np.asarray(inc_deg, dtype=float))
+    return v_sys + sense * vc * np.cos(phi - np.deg2rad(pa_deg)) * np.sin(inc)
+
+
+def synthetic_disk(
+    n: int,
+    pixel_kpc: float,
+    Rd: float = 3.0,
+    Sigma0: float = 500.0,
+    bar_amp: float = 0.0,
+    bar_len: float = 4.0,
+    gas_frac: float = 0.1,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Exponential disk (optionally with an m=2 bar) as (Sigma_star, Sigma_gas) maps."""
+    x, y = pixel_coords((n, n), pixel_kpc)
+    R = np.hypot(x, y)
+    phi = np.arctan2(y, x)
+    star = Sigma0 * np.exp(-R / Rd) * (1.0 + bar_amp * np.cos(2 * phi) * np.exp(-((R / bar_len) ** 2)))
+    gas = gas_frac * Sigma0 * np.exp(-R / (2.0 * Rd))
+    return star, gas
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="2-D FDB field solver timing / sanity check.")
+    ap.add_argument("--n", type=int, default=1024)
+    ap.add_argument("--pixel", type=float, default=0.05, help="pixel size [kpc]")
+    ap.add_argument("--bar", type=float, default=0.0, help="m=2 bar amplitude")
+    ap.add_argument("--lambda-c", type=float, default=None, help="λ_C [kpc]; default Newtonian only")
+    args = ap.parse_args()
+
+    star, gas = synthetic_disk(args.n, args.pixel, bar_amp=args.bar, gas_frac=0.0)
+    t0 = time.perf_counter()
+    ax, ay = accel_field(star, gas, args.pixel, lambda_c_kpc=args.lambda_c)
+    t1 = time.perf_counter()
+    ax, ay = accel_field(star, gas, args.pixel, lambda_c_kpc=args.lambda_c)
+    t2 = time.perf_counter()
+    print(f"{args.n}^2 map: first solve {t1 - t0:.2f} s, cached-kernel solve {t2 - t1:.2f} s")
+
+    x, y = pixel_coords(star.shape, args.pixel)
+    vc = circular_velocity_map(ax, ay, x, y)
+    if args.lambda_c is None and args.bar == 0.0:
+        from scipy.special import i0, i1, k0, k1
+
+        Rd, Sigma0 = 3.0, 500.0
+        row = args.n // 2
+        for R in (2.0, 4.0, 6.0, 10.0):
+            j = int(round(R / args.pixel + (args.n - 1) / 2.0))
+            if j >= args.n:
+                continue
+            Rj = x[row, j]
+            yy = Rj / (2 * Rd)
+            v2 = 4 * np.pi * G * Sigma0 * 1e6 * Rd * yy**2 * (i0(yy) * k0(yy) - i1(yy) * k1(yy))
+            print(f"  R={Rj:5.2f} kpc: v_c(map)={vc[row, j]:7.2f}  Freeman={np.sqrt(v2):7.2f} km/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ This version implements:
 - Newton-only sanity using rotmod Vdisk/Vgas/Vbul when present.
 - Shell-weighted FDB kernel acting on gas-prior surface density \(\Sigma_{\rm env}=\Sigma_{\rm gas}+\beta\Sigma_\star\).
 - Δv² add-on: \(v_{\rm tot}^2 = v_{\rm Newt}^2 + \Delta v_{\rm FDB}^2\).
+  Δv²_FDB is either a constant (--model rotmod, default) or R|a_R| from the
+  precomputed shell-weighted kernel operator (--model kernel).
 - Outer-only fit (r > 2 R_d) with model noise in quadrature.
 - Residual plot saved per run.
 
@@ -14,10 +16,11 @@ R_kpc, Vobs, eVobs, Vgas_rotmod, Vdisk_rotmod, Vbul_rotmod,
 Sigma_star (Msun/pc^2), Sigma_gas (Msun/pc^2)
 """
 
-import sys
+import argparse
 import os
 from dataclasses import dataclass
-from typing import Tuple, Dict
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -121,6 +124,44 @@ def estimate_Rd(data: GalaxyData) -> float:
     return -1.0 / slope
 
 
+@dataclass
+class KernelOperator:
+    """
+    Precomputed geometric part of the shell-weighted softened kernel.
+
+    matrix[i, j] holds -G * (2π R'_j dR'_j) * ∂/∂R (softened 1/r) between
+    R_eval[i] and R_grid[j] (with the pc^-2 -> kpc^-2 factor folded in), so that
+
+        a_R = matrix @ (Sigma_env * [1 + alpha * shell(R')]).
+
+    Only the shell weight depends on (alpha, R_ev, sigma_ev); the matrix is built
+    once per (R_eval, R_grid, eps).
+    """
+    R_eval: np.ndarray
+    R_grid: np.ndarray
+    eps: float
+    matrix: np.ndarray
+
+    def apply(self, weights: np.ndarray) -> np.ndarray:
+        """a_R for per-node surface densities [Msun/pc^2] (already shell-weighted)."""
+        return self.matrix @ weights
+
+    def accel(self, Sigma_env_pc2: np.ndarray, alpha: float, R_ev: float, sigma_ev: float) -> np.ndarray:
+        shell = np.exp(-((self.R_grid - R_ev) ** 2) / (2.0 * sigma_ev**2))
+        return self.apply(Sigma_env_pc2 * (1.0 + alpha * shell))
+
+
+def softened_kernel_operator(R_eval: np.ndarray, R_grid: np.ndarray, eps: float) -> KernelOperator:
+    R_eval = np.asarray(R_eval, dtype=float)
+    R_grid = np.asarray(R_grid, dtype=float)
+    dR = np.gradient(R_grid)
+    ring_area = 2.0 * np.pi * R_grid * dR * 1e6  # [kpc^2 pc^-2 ... ] Sigma[Msun/pc^2] -> M_ring[Msun]
+    d = R_eval[:, None] - R_grid[None, :]
+    base = d / (d**2 + eps**2) ** 1.5  # ∂/∂R of softened 1/r
+    matrix = -G * base * ring_area[None, :]  # [(km/s)^2 / kpc per Msun/pc^2]
+    return KernelOperator(R_eval=R_eval, R_grid=R_grid, eps=float(eps), matrix=matrix)
+
+
 def softened_kernel_accel(
     R_eval: np.ndarray,
     R_grid: np.ndarray,
@@ -133,21 +174,40 @@ def softened_kernel_accel(
     """
     Shell-weighted kernel: softened 1/r multiplied by [1 + alpha * shell(R')].
     shell(R') = exp(-(R'-R_ev)^2/(2 sigma_ev^2)).
+
+    One-shot convenience wrapper; repeated evaluations should build a
+    KernelOperator once and call .accel().
     """
-    Sigma_kpc2 = Sigma_env_pc2 * 1e6
-    shell = np.exp(-((R_grid - R_ev) ** 2) / (2.0 * sigma_ev**2))
-    dR = np.gradient(R_grid)
-    M_ring = 2.0 * np.pi * R_grid * Sigma_kpc2 * dR  # [Msun]
+    op = softened_kernel_operator(R_eval, R_grid, eps)
+    return op.accel(Sigma_env_pc2, alpha, R_ev, sigma_ev)
 
-    a_R = np.zeros_like(R_eval)
-    for i, R in enumerate(R_eval):
-        d = R - R_grid
-        denom = (d**2 + eps**2) ** 1.5
-        base = d / denom  # ∂/∂R of softened 1/r
-        weight = 1.0 + alpha * shell
-        contrib = -G * M_ring * base * weight  # [(km/s)^2 / kpc]
-        a_R[i] = np.sum(contrib)
-    return a_R
+
+def mixing_v2(
+    R: np.ndarray,
+    V_newton: np.ndarray,
+    delta_v2,
+    ml_scale: float,
+    mu: float,
+    R_ev: float,
+    sigma_ev: float,
+) -> np.ndarray:
+    """
+    Newton + 1/r geometry in v^2 space with competitive mixing:
+      v_tot^2(R) = [A_N(R) * ml_scale * V_newton]^2 + A_F(R) * Δv^2_FDB(R)
+      A_N(R) = 1 - mu w(R),  A_F(R) = mu w(R)
+    Δv^2_FDB is a constant (rotmod model) or a radial profile (kernel model).
+    All arguments broadcast, so per-walker parameters of shape (n, 1) against
+    R of shape (n_R,) give (n, n_R) curves (see chi2_model_batch).
+    """
+    # Transition weight w(R): 0 (inner, Newton-dominated) -> 1 (outer, FDB-dominated).
+    sigma_ev = np.asarray(sigma_ev, dtype=float)
+    pos = sigma_ev > 0
+    with np.errstate(over="ignore"):
+        w = np.where(pos, 1.0 / (1.0 + np.exp(-(R - R_ev) / np.where(pos, sigma_ev, 1.0))), 0.0)
+    mu = np.clip(mu, 0.0, 1.0)
+    A_F = mu * w
+    A_N = 1.0 - A_F
+    return (A_N * ml_scale * V_newton) ** 2 + A_F * delta_v2
 
 
 def model_velocity(
@@ -176,11 +236,18 @@ def chi2_model(
     Sigma_env_grid: np.ndarray,
     r_cut: float = 0.0,
     sigma_model: float = 0.0,
+    model: str = "rotmod",
+    kernel=None,
 ) -> float:
     # Interpret parameters as:
-    #   alpha    -> Δv^2_FDB (constant FDB contribution to v^2, ≥0)
+    #   alpha    -> Δv^2_FDB (constant FDB contribution to v^2, ≥0) for model="rotmod";
+    #               shell amplitude of the softened kernel for model="kernel"
+    #   eps      -> kernel softening [kpc] (model="kernel" only; fixed by `kernel`)
     #   ml_scale -> rescaling of Newtonian rotation curve
-    #   beta, eps, v0 currently unused (kept for compatibility)
+    #   v0 currently unused (kept for compatibility)
+    # For model="kernel", `kernel` should be a kernel operator (KernelOperator,
+    # or a fast one from fdb_fastsum) precomputed on
+    # R_eval = data.R_kpc[data.R_kpc > r_cut]; it is rebuilt per call otherwise.
     alpha, eps, ml_scale, mu, R_ev_scale, sigma_ev_scale, v0 = vec
     if ml_scale <= 0:
         return 1e30
@@ -200,21 +267,22 @@ def chi2_model(
     )
     V_newton = V_newton[mask]
 
-    # Newton + 1/r geometry in v^2 space with competitive mixing:
-    #   v_tot^2(R) = [A_N(R) * ml_scale * V_newton]^2 + A_F(R) * Δv^2_FDB
-    #   A_N(R) = 1 - mu w(R),  A_F(R) = mu w(R)
     R_ev = R_ev_scale * params_global["R_d"]
     sigma_ev = sigma_ev_scale * params_global["R_d"]
-    # Transition weight w(R): 0 (inner, Newton-dominated) -> 1 (outer, FDB-dominated).
-    if sigma_ev > 0:
-        w = 1.0 / (1.0 + np.exp(-(R_eval - R_ev) / sigma_ev))
+    if model == "kernel":
+        if kernel is None:
+            if eps <= 0:
+                return 1e30
+            kernel = softened_kernel_operator(R_eval, R_grid, eps)
+        if sigma_ev <= 0:
+            return 1e30
+        a_R = kernel.accel(Sigma_env_grid, max(alpha, 0.0), R_ev, sigma_ev)
+        delta_v2 = R_eval * np.abs(a_R)
+    elif model == "rotmod":
+        delta_v2 = max(alpha, 0.0)
     else:
-        w = np.zeros_like(R_eval)
-    mu = np.clip(mu, 0.0, 1.0)
-    A_F = mu * w
-    A_N = 1.0 - A_F
-    delta_v2 = max(alpha, 0.0)
-    v2_tot = (A_N * ml_scale * V_newton) ** 2 + A_F * delta_v2
+        raise ValueError(f"unknown model {model!r}")
+    v2_tot = mixing_v2(R_eval, V_newton, delta_v2, ml_scale, mu, R_ev, sigma_ev)
     V_tot = np.sqrt(np.clip(v2_tot, 0, None))
     err = np.sqrt(eV**2 + sigma_model**2)
     chi = (Vobs - V_tot) / err
@@ -227,10 +295,229 @@ def chi2_model(
     return chi2
 
 
-def fit_fdb_for_galaxy(csv_path: str):
+def chi2_model_and_grad(
+    vec: np.ndarray,
+    data: GalaxyData,
+    R_grid: np.ndarray,
+    Sigma_env_grid: np.ndarray,
+    r_cut: float = 0.0,
+    sigma_model: float = 0.0,
+    model: str = "rotmod",
+    kernel=None,
+) -> Tuple[float, np.ndarray]:
+    """
+    chi2_model and its exact gradient with respect to the 7-vector, for
+    L-BFGS-B with jac=True.  Clipped parameters (alpha >= 0, 0 <= mu <= 1)
+    take the interior derivative at the clip point; eps and v0 are treated
+    as fixed (zero gradient), since the kernel model fixes the softening.
+    Rejected vectors return (1e30, 0).
+    """
+    vec = np.asarray(vec, dtype=float)
+    alpha, eps, ml_scale, mu, R_ev_scale, sigma_ev_scale, v0 = vec
+    grad = np.zeros(7)
+    if ml_scale <= 0:
+        return 1e30, grad
+    mask = data.R_kpc > r_cut
+    if not np.any(mask):
+        return 1e30, grad
+    R_eval = data.R_kpc[mask]
+    Vobs = data.Vobs[mask]
+    eV = data.eVobs[mask]
+    V_newton = np.sqrt(
+        np.clip(data.Vdisk_rotmod**2 + data.Vgas_rotmod**2 + data.Vbul_rotmod**2, 0, None)
+    )[mask]
+
+    Rd = params_global["R_d"]
+    R_ev = R_ev_scale * Rd
+    sigma_ev = sigma_ev_scale * Rd
+    alpha_c = max(alpha, 0.0)
+    d_alpha = 1.0 if alpha >= 0 else 0.0
+    if model == "kernel":
+        if kernel is None:
+            if eps <= 0:
+                return 1e30, grad
+            kernel = softened_kernel_operator(R_eval, R_grid, eps)
+        if sigma_ev <= 0:
+            return 1e30, grad
+        dR = R_grid - R_ev
+        shell = np.exp(-(dR**2) / (2.0 * sigma_ev**2))
+        a_R = kernel.apply(Sigma_env_grid * (1.0 + alpha_c * shell))
+        sgn = np.sign(a_R)
+        base = Sigma_env_grid * shell
+        delta_v2 = R_eval * np.abs(a_R)
+        # ∂Δv^2/∂(alpha, R_ev, sigma_ev); the kernel is linear in the weights
+        d_delta = [
+            d_alpha * R_eval * sgn * kernel.apply(base),
+            R_eval * sgn * kernel.apply(alpha_c * base * dR / sigma_ev**2),
+            R_eval * sgn * kernel.apply(alpha_c * base * dR**2 / sigma_ev**3),
+        ]
+    elif model == "rotmod":
+        delta_v2 = alpha_c
+        d_delta = [d_alpha, 0.0, 0.0]
+    else:
+        raise ValueError(f"unknown model {model!r}")
+
+    if sigma_ev > 0:
+        with np.errstate(over="ignore"):
+            w = 1.0 / (1.0 + np.exp(-(R_eval - R_ev) / sigma_ev))
+        dw_dRev = -w * (1.0 - w) / sigma_ev
+        dw_dsig = -w * (1.0 - w) * (R_eval - R_ev) / sigma_ev**2
+    else:
+        w = np.zeros_like(R_eval)
+        dw_dRev = dw_dsig = w
+    mu_c = np.clip(mu, 0.0, 1.0)
+    d_mu = 1.0 if 0.0 <= mu <= 1.0 else 0.0
+    A_F = mu_c * w
+    A_N = 1.0 - A_F
+    Vn2 = (ml_scale * V_newton) ** 2
+    v2_tot = A_N**2 * Vn2 + A_F * delta_v2
+    V_tot = np.sqrt(np.clip(v2_tot, 0, None))
+    err2 = eV**2 + sigma_model**2
+    resid = Vobs - V_tot
+    chi2 = float(np.sum(resid**2 / err2))
+
+    # dchi2/dv2 per radius (zero where v2 was clipped)
+    pos = V_tot > 0
+    g_v2 = np.where(pos, -resid / (err2 * np.where(pos, V_tot, 1.0)), 0.0)
+    dv2_dAF = -2.0 * A_N * Vn2 + delta_v2
+    grad[0] = np.sum(g_v2 * A_F * d_delta[0])
+    grad[2] = np.sum(g_v2 * 2.0 * A_N**2 * ml_scale * V_newton**2)
+    grad[3] = np.sum(g_v2 * dv2_dAF * w) * d_mu
+    grad[4] = np.sum(g_v2 * (dv2_dAF * mu_c * dw_dRev + A_F * d_delta[1])) * Rd
+    grad[5] = np.sum(g_v2 * (dv2_dAF * mu_c * dw_dsig + A_F * d_delta[2])) * Rd
+
+    R_ev_est = params_global.get("R_ev_est")
+    sigma_R_ev = params_global.get("sigma_R_ev")
+    if R_ev_est is not None and sigma_R_ev is not None and sigma_R_ev > 0:
+        chi2 += ((R_ev - R_ev_est) / sigma_R_ev) ** 2
+        grad[4] += 2.0 * (R_ev - R_ev_est) / sigma_R_ev**2 * Rd
+    return chi2, grad
+
+
+def chi2_model_batch(
+    vecs: np.ndarray,
+    data: GalaxyData,
+    R_grid: np.ndarray,
+    Sigma_env_grid: np.ndarray,
+    r_cut: float = 0.0,
+    sigma_model: float = 0.0,
+    model: str = "rotmod",
+    kernel=None,
+) -> np.ndarray:
+    """
+    chi2_model for a batch of parameter vectors, shape (n, 7) -> (n,).
+
+    The radial curves are evaluated as (n, n_R) arrays in one pass; rows that
+    chi2_model would reject get 1e30.  For model="kernel" with a dense
+    KernelOperator all shell weights go through a single matrix product; fast
+    operators (fdb_fastsum) are applied row by row, and kernel=None (softening
+    varying per row) falls back to chi2_model.
+    """
+    vecs = np.atleast_2d(np.asarray(vecs, dtype=float))
+    n = vecs.shape[0]
+    if model == "kernel" and kernel is None:
+        return np.array([chi2_model(v, data, R_grid, Sigma_env_grid, r_cut, sigma_model, model) for v in vecs])
+    out = np.full(n, 1e30)
+    mask = data.R_kpc > r_cut
+    if not np.any(mask):
+        return out
+    R_eval = data.R_kpc[mask]
+    Vobs = data.Vobs[mask]
+    eV = data.eVobs[mask]
+    V_newton = np.sqrt(
+        np.clip(data.Vdisk_rotmod**2 + data.Vgas_rotmod**2 + data.Vbul_rotmod**2, 0, None)
+    )[mask]
+
+    alpha, _, ml_scale, mu, R_ev_scale, sigma_ev_scale, _ = (c[:, None] for c in vecs.T)
+    R_ev = R_ev_scale * params_global["R_d"]
+    sigma_ev = sigma_ev_scale * params_global["R_d"]
+    ok = ml_scale[:, 0] > 0
+    alpha = np.maximum(alpha, 0.0)
+    if model == "kernel":
+        ok &= sigma_ev[:, 0] > 0
+        s_safe = np.where(sigma_ev > 0, sigma_ev, 1.0)
+        shell = np.exp(-((R_grid[None, :] - R_ev) ** 2) / (2.0 * s_safe**2))
+        weights = Sigma_env_grid[None, :] * (1.0 + alpha * shell)
+        if isinstance(kernel, KernelOperator):
+            a_R = (kernel.matrix @ weights.T).T
+        else:
+            a_R = np.stack([kernel.apply(w) for w in weights])
+        delta_v2 = R_eval[None, :] * np.abs(a_R)
+    elif model == "rotmod":
+        delta_v2 = alpha
+    else:
+        raise ValueError(f"unknown model {model!r}")
+    v2_tot = mixing_v2(R_eval[None, :], V_newton[None, :], delta_v2, ml_scale, mu, R_ev, sigma_ev)
+    V_tot = np.sqrt(np.clip(v2_tot, 0, None))
+    err = np.sqrt(eV**2 + sigma_model**2)
+    chi2 = np.sum(((Vobs - V_tot) / err) ** 2, axis=1)
+    R_ev_est = params_global.get("R_ev_est")
+    sigma_R_ev = params_global.get("sigma_R_ev")
+    if R_ev_est is not None and sigma_R_ev is not None and sigma_R_ev > 0:
+        chi2 = chi2 + ((R_ev[:, 0] - R_ev_est) / sigma_R_ev) ** 2
+    out[ok] = chi2[ok]
+    return out
+
+
+def chi2_objective(vec: np.ndarray, glob: Dict[str, float], **kwargs) -> float:
+    """chi2_model with the per-galaxy params_global restored first, so that it
+    can be shipped to worker processes (fdb_optim.multistart_minimize)."""
+    params_global.update(glob)
+    return chi2_model(vec, **kwargs)
+
+
+def chi2_objective_and_grad(vec: np.ndarray, glob: Dict[str, float], **kwargs) -> Tuple[float, np.ndarray]:
+    """Picklable chi2_model_and_grad, as chi2_objective."""
+    params_global.update(glob)
+    return chi2_model_and_grad(vec, **kwargs)
+
+
+@dataclass
+class FitProblem:
+    """
+    Per-galaxy setup shared by fit_fdb_for_galaxy and the samplers (fdb_mcmc.py):
+    data, kernel, fit domain, start vector and bounds.  `glob` is the snapshot
+    of params_global (R_d, shell prior) that the objective expects.
+    """
+    tag: str
+    data: GalaxyData
+    R_grid: np.ndarray
+    Sigma_gas_grid: np.ndarray
+    R_d: float
+    r_cut: float
+    sigma_model: float
+    model: str
+    kernel: object
+    x0: np.ndarray
+    bounds: List[Tuple[float, float]]
+    glob: Dict[str, float]
+    build_kernel: Optional[Callable] = None
+
+    def objective_kwargs(self) -> dict:
+        return dict(
+            data=self.data,
+            R_grid=self.R_grid,
+            Sigma_env_grid=self.Sigma_gas_grid,
+            r_cut=self.r_cut,
+            sigma_model=self.sigma_model,
+            model=self.model,
+            kernel=self.kernel,
+        )
+
+
+def prepare_fit(
+    csv_path: str,
+    model: str = "rotmod",
+    eps_kpc: float | None = None,
+    n_grid: int = 200,
+    kernel_method: str = "direct",
+    kernel_type: str = "softened",
+    lambda_c_kpc: float = 30.0,
+) -> FitProblem:
+    """Load a galaxy, set params_global for it and build the kernel/bounds for `model`."""
     data = load_sparc_csv(csv_path)
     galaxy_tag = os.path.splitext(os.path.basename(csv_path))[0]
-    R_grid, Sigma_star_grid, Sigma_gas_grid = build_radial_grid(data)
+    R_grid, Sigma_star_grid, Sigma_gas_grid = build_radial_grid(data, n_grid=n_grid)
     R_d = estimate_Rd(data)
     params_global["R_d"] = R_d
     # Estimate shell center and its uncertainty from Σ_gas profile
@@ -238,6 +525,85 @@ def fit_fdb_for_galaxy(csv_path: str):
     params_global["R_ev_est"] = R_ev_est
     params_global["sigma_R_ev"] = sigma_R_ev
 
+    # Fit radii outside one disk scale length
+    r_cut = 1.0 * R_d
+    sigma_model = 8.0  # km/s added in quadrature
+    if model == "kernel":
+        # Softening is fixed per fit so that the geometric kernel matrix is
+        # built once; only the shell weight changes during the optimization.
+        eps = float(eps_kpc) if eps_kpc is not None else 0.2 * R_d
+        if kernel_type == "softened":
+            # fine grids (n_grid >~ 1e4) should use kernel_method="fft" (uniform R_grid) or "tree"
+            from fdb_fastsum import make_kernel_operator as make_operator
+
+            operator_kw = dict(method=kernel_method)
+        else:
+            # thin-disk ring Green's functions; eps acts as the disk thickness
+            from fdb_green import thin_disk_kernel_operator as make_operator
+
+            lam = lambda_c_kpc if kernel_type == "thin_disk_fdb" else None
+            operator_kw = dict(Rd=R_d, lambda_c_kpc=lam)
+
+        def build_kernel(R_eval):
+            return make_operator(R_eval, R_grid, eps, **operator_kw)
+
+        kernel = build_kernel(data.R_kpc[data.R_kpc > r_cut])
+        # alpha(shell amplitude), eps(fixed), ml_scale, mu, R_ev/Rd, sigma_ev/Rd, v0(unused)
+        x0 = np.array([1.0, eps, 0.9, 0.7, 2.5, 0.7, 0.0])
+        bounds = [
+            (0.0, 50.0),    # alpha = shell amplitude
+            (eps, eps),     # eps (fixed softening)
+            (0.6, 1.0),     # ml_scale (do not exceed Newton)
+            (0.3, 1.0),     # mu
+            (2.0, 3.0),     # R_ev / R_d
+            (0.5, 1.0),     # sigma_ev / R_d
+            (0.0, 0.0),     # v0 (unused)
+        ]
+    else:
+        kernel = build_kernel = None
+        # alpha(Δv^2_FDB), eps(unused), ml_scale, mu, R_ev/Rd, sigma_ev/Rd, v0(unused)
+        x0 = np.array([500.0, 0.0, 0.9, 0.7, 2.5, 0.7, 0.0])
+        bounds = [
+            (0.0, 5e4),     # alpha = Δv^2_FDB
+            (0.0, 0.0),     # eps (unused)
+            (0.6, 1.0),     # ml_scale (do not exceed Newton)
+            (0.3, 1.0),     # mu (ensure FDB does not vanish where w>0)
+            (2.0, 3.0),     # R_ev / R_d
+            (0.5, 1.0),     # sigma_ev / R_d
+            (0.0, 0.0),     # v0 (unused)
+        ]
+    return FitProblem(
+        tag=galaxy_tag,
+        data=data,
+        R_grid=R_grid,
+        Sigma_gas_grid=Sigma_gas_grid,
+        R_d=R_d,
+        r_cut=r_cut,
+        sigma_model=sigma_model,
+        model=model,
+        kernel=kernel,
+        x0=x0,
+        bounds=bounds,
+        glob=dict(params_global),
+        build_kernel=build_kernel,
+    )
+
+
+def fit_fdb_for_galaxy(
+    csv_path: str,
+    model: str = "rotmod",
+    eps_kpc: float | None = None,
+    n_grid: int = 200,
+    kernel_method: str = "direct",
+    kernel_type: str = "softened",
+    lambda_c_kpc: float = 30.0,
+    n_starts: int = 1,
+    n_workers: int = 1,
+):
+    prob = prepare_fit(csv_path, model, eps_kpc, n_grid, kernel_method, kernel_type, lambda_c_kpc)
+    data, galaxy_tag, R_grid, Sigma_gas_grid = prob.data, prob.tag, prob.R_grid, prob.Sigma_gas_grid
+    R_d, r_cut, sigma_model = prob.R_d, prob.r_cut, prob.sigma_model
+
     # If rotmod velocities are present, build a Newton curve from them for sanity
     df_full = pd.read_csv(csv_path)
     has_rot = set(["Vgas_rotmod", "Vdisk_rotmod"]) <= set(df_full.columns)
@@ -255,30 +621,21 @@ def fit_fdb_for_galaxy(csv_path: str):
     )
     print(f"Newton-only chi2 (ml_scale=1, Δv^2_FDB=0): {chi2_newton:.3e}")
 
-    # Fit radii outside one disk scale length
-    r_cut = 1.0 * R_d
-    sigma_model = 8.0  # km/s added in quadrature
-    # alpha(Δv^2_FDB), eps(unused), ml_scale, mu, R_ev/Rd, sigma_ev/Rd, v0(unused)
-    x0 = np.array([500.0, 0.0, 0.9, 0.7, 2.5, 0.7, 0.0])
-    bounds = [
-        (0.0, 5e4),     # alpha = Δv^2_FDB
-        (0.0, 0.0),     # eps (unused)
-        (0.6, 1.0),     # ml_scale (do not exceed Newton)
-        (0.3, 1.0),     # mu (ensure FDB does not vanish where w>0)
-        (2.0, 3.0),     # R_ev / R_d
-        (0.5, 1.0),     # sigma_ev / R_d
-        (0.0, 0.0),     # v0 (unused)
-    ]
-
-    res = minimize(
-        lambda x: chi2_model(x, data, R_grid, Sigma_gas_grid, r_cut=r_cut, sigma_model=sigma_model),
-        x0,
-        method="L-BFGS-B",
-        bounds=bounds,
-    )
-    best = res.x
+    # fused value + analytic gradient (chi2_model_and_grad)
+    objective = partial(chi2_objective_and_grad, glob=prob.glob, **prob.objective_kwargs())
+    x0, bounds = prob.x0, prob.bounds
+    if n_starts > 1:
+        # Multi-start over the free parameters (eps and v0 are pinned by their bounds)
+        from fdb_optim import multistart_minimize
+
+        ms = multistart_minimize(objective, x0, bounds, n_starts=n_starts, jac=True, n_workers=n_workers)
+        print(ms.summary())
+        best, chi2_best = ms.x, ms.fun
+    else:
+        res = minimize(objective, x0, method="L-BFGS-B", jac=True, bounds=bounds)
+        best, chi2_best = res.x, res.fun
     print("Best-fit params [alpha, eps[kpc], ML_scale, beta, R_ev/Rd, sigma_ev/Rd, v0(km/s)]:", best)
-    print(f"chi2 (r>{r_cut:.2f} kpc, sigma_model={sigma_model} km/s) = {res.fun:.3e}")
+    print(f"chi2 (r>{r_cut:.2f} kpc, sigma_model={sigma_model} km/s) = {chi2_best:.3e}")
 
     # Newton curve from rotmod velocities
     if v_newton_rot is not None:
@@ -291,15 +648,12 @@ def fit_fdb_for_galaxy(csv_path: str):
     R_ev = best[4] * R_d
     sigma_ev = best[5] * R_d
     R_all = data.R_kpc
-    if sigma_ev > 0:
-        w_all = 1.0 / (1.0 + np.exp(-(R_all - R_ev) / sigma_ev))
+    if model == "kernel":
+        kernel_all = prob.build_kernel(R_all)
+        delta_v2 = R_all * np.abs(kernel_all.accel(Sigma_gas_grid, max(alpha, 0.0), R_ev, sigma_ev))
     else:
-        w_all = np.zeros_like(R_all)
-    mu = np.clip(mu, 0.0, 1.0)
-    A_F_all = mu * w_all
-    A_N_all = 1.0 - A_F_all
-    delta_v2 = max(alpha, 0.0)
-    v2_tot_all = (A_N_all * ml_scale * v_newton_use) ** 2 + A_F_all * delta_v2
+        delta_v2 = max(alpha, 0.0)
+    v2_tot_all = mixing_v2(R_all, v_newton_use, delta_v2, ml_scale, mu, R_ev, sigma_ev)
     V_tot = np.sqrt(np.clip(v2_tot_all, 0, None))
 
     out = pd.DataFrame(
@@ -376,8 +730,29 @@ def fit_fdb_for_galaxy(csv_path: str):
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: fdb_fit.py <sparc_csv>")
-        sys.exit(1)
-
-    fit_fdb_for_galaxy(sys.argv[1])
+    ap = argparse.ArgumentParser(description="FDB rotation-curve fit for a single SPARC galaxy.")
+    ap.add_argument("sparc_csv")
+    ap.add_argument("--model", choices=["rotmod", "kernel"], default="rotmod",
+                    help="constant Δv^2_FDB on the rotmod curve, or the shell-weighted softened kernel")
+    ap.add_argument("--eps", type=float, default=None, help="kernel softening [kpc] (default 0.2 R_d)")
+    ap.add_argument("--n-grid", type=int, default=200, help="radial grid nodes for the kernel")
+    ap.add_argument("--kernel-method", choices=["direct", "fft", "tree", "auto"], default="direct",
+                    help="summation for the softened kernel (see fdb_fastsum.py)")
+    ap.add_argument("--kernel", choices=["softened", "thin_disk", "thin_disk_fdb"], default="softened",
+                    help="ring kernel: softened 1/r, thin-disk Green's function, or its FDB-modified form")
+    ap.add_argument("--lambda-c", type=float, default=30.0, help="λ_C [kpc] for --kernel thin_disk_fdb")
+    ap.add_argument("--multistart", type=int, default=1, help="number of L-BFGS-B starts (Sobol, see fdb_optim.py)")
+    ap.add_argument("--workers", type=int, default=1, help="processes for --multistart")
+    args = ap.parse_args()
+
+    fit_fdb_for_galaxy(
+        args.sparc_csv,
+        model=args.model,
+        eps_kpc=args.eps,
+        n_grid=args.n_grid,
+        kernel_method=args.kernel_method,
+        kernel_type=args.kernel,
+        lambda_c_kpc=args.lambda_c,
+        n_starts=args.multistart,
+        n_workers=args.workers,
+    )
@@ -6,11 +6,19 @@ This uses the same Newton+1/r competitive mixing model as fdb_fit.py, but fits a
 single (alpha, mu) across multiple galaxies while allowing each galaxy to have
 its own ML_scale and shell geometry (R_ev/Rd, sigma_ev/Rd), with a prior that
 keeps R_ev close to the radius where Sigma_gas drops most steeply.
+
+Galaxies come from --galaxies (or --all for every build/*_sparc.csv).  With
+--nested the fit is solved as an outer problem over (alpha, mu) with
+independent per-galaxy inner solves and Schur-complement errors on the
+globals (fdb_joint.py).  Posterior sampling: fdb_mcmc.py fdb_fit_multi,
+which can spread its walker batches over processes (fdb_shared.py).
 """
 
-import sys
+import argparse
+import glob
 import os
 from dataclasses import dataclass
+from functools import partial
 from typing import List, Tuple
 
 import numpy as np
@@ -19,6 +27,10 @@ from scipy.optimize import minimize
 import matplotlib.pyplot as plt
 
 
+# Galaxies to include by default
+DEFAULT_GALAXIES = ["NGC2403", "NGC3198", "NGC6503", "DDO170", "DDO168"]
+
+
 @dataclass
 class Galaxy:
     name: str
@@ -179,6 +191,126 @@ def chi2_multi(vec: np.ndarray, gals: List[Galaxy], sigma_model: float = 8.0) ->
     return chi2_tot
 
 
+def galaxy_chi2_and_grad(
+    glob_params: np.ndarray,
+    local: np.ndarray,
+    g: Galaxy,
+    sigma_model: float = 8.0,
+) -> Tuple[float, np.ndarray, np.ndarray]:
+    """
+    One galaxy's term of chi2_multi and its gradient blocks.
+
+    glob_params = [alpha, mu], local = [ML, R_ev/Rd, sigma_ev/Rd].  Returns
+    (chi2_g, d chi2_g / d glob_params, d chi2_g / d local).  Clipped alpha/mu take the
+    interior derivative at the clip point; rejected vectors return (1e30, 0, 0).
+    """
+    grad_g = np.zeros(2)
+    grad_l = np.zeros(3)
+    alpha = max(glob_params[0], 0.0)
+    d_alpha = 1.0 if glob_params[0] >= 0 else 0.0
+    mu = np.clip(glob_params[1], 0.3, 1.0)
+    d_mu = 1.0 if 0.3 <= glob_params[1] <= 1.0 else 0.0
+    ml_i, rev_scale, sig_scale = local
+    if not (0.6 <= ml_i <= 1.0):
+        return 1e30, grad_g, grad_l
+    scale = g.S_scale
+    geom_factor = 1.0 + 0.5 * (scale - 1.0) / (1.0 + abs(scale - 1.0))
+    R_ev = rev_scale * g.Rd * geom_factor
+    sigma_ev = sig_scale * g.Rd
+    if sigma_ev <= 0:
+        return 1e30, grad_g, grad_l
+
+    mask = g.R > g.r_cut
+    if not np.any(mask):
+        return 1e30, grad_g, grad_l
+    R = g.R[mask]
+    Vn = g.Vnewt[mask]
+
+    with np.errstate(over="ignore"):
+        w = 1.0 / (1.0 + np.exp(-(R - R_ev) / sigma_ev))
+    A_F = mu * w
+    A_N = 1.0 - A_F
+    v2_tot = (A_N * ml_i * Vn) ** 2 + A_F * alpha
+    V_tot = np.sqrt(np.clip(v2_tot, 0.0, None))
+    err2 = g.eVobs[mask] ** 2 + sigma_model**2
+    resid = g.Vobs[mask] - V_tot
+    chi2 = float(np.sum(resid**2 / err2))
+
+    pos = V_tot > 0
+    g_v2 = np.where(pos, -resid / (err2 * np.where(pos, V_tot, 1.0)), 0.0)
+    dv2_dAF = -2.0 * A_N * (ml_i * Vn) ** 2 + alpha
+    dw = w * (1.0 - w)
+    grad_g[0] = np.sum(g_v2 * A_F) * d_alpha
+    grad_g[1] = np.sum(g_v2 * dv2_dAF * w) * d_mu
+    grad_l[0] = np.sum(g_v2 * 2.0 * A_N**2 * ml_i * Vn**2)
+    grad_l[1] = np.sum(g_v2 * dv2_dAF * mu * (-dw / sigma_ev)) * g.Rd * geom_factor
+    grad_l[2] = np.sum(g_v2 * dv2_dAF * mu * (-dw * (R - R_ev) / sigma_ev**2)) * g.Rd
+
+    if g.sigma_R_ev > 0:
+        chi2 += ((R_ev - g.R_ev_est) / g.sigma_R_ev) ** 2
+        grad_l[1] += 2.0 * (R_ev - g.R_ev_est) / g.sigma_R_ev**2 * g.Rd * geom_factor
+    return chi2, grad_g, grad_l
+
+
+def chi2_multi_and_grad(vec: np.ndarray, gals: List[Galaxy], sigma_model: float = 8.0) -> Tuple[float, np.ndarray]:
+    """
+    chi2_multi and its exact gradient (same vec layout), for L-BFGS-B with
+    jac=True; the sum of galaxy_chi2_and_grad over galaxies.
+    """
+    vec = np.asarray(vec, dtype=float)
+    n = len(gals)
+    grad = np.zeros_like(vec)
+    chi2_tot = 0.0
+    for i, g in enumerate(gals):
+        idx = [2 + i, 2 + n + i, 2 + 2 * n + i]
+        chi2_g, grad_g, grad_l = galaxy_chi2_and_grad(vec[:2], vec[idx], g, sigma_model)
+        if chi2_g >= 1e30:
+            return 1e30, np.zeros_like(vec)
+        chi2_tot += chi2_g
+        grad[:2] += grad_g
+        grad[idx] = grad_l
+    return chi2_tot, grad
+
+
+def chi2_multi_batch(vecs: np.ndarray, gals: List[Galaxy], sigma_model: float = 8.0) -> np.ndarray:
+    """
+    chi2_multi for a batch of parameter vectors, shape (n, 2 + 3N) -> (n,).
+    Galaxies are looped over; each galaxy's curves are (n, n_R) arrays.
+    """
+    vecs = np.atleast_2d(np.asarray(vecs, dtype=float))
+    n = len(gals)
+    alpha = np.maximum(vecs[:, 0:1], 0.0)
+    mu = np.clip(vecs[:, 1:2], 0.3, 1.0)
+    ok = np.ones(vecs.shape[0], dtype=bool)
+    chi2_tot = np.zeros(vecs.shape[0])
+    for i, g in enumerate(gals):
+        ml_i = vecs[:, 2 + i : 3 + i]
+        scale = g.S_scale
+        geom_factor = 1.0 + 0.5 * (scale - 1.0) / (1.0 + abs(scale - 1.0))
+        R_ev = vecs[:, 2 + n + i : 3 + n + i] * g.Rd * geom_factor
+        sigma_ev = vecs[:, 2 + 2 * n + i : 3 + 2 * n + i] * g.Rd
+        ok &= (0.6 <= ml_i[:, 0]) & (ml_i[:, 0] <= 1.0) & (sigma_ev[:, 0] > 0)
+
+        mask = g.R > g.r_cut
+        if not np.any(mask):
+            return np.full(vecs.shape[0], 1e30)
+        R = g.R[mask]
+        Vn = g.Vnewt[mask]
+
+        with np.errstate(over="ignore"):
+            w = 1.0 / (1.0 + np.exp(-(R - R_ev) / np.where(sigma_ev > 0, sigma_ev, 1.0)))
+        A_F = mu * w
+        A_N = 1.0 - A_F
+        v2_tot = (A_N * ml_i * Vn) ** 2 + A_F * alpha
+        V_tot = np.sqrt(np.clip(v2_tot, 0.0, None))
+
+        err = np.sqrt(g.eVobs[mask] ** 2 + sigma_model**2)
+        chi2_tot += np.sum(((g.Vobs[mask] - V_tot) / err) ** 2, axis=1)
+        if g.sigma_R_ev > 0:
+            chi2_tot += ((R_ev[:, 0] - g.R_ev_est) / g.sigma_R_ev) ** 2
+    return np.where(ok, chi2_tot, 1e30)
+
+
 def make_summary_plot(
     g: Galaxy,
     alpha: float,
@@ -260,19 +392,12 @@ def make_summary_plot(
     plt.close(fig)
 
 
-def main():
-    # Galaxies to include
-    gals = [
-        load_galaxy("build/NGC2403_sparc.csv", "NGC2403"),
-        load_galaxy("build/NGC3198_sparc.csv", "NGC3198"),
-        load_galaxy("build/NGC6503_sparc.csv", "NGC6503"),
-        load_galaxy("build/DDO170_sparc.csv", "DDO170"),
-        load_galaxy("build/DDO168_sparc.csv", "DDO168"),
-    ]
-    n = len(gals)
-
-    # Set S_scale for each galaxy based on its gas content:
-    # use total gas mass proxy from Sigma_gas profile.
+def assign_gas_scales(gals: List[Galaxy], gas_ref: float | None = None) -> float:
+    """
+    Set g.S_scale = gas-mass proxy / gas_ref for each galaxy (in place) and
+    return gas_ref.  gas_ref defaults to the sample median; pass a stored value
+    to keep existing galaxies' scales fixed when membership changes.
+    """
     gas_masses = []
     for g in gals:
         R = g.R
@@ -283,10 +408,27 @@ def main():
         M_approx = float(np.sum(2.0 * np.pi * R * Sig_kpc2 * dR))
         gas_masses.append(max(M_approx, 0.0))
     gas_masses = np.array(gas_masses)
-    med_mass = np.median(gas_masses[gas_masses > 0]) if np.any(gas_masses > 0) else 1.0
+    if gas_ref is None:
+        gas_ref = float(np.median(gas_masses[gas_masses > 0])) if np.any(gas_masses > 0) else 1.0
     for g, M in zip(gals, gas_masses):
-        g.S_scale = float(M / med_mass) if med_mass > 0 else 1.0
+        g.S_scale = float(M / gas_ref) if gas_ref > 0 else 1.0
+    return gas_ref
+
 
+def load_galaxies(names: List[str], build_dir: str = "build", gas_ref: float | None = None) -> List[Galaxy]:
+    """Load build/<name>_sparc.csv for each name and set the gas scales (see assign_gas_scales)."""
+    gals = [load_galaxy(os.path.join(build_dir, f"{name}_sparc.csv"), name) for name in names]
+    assign_gas_scales(gals, gas_ref)
+    return gals
+
+
+def available_galaxies(build_dir: str = "build") -> List[str]:
+    """Names of all build/*_sparc.csv files."""
+    return sorted(os.path.basename(p)[: -len("_sparc.csv")] for p in glob.glob(os.path.join(build_dir, "*_sparc.csv")))
+
+
+def initial_guess(n: int) -> Tuple[np.ndarray, List[Tuple[float, float]]]:
+    """Start vector and bounds for chi2_multi with n galaxies."""
     # Initial guess: alpha ~ 5e3–5e4, mu~0.7, ML~0.9, RevScale~2.5, SigScale~0.7
     alpha0 = 5e3
     mu0 = 0.7
@@ -301,13 +443,46 @@ def main():
     bounds.extend([(0.6, 1.0)] * n)   # ML_i
     bounds.extend([(2.0, 3.0)] * n)   # RevScale_i
     bounds.extend([(0.5, 1.0)] * n)   # SigScale_i
+    return x0, bounds
 
-    res = minimize(
-        lambda x: chi2_multi(x, gals),
-        x0,
-        method="L-BFGS-B",
-        bounds=bounds,
-    )
+
+def main():
+    ap = argparse.ArgumentParser(description="Multi-galaxy FDB fit with common (alpha, mu).")
+    ap.add_argument("--galaxies", nargs="+", default=None,
+                    help=f"galaxy names (build/<name>_sparc.csv); default {' '.join(DEFAULT_GALAXIES)}")
+    ap.add_argument("--all", action="store_true", help="use every build/*_sparc.csv")
+    ap.add_argument("--build-dir", default="build")
+    ap.add_argument("--nested", action="store_true",
+                    help="outer fit over (alpha, mu) with per-galaxy inner solves (see fdb_joint.py)")
+    ap.add_argument("--multistart", type=int, default=1, help="number of L-BFGS-B starts (see fdb_optim.py)")
+    ap.add_argument("--workers", type=int, default=1, help="processes for --multistart / --nested")
+    ap.add_argument("--no-plots", action="store_true")
+    args = ap.parse_args()
+
+    if args.all:
+        names = available_galaxies(args.build_dir)
+    else:
+        names = args.galaxies or DEFAULT_GALAXIES
+    gals = load_galaxies(names, build_dir=args.build_dir)
+    n = len(gals)
+    print(f"# galaxies in multi-fit: {n}")
+    x0, bounds = initial_guess(n)
+
+    objective = partial(chi2_multi_and_grad, gals=gals)
+    if args.nested:
+        from fdb_joint import fit_nested
+
+        res = fit_nested(gals, n_workers=args.workers)
+        print(res.summary())
+    elif args.multistart > 1:
+        from fdb_optim import multistart_minimize
+
+        res = multistart_minimize(
+            objective, x0, bounds, n_starts=args.multistart, jac=True, n_workers=args.workers
+        )
+        print(res.summary())
+    else:
+        res = minimize(objective, x0, method="L-BFGS-B", jac=True, bounds=bounds)
 
     print("Multi-galaxy fit result:")
     alpha_opt = res.x[0]
@@ -322,6 +497,8 @@ def main():
     print("  chi2_total       =", res.fun)
 
     # Produce summary plots under the common parameters
+    if args.no_plots:
+        return
     for i, g in enumerate(gals):
         make_summary_plot(
             g,
@@ -0,0 +1,725 @@
+#!/usr/bin/env python3
+"""
+Nested (block-structured) solver and incremental state for the joint fits.
+
+chi2_multi (fdb_fit_multi) couples the galaxies only through the globals
+G = (alpha, mu):
+
+    chi2(G, L_1..L_N) = sum_i chi2_i(G, L_i),   L_i = (ML_i, R_ev_i/Rd, sigma_ev_i/Rd),
+
+so its Hessian is block-arrow shaped.  Instead of one (2 + 3N)-dimensional
+L-BFGS-B we minimize the profile
+
+    F(G) = sum_i min_{L_i} chi2_i(G, L_i)
+
+over the globals.  The inner problems are independent: they run in a process
+pool (the galaxy records are shipped once through the pool initializer) and
+are warm-started from the previous outer iterate.  By the envelope theorem
+dF/dG = sum_i d chi2_i/dG at L_i*(G) (the local bounds do not depend on G), so
+the outer L-BFGS-B gets an exact gradient without differentiating through
+the inner solves.
+
+Uncertainties on the globals come from the Schur complement of the per-galaxy
+chi^2 Hessians H_i (finite differences of the analytic gradient),
+
+    C_i = H_i,GG - H_i,GL H_i,LL^{-1} H_i,LG,   Cov(G) = 2 (sum_i C_i)^{-1},
+
+i.e. the globals marginalized over all local parameters.  Parameters sitting
+on a bound are held fixed there.
+
+JointFitState keeps (G, L_i, chi2_i, d chi2_i/dG, H_i) on disk (.npz).  C_i is
+the curvature of galaxy i's profile, so adding or dropping a galaxy changes
+the summed profile by one term and the new globals follow from one projected
+Newton step on sum_i C_i.  The other galaxies' locals move by the first-order
+response -H_LL^{-1} H_LG dG instead of being re-solved; only an added galaxy
+is actually solved.  `refine` polishes with a warm-started nested solve, and
+`jackknife` is N cheap drops.
+
+Block models (MODELS):
+  fdb_multi   fdb_fit_multi.chi2_multi        G = (alpha, mu), L = (ML, R_ev/Rd, sigma_ev/Rd)
+  fdb2_multi  fdb2_fit_multi.total_chi2_multi G = (Delta_v2,), no locals
+
+Usage:
+  python scripts/fdb_joint.py fit --all --state out/joint_state.npz --workers 4
+  python scripts/fdb_joint.py add NGC5055 --state out/joint_state.npz
+  python scripts/fdb_joint.py drop DDO064 --state out/joint_state.npz --refine
+  python scripts/fdb_joint.py jackknife --state out/joint_state.npz
+  python scripts/fdb_joint.py fit --model fdb2_multi --state out/joint_v2.npz
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures as cf
+import copy
+import os
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.optimize import minimize
+
+import fdb_fit_multi
+from fdb_fit_multi import galaxy_chi2_and_grad, initial_guess
+
+# same start/bounds as the flat fit: [alpha, mu] and per galaxy [ML, R_ev/Rd, sigma_ev/Rd]
+_X0_ONE, _BOUNDS_ONE = initial_guess(1)
+GLOBAL_BOUNDS: List[Tuple[float, float]] = _BOUNDS_ONE[:2]
+LOCAL_BOUNDS: List[Tuple[float, float]] = _BOUNDS_ONE[2:]
+GLOBAL_NAMES = ["alpha", "mu"]
+LOCAL_NAMES = ["ML", "R_ev/Rd", "sigma_ev/Rd"]
+
+_INNER_OPTIONS = {"ftol": 1e-13, "gtol": 1e-9, "maxiter": 500}
+
+# per-process state for the pool workers (set by _init_worker)
+_WORKER_MODEL: str = "fdb_multi"
+_WORKER_GALAXIES: Optional[list] = None
+_WORKER_SIGMA_MODEL: float = 8.0
+
+
+def _v2_grad(glob, local, g, sigma_model: float = 8.0):
+    from fdb2_fit import chi2_v2_and_grad
+
+    f, grad = chi2_v2_and_grad(np.array([glob[0]]), g[1], sigma_model)
+    return f, grad[:1], np.zeros(0)
+
+
+def _v2_load(names: Optional[List[str]], build_dir: str, gas_ref: float):
+    from fdb2_fit_multi import fit_contexts, load_galaxies
+
+    return fit_contexts(load_galaxies(names, build_dir=build_dir)), float("nan")
+
+
+def _multi_load(names: Optional[List[str]], build_dir: str, gas_ref: float):
+    gals = [
+        fdb_fit_multi.load_galaxy(os.path.join(build_dir, f"{n}_sparc.csv"), n)
+        for n in (names or fdb_fit_multi.DEFAULT_GALAXIES)
+    ]
+    ref = fdb_fit_multi.assign_gas_scales(gals, gas_ref if np.isfinite(gas_ref) else None)
+    return gals, ref
+
+
+@dataclass
+class BlockModel:
+    """How one galaxy enters a joint fit: parameter blocks, gradient, loader."""
+    name: str
+    glob_names: List[str]
+    glob_bounds: List[Tuple[float, float]]
+    glob0: np.ndarray
+    local_names: List[str]
+    local_bounds: List[Tuple[float, float]]
+    local0: np.ndarray
+    # (glob, local, galaxy, sigma_model) -> (chi2_g, d chi2_g/d glob, d chi2_g/d local)
+    grad: Callable
+    # (names or None, build_dir, gas_ref or nan) -> (galaxies, gas_ref)
+    load: Callable
+    gal_name: Callable
+
+    @property
+    def n_glob(self) -> int:
+        return len(self.glob_bounds)
+
+
+MODELS: Dict[str, BlockModel] = {
+    "fdb_multi": BlockModel(
+        name="fdb_multi",
+        glob_names=GLOBAL_NAMES,
+        glob_bounds=GLOBAL_BOUNDS,
+        glob0=np.asarray(_X0_ONE[:2], dtype=float),
+        local_names=LOCAL_NAMES,
+        local_bounds=LOCAL_BOUNDS,
+        local0=np.asarray(_X0_ONE[2:], dtype=float),
+        grad=galaxy_chi2_and_grad,
+        load=_multi_load,
+        gal_name=lambda g: g.name,
+    ),
+    # chi2_v2 returns the 1e30 sentinel at Vflat2 <= 0, so the bound starts at 1
+    "fdb2_multi": BlockModel(
+        name="fdb2_multi",
+        glob_names=["Delta_v2"],
+        glob_bounds=[(1.0, 5e4)],
+        glob0=np.array([2.0e4]),
+        local_names=[],
+        local_bounds=[],
+        local0=np.zeros(0),
+        grad=_v2_grad,
+        load=_v2_load,
+        gal_name=lambda g: g[0],
+    ),
+}
+
+
+def pack(glob: np.ndarray, local: np.ndarray) -> np.ndarray:
+    """(2,), (N, 3) -> chi2_multi vector [alpha, mu, ML..., RevScale..., SigScale...]."""
+    return np.concatenate([np.asarray(glob, dtype=float), np.asarray(local, dtype=float).T.ravel()])
+
+
+def unpack(vec: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Inverse of pack."""
+    vec = np.asarray(vec, dtype=float)
+    return vec[:2].copy(), vec[2 : 2 + 3 * n].reshape(3, n).T.copy()
+
+
+def solve_local(
+    g,
+    glob: np.ndarray,
+    x_start: np.ndarray,
+    sigma_model: float = 8.0,
+    model: str = "fdb_multi",
+) -> Tuple[np.ndarray, float, np.ndarray, int]:
+    """
+    min over L of chi2_g(glob, L) from x_start.  Returns
+    (L*, chi2_g, d chi2_g / d glob at L*, function evaluations).
+    """
+    bm = MODELS[model]
+    glob = np.asarray(glob, dtype=float)
+    if not bm.local_bounds:
+        f, gg, _ = bm.grad(glob, np.zeros(0), g, sigma_model)
+        return np.zeros(0), float(f), np.asarray(gg, dtype=float), 1
+    lo = np.array([b[0] for b in bm.local_bounds])
+    hi = np.array([b[1] for b in bm.local_bounds])
+
+    def fun(z):
+        f, _, gl = bm.grad(glob, z, g, sigma_model)
+        return f, gl
+
+    res = minimize(fun, np.clip(x_start, lo, hi), method="L-BFGS-B", jac=True,
+                   bounds=bm.local_bounds, options=_INNER_OPTIONS)
+    f, gg, _ = bm.grad(glob, res.x, g, sigma_model)
+    return np.asarray(res.x, dtype=float), float(f), np.asarray(gg, dtype=float), int(res.nfev)
+
+
+def _step_pair(x: float, lo: float, hi: float, h: float) -> Tuple[float, float]:
+    """(x_plus, x_minus) around x with spacing h, shifted to stay inside [lo, hi]."""
+    xp, xm = x + h, x - h
+    if xp > hi:
+        xp, xm = hi, hi - 2.0 * h
+    elif xm < lo:
+        xp, xm = lo + 2.0 * h, lo
+    return xp, xm
+
+
+def galaxy_hessian(
+    g,
+    glob: np.ndarray,
+    local: np.ndarray,
+    sigma_model: float = 8.0,
+    model: str = "fdb_multi",
+    rel_step: float = 1e-5,
+) -> np.ndarray:
+    """
+    Hessian of chi2_g in (globals, locals) by central differences of the
+    analytic gradient (one-sided at bounds), symmetrized.
+    """
+    bm = MODELS[model]
+    nG = bm.n_glob
+    x = np.concatenate([np.asarray(glob, dtype=float), np.asarray(local, dtype=float)])
+    H = np.empty((len(x), len(x)))
+    for k, (lo, hi) in enumerate(bm.glob_bounds + bm.local_bounds):
+        h = rel_step * (hi - lo)
+        xp, xm = x.copy(), x.copy()
+        xp[k], xm[k] = _step_pair(x[k], lo, hi, h)
+        _, ggp, glp = bm.grad(xp[:nG], xp[nG:], g, sigma_model)
+        _, ggm, glm = bm.grad(xm[:nG], xm[nG:], g, sigma_model)
+        H[:, k] = (np.concatenate([ggp, glp]) - np.concatenate([ggm, glm])) / (xp[k] - xm[k])
+    return 0.5 * (H + H.T)
+
+
+def _init_worker(model: str, gals: list, sigma_model: float) -> None:
+    global _WORKER_MODEL, _WORKER_GALAXIES, _WORKER_SIGMA_MODEL
+    _WORKER_MODEL = model
+    _WORKER_GALAXIES = gals
+    _WORKER_SIGMA_MODEL = sigma_model
+
+
+def _solve_local_task(i: int, glob: np.ndarray, x_start: np.ndarray):
+    return solve_local(_WORKER_GALAXIES[i], glob, x_start, _WORKER_SIGMA_MODEL, _WORKER_MODEL)
+
+
+def _hessian_task(i: int, glob: np.ndarray, local: np.ndarray) -> np.ndarray:
+    return galaxy_hessian(_WORKER_GALAXIES[i], glob, local, _WORKER_SIGMA_MODEL, _WORKER_MODEL)
+
+
+def _on_bound(x: np.ndarray, bounds: Sequence[Tuple[float, float]], atol: float = 1e-8) -> np.ndarray:
+    return np.array(
+        [v <= lo + atol * (hi - lo) or v >= hi - atol * (hi - lo) for v, (lo, hi) in zip(x, bounds)], dtype=bool
+    )
+
+
+def profile_curvature(H: np.ndarray, local: np.ndarray, model: str = "fdb_multi") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (C, R) for one galaxy: the curvature C of its profile in the globals
+    (Schur complement over the free locals) and the first-order response
+    dL = R dG of its locals.  Locals on a bound are held fixed (zero rows of R).
+    """
+    bm = MODELS[model]
+    nG = bm.n_glob
+    C = H[:nG, :nG].copy()
+    R = np.zeros((len(local), nG))
+    free = ~_on_bound(local, bm.local_bounds)
+    if np.any(free):
+        idx = nG + np.flatnonzero(free)
+        H_gl = H[:nG, idx]
+        sol = np.linalg.solve(H[np.ix_(idx, idx)], H_gl.T)
+        C -= H_gl @ sol
+        R[free] = -sol
+    return C, R
+
+
+def schur_covariance(
+    H: np.ndarray,
+    glob: np.ndarray,
+    local: np.ndarray,
+    model: str = "fdb_multi",
+    atol: float = 1e-8,
+) -> np.ndarray:
+    """
+    Cov(G) = 2 (sum_i C_i)^{-1} from the per-galaxy Hessians H (N, d, d).
+
+    Globals on a bound are held fixed (zero variance).  If the reduced
+    curvature of the free globals is not positive definite, their block is NaN.
+    """
+    bm = MODELS[model]
+    nG = bm.n_glob
+    S = np.zeros((nG, nG))
+    for Hi, Li in zip(H, local):
+        S += profile_curvature(Hi, Li, model)[0]
+    cov = np.zeros((nG, nG))
+    g_free = np.flatnonzero(~_on_bound(glob, bm.glob_bounds, atol))
+    if g_free.size == 0:
+        return cov
+    # invert in bound-normalized units: alpha ~ 1e4 and mu ~ 1 differ by 1e8 in curvature
+    span = np.array([hi - lo for lo, hi in bm.glob_bounds])[g_free]
+    D = np.outer(span, span)
+    S_u = S[np.ix_(g_free, g_free)] * D
+    if np.any(np.linalg.eigvalsh(S_u) <= 0):
+        cov[np.ix_(g_free, g_free)] = np.nan
+    else:
+        cov[np.ix_(g_free, g_free)] = 2.0 * np.linalg.inv(S_u) * D
+    return cov
+
+
+def _format_globals(names: List[str], glob: np.ndarray, cov: np.ndarray) -> List[str]:
+    err = np.sqrt(np.diag(cov))
+    lines = []
+    for name, v, e in zip(names, glob, err):
+        note = "  (on bound, held fixed)" if e == 0 else ""
+        lines.append(f"  {name:8s} = {v:.6g} ± {e:.3g}{note}")
+    if len(names) == 2 and np.all(err > 0):
+        lines.append(f"  corr({names[0]}, {names[1]}) = {cov[0, 1] / (err[0] * err[1]):.3f}"
+                     "  (Schur complement over local parameters)")
+    return lines
+
+
+@dataclass
+class NestedResult:
+    glob: np.ndarray
+    local: np.ndarray
+    fun: float
+    chi2_per_galaxy: np.ndarray
+    grad_glob: Optional[np.ndarray] = None  # (N, n_glob) d chi2_i / dG at the solution
+    cov_glob: Optional[np.ndarray] = None
+    hessians: Optional[np.ndarray] = None   # (N, d, d) per-galaxy curvature blocks
+    n_outer: int = 0
+    nfev_inner: int = 0
+    names: List[str] = field(default_factory=list)
+    model: str = "fdb_multi"
+
+    @property
+    def x(self) -> np.ndarray:
+        """Flat chi2_multi vector (fdb_multi only)."""
+        return pack(self.glob, self.local)
+
+    def summary(self) -> str:
+        lines = [f"nested fit: chi2 = {self.fun:.6g} ({len(self.local)} galaxies, "
+                 f"{self.n_outer} outer evaluations, {self.nfev_inner} inner evaluations)"]
+        if self.cov_glob is not None:
+            lines += _format_globals(MODELS[self.model].glob_names, self.glob, self.cov_glob)
+        return "\n".join(lines)
+
+
+class NestedSolver:
+    """
+    Outer L-BFGS-B over the globals with per-galaxy inner solves, optionally
+    in a persistent process pool.  Use as a context manager when n_workers > 1.
+    Local parameters are kept between calls and used as warm starts.
+    """
+
+    def __init__(self, gals: list, n_workers: int = 1, sigma_model: float = 8.0, model: str = "fdb_multi"):
+        self.gals = list(gals)
+        self.model = model
+        self.bm = MODELS[model]
+        self.n_workers = n_workers
+        self.sigma_model = sigma_model
+        self.local = np.tile(self.bm.local0, (len(self.gals), 1))
+        self.grad_glob = np.zeros((len(self.gals), self.bm.n_glob))
+        self._pool: Optional[cf.ProcessPoolExecutor] = None
+        self.n_outer = 0
+        self.nfev_inner = 0
+
+    def __enter__(self) -> "NestedSolver":
+        if self.n_workers > 1:
+            self._pool = cf.ProcessPoolExecutor(
+                max_workers=self.n_workers,
+                initializer=_init_worker,
+                initargs=(self.model, self.gals, self.sigma_model),
+            )
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _map(self, task, local_fn, items: Sequence[Tuple]) -> list:
+        if self._pool is None:
+            return [local_fn(self.gals[i], *rest, self.sigma_model, self.model) for i, *rest in items]
+        futures = [self._pool.submit(task, *it) for it in items]
+        return [f.result() for f in futures]
+
+    def inner(self, glob: np.ndarray, which: Optional[Sequence[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Solve the local problems at `glob` (all galaxies, or `which`), warm-started."""
+        which = range(len(self.gals)) if which is None else which
+        items = [(i, np.asarray(glob, dtype=float), self.local[i]) for i in which]
+        out = self._map(_solve_local_task, solve_local, items)
+        f = np.zeros(len(items))
+        grad = np.zeros(self.bm.n_glob)
+        for k, ((i, _, _), (x, fi, gi, nfev)) in enumerate(zip(items, out)):
+            self.local[i] = x
+            self.grad_glob[i] = gi
+            f[k] = fi
+            grad += gi
+            self.nfev_inner += nfev
+        return f, grad
+
+    def profile(self, glob: np.ndarray) -> Tuple[float, np.ndarray]:
+        """F(G) = sum_i min_L chi2_i and its envelope gradient."""
+        self.n_outer += 1
+        f, grad = self.inner(glob)
+        return float(np.sum(f)), grad
+
+    def hessians(self, glob: np.ndarray) -> np.ndarray:
+        items = [(i, np.asarray(glob, dtype=float), self.local[i]) for i in range(len(self.gals))]
+        return np.array(self._map(_hessian_task, galaxy_hessian, items))
+
+    def solve(
+        self,
+        glob0: Optional[Sequence[float]] = None,
+        local0: Optional[np.ndarray] = None,
+        covariance: bool = True,
+        options: Optional[dict] = None,
+    ) -> NestedResult:
+        if local0 is not None:
+            self.local = np.array(local0, dtype=float).reshape(len(self.gals), -1)
+        lo = np.array([b[0] for b in self.bm.glob_bounds])
+        span = np.array([b[1] - b[0] for b in self.bm.glob_bounds])
+
+        # the outer search runs on the unit box so that alpha ~ 1e4 and mu ~ 1 are comparable
+        def outer(u):
+            f, grad = self.profile(lo + u * span)
+            return f, grad * span
+
+        if glob0 is None:
+            glob0 = self.bm.glob0
+        u0 = np.clip((np.asarray(glob0, dtype=float) - lo) / span, 0.0, 1.0)
+        opts = {"ftol": 1e-12, "gtol": 1e-8}
+        opts.update(options or {})
+        res = minimize(outer, u0, method="L-BFGS-B", jac=True, bounds=[(0.0, 1.0)] * len(u0), options=opts)
+        glob = lo + res.x * span
+        f, _ = self.inner(glob)
+        result = NestedResult(
+            glob=glob,
+            local=self.local.copy(),
+            fun=float(np.sum(f)),
+            chi2_per_galaxy=f,
+            grad_glob=self.grad_glob.copy(),
+            n_outer=self.n_outer,
+            nfev_inner=self.nfev_inner,
+            names=[self.bm.gal_name(g) for g in self.gals],
+            model=self.model,
+        )
+        if covariance:
+            result.hessians = self.hessians(glob)
+            result.cov_glob = schur_covariance(result.hessians, glob, result.local, self.model)
+        return result
+
+
+def fit_nested(
+    gals: list,
+    glob0: Optional[Sequence[float]] = None,
+    n_workers: int = 1,
+    sigma_model: float = 8.0,
+    covariance: bool = True,
+    model: str = "fdb_multi",
+) -> NestedResult:
+    """Nested fit of the joint chi^2 for `gals` (see module docstring)."""
+    with NestedSolver(gals, n_workers=n_workers, sigma_model=sigma_model, model=model) as solver:
+        return solver.solve(glob0, covariance=covariance)
+
+
+@dataclass
+class JointFitState:
+    """
+    Joint-fit solution with per-galaxy curvature blocks, saved as .npz.
+
+    After add/drop the state is a Newton prediction (exact=False): globals,
+    locals, chi2_i and gradients follow the local quadratic model and the
+    Hessians are kept.  refine() re-solves warm-started and sets exact=True.
+    gas_ref freezes fdb_multi's gas-mass normalization so that the S_scale of
+    existing members does not change when galaxies are added.
+    """
+    model: str
+    names: List[str]
+    glob: np.ndarray
+    local: np.ndarray        # (N, n_local)
+    chi2: np.ndarray         # (N,)
+    grad_glob: np.ndarray    # (N, n_glob)
+    hessians: np.ndarray     # (N, d, d)
+    build_dir: str = "build"
+    gas_ref: float = float("nan")
+    sigma_model: float = 8.0
+    exact: bool = True
+
+    @property
+    def bm(self) -> BlockModel:
+        return MODELS[self.model]
+
+    @property
+    def fun(self) -> float:
+        return float(np.sum(self.chi2))
+
+    @classmethod
+    def from_result(
+        cls, res: NestedResult, build_dir: str = "build", gas_ref: float = float("nan"), sigma_model: float = 8.0
+    ) -> "JointFitState":
+        return cls(
+            model=res.model,
+            names=list(res.names),
+            glob=np.asarray(res.glob, dtype=float),
+            local=np.asarray(res.local, dtype=float),
+            chi2=np.asarray(res.chi2_per_galaxy, dtype=float),
+            grad_glob=np.asarray(res.grad_glob, dtype=float),
+            hessians=np.asarray(res.hessians, dtype=float),
+            build_dir=build_dir,
+            gas_ref=float(gas_ref),
+            sigma_model=sigma_model,
+        )
+
+    @classmethod
+    def fit(
+        cls,
+        names: Optional[List[str]] = None,
+        model: str = "fdb_multi",
+        build_dir: str = "build",
+        n_workers: int = 1,
+        sigma_model: float = 8.0,
+    ) -> "JointFitState":
+        gals, gas_ref = MODELS[model].load(names, build_dir, float("nan"))
+        res = fit_nested(gals, n_workers=n_workers, sigma_model=sigma_model, model=model)
+        return cls.from_result(res, build_dir=build_dir, gas_ref=gas_ref, sigma_model=sigma_model)
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(
+            path,
+            model=np.array(self.model),
+            names=np.array(self.names, dtype=str),
+            glob=self.glob,
+            local=self.local,
+            chi2=self.chi2,
+            grad_glob=self.grad_glob,
+            hessians=self.hessians,
+            build_dir=np.array(self.build_dir),
+            gas_ref=np.array(self.gas_ref),
+            sigma_model=np.array(self.sigma_model),
+            exact=np.array(self.exact),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "JointFitState":
+        with np.load(path) as z:
+            return cls(
+                model=str(z["model"]),
+                names=[str(n) for n in z["names"]],
+                glob=z["glob"],
+                local=z["local"],
+                chi2=z["chi2"],
+                grad_glob=z["grad_glob"],
+                hessians=z["hessians"],
+                build_dir=str(z["build_dir"]),
+                gas_ref=float(z["gas_ref"]),
+                sigma_model=float(z["sigma_model"]),
+                exact=bool(z["exact"]),
+            )
+
+    def load_galaxies(self, names: Optional[List[str]] = None) -> list:
+        """Galaxy records for `names` (default: the members) with this state's gas normalization."""
+        gals, _ = self.bm.load(list(self.names if names is None else names), self.build_dir, self.gas_ref)
+        return gals
+
+    def covariance(self) -> np.ndarray:
+        return schur_covariance(self.hessians, self.glob, self.local, self.model)
+
+    def _newton_step(self) -> np.ndarray:
+        """
+        Projected Newton step dG on the summed profile sum_i F_i(G): globals
+        that would leave their box are pinned at the bound and the step is
+        re-solved for the others.
+        """
+        bm = self.bm
+        nG = bm.n_glob
+        S = np.zeros((nG, nG))
+        for H, L in zip(self.hessians, self.local):
+            S += profile_curvature(H, L, self.model)[0]
+        grad = self.grad_glob.sum(axis=0)
+        lo = np.array([b[0] for b in bm.glob_bounds])
+        hi = np.array([b[1] for b in bm.glob_bounds])
+        # a global already on its bound with the gradient pushing outward stays there
+        pinned = ((self.glob <= lo + 1e-8 * (hi - lo)) & (grad > 0)) | ((self.glob >= hi - 1e-8 * (hi - lo)) & (grad < 0))
+        target = np.clip(self.glob, lo, hi)
+        dG = np.zeros(nG)
+        for _ in range(nG + 1):
+            dG = np.where(pinned, target - self.glob, 0.0)
+            free = np.flatnonzero(~pinned)
+            if free.size:
+                fixed = np.flatnonzero(pinned)
+                rhs = grad[free] + S[np.ix_(free, fixed)] @ dG[fixed]
+                dG[free] = -np.linalg.lstsq(S[np.ix_(free, free)], rhs, rcond=None)[0]
+            new = self.glob + dG
+            out = ~pinned & ((new < lo) | (new > hi))
+            if not np.any(out):
+                break
+            target = np.where(out, np.clip(new, lo, hi), target)
+            pinned |= out
+        return np.clip(self.glob + dG, lo, hi) - self.glob
+
+    def _propagate(self, glob_old: np.ndarray) -> None:
+        dG = self.glob - glob_old
+        llo = np.array([b[0] for b in self.bm.local_bounds])
+        lhi = np.array([b[1] for b in self.bm.local_bounds])
+        for i, (H, L) in enumerate(zip(self.hessians, self.local)):
+            C, R = profile_curvature(H, L, self.model)
+            self.chi2[i] += self.grad_glob[i] @ dG + 0.5 * dG @ C @ dG
+            self.grad_glob[i] = self.grad_glob[i] + C @ dG
+            if len(L):
+                self.local[i] = np.clip(L + R @ dG, llo, lhi)
+        self.exact = False
+
+    def update_globals(self) -> np.ndarray:
+        """Newton update of the globals for the current membership; returns the change."""
+        glob_old = self.glob.copy()
+        self.glob = self.glob + self._newton_step()
+        self._propagate(glob_old)
+        return self.glob - glob_old
+
+    def add(self, g) -> np.ndarray:
+        """Solve galaxy `g` at the current globals, append its block and update the globals."""
+        name = self.bm.gal_name(g)
+        if name in self.names:
+            raise ValueError(f"{name} is already in the joint fit")
+        L, f, gg, _ = solve_local(g, self.glob, self.bm.local0, self.sigma_model, self.model)
+        H = galaxy_hessian(g, self.glob, L, self.sigma_model, self.model)
+        self.names.append(name)
+        self.local = np.vstack([self.local, L[None, :]])
+        self.chi2 = np.append(self.chi2, f)
+        self.grad_glob = np.vstack([self.grad_glob, gg[None, :]])
+        self.hessians = np.concatenate([self.hessians, H[None]], axis=0)
+        return self.update_globals()
+
+    def drop(self, name: str) -> np.ndarray:
+        """Remove a galaxy's block and update the globals."""
+        if name not in self.names:
+            raise KeyError(f"{name} is not in the joint fit")
+        keep = np.array([n != name for n in self.names])
+        self.names = [n for n in self.names if n != name]
+        self.local = self.local[keep]
+        self.chi2 = self.chi2[keep]
+        self.grad_glob = self.grad_glob[keep]
+        self.hessians = self.hessians[keep]
+        return self.update_globals()
+
+    def refine(self, gals: Optional[list] = None, n_workers: int = 1) -> NestedResult:
+        """Exact nested solve of the current membership, warm-started from the state."""
+        gals = self.load_galaxies() if gals is None else gals
+        with NestedSolver(gals, n_workers=n_workers, sigma_model=self.sigma_model, model=self.model) as solver:
+            res = solver.solve(self.glob, local0=self.local)
+        refined = JointFitState.from_result(res, self.build_dir, self.gas_ref, self.sigma_model)
+        self.__dict__.update(refined.__dict__)
+        return res
+
+    def jackknife(self, exact: bool = False, n_workers: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Leave-one-galaxy-out globals (N, n_glob) and the jackknife covariance
+        (N-1)/N sum_i (G_i - mean)(G_i - mean)^T.  Newton drops by default;
+        exact=True refines every subsample.
+        """
+        n = len(self.names)
+        G = np.empty((n, self.bm.n_glob))
+        for i, name in enumerate(self.names):
+            s = copy.deepcopy(self)
+            s.drop(name)
+            if exact:
+                s.refine(n_workers=n_workers)
+            G[i] = s.glob
+        d = G - G.mean(axis=0)
+        return G, (n - 1) / n * d.T @ d
+
+    def summary(self) -> str:
+        head = f"joint state [{self.model}]: {len(self.names)} galaxies, chi2 = {self.fun:.6g}"
+        if not self.exact:
+            head += "  (Newton prediction; refine for the exact solution)"
+        return "\n".join([head] + _format_globals(self.bm.glob_names, self.glob, self.covariance()))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Nested joint fits with an incremental on-disk state.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_fit = sub.add_parser("fit", help="nested fit of a galaxy set; writes the state")
+    p_fit.add_argument("--model", choices=sorted(MODELS), default="fdb_multi")
+    p_fit.add_argument("--galaxies", nargs="+", default=None)
+    p_fit.add_argument("--all", action="store_true", help="every <build-dir>/*_sparc.csv")
+    p_fit.add_argument("--build-dir", default="build")
+    p_add = sub.add_parser("add", help="add galaxies (Newton update of the globals)")
+    p_drop = sub.add_parser("drop", help="drop galaxies (Newton update of the globals)")
+    for p in (p_add, p_drop):
+        p.add_argument("names", nargs="+")
+        p.add_argument("--refine", action="store_true", help="exact warm-started re-solve afterwards")
+    sub.add_parser("refine", help="exact warm-started re-solve of the current members")
+    p_jk = sub.add_parser("jackknife", help="leave-one-galaxy-out globals")
+    p_jk.add_argument("--exact", action="store_true", help="refine every subsample instead of Newton drops")
+    sub.add_parser("show", help="print the stored state")
+    for p in sub.choices.values():
+        p.add_argument("--state", default="out/joint_state.npz")
+        p.add_argument("--workers", type=int, default=1)
+    args = ap.parse_args()
+
+    if args.cmd == "fit":
+        names = fdb_fit_multi.available_galaxies(args.build_dir) if args.all else args.galaxies
+        state = JointFitState.fit(names, model=args.model, build_dir=args.build_dir, n_workers=args.workers)
+    else:
+        state = JointFitState.load(args.state)
+    if args.cmd == "add":
+        for g in state.load_galaxies(args.names):
+            state.add(g)
+    elif args.cmd == "drop":
+        for name in args.names:
+            state.drop(name)
+    if args.cmd == "refine" or getattr(args, "refine", False):
+        state.refine(n_workers=args.workers)
+    if args.cmd == "jackknife":
+        G, cov = state.jackknife(exact=args.exact, n_workers=args.workers)
+        for name, row in zip(state.names, G):
+            print(f"  without {name:10s} " + "  ".join(f"{n}={v:.6g}" for n, v in zip(state.bm.glob_names, row)))
+        print("jackknife: " + "  ".join(
+            f"{n} ± {e:.3g}" for n, e in zip(state.bm.glob_names, np.sqrt(np.diag(cov)))))
+    print(state.summary())
+    if args.cmd in ("fit", "add", "drop", "refine"):
+        state.save(args.state)
+        print(f"Saved {args.state}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Affine-invariant ensemble MCMC for the FDB fitters.
+
+The fitters only report the L-BFGS-B optimum.  This module samples the
+posterior
+
+    ln p(x) = -chi^2(x) / 2   inside the fit bounds (flat prior), -inf outside,
+
+with the Goodman & Weare (2010) stretch move.  The ensemble is split into two
+halves that are updated alternately, so each half is one call of a batched
+chi^2 function (n_walkers/2 x n_params -> n_walkers/2):
+
+    fdb_fit.chi2_model_batch, fdb2_fit.chi2_v2_batch,
+    fdb_fit_multi.chi2_multi_batch, fdb2_fit_multi.total_chi2_multi_batch.
+
+Parameters pinned by equal bounds (eps, v0 in fdb_fit) are not sampled
+(fdb_optim.FreeParameters).
+
+Parallel tempering: with n_temps > 1, one ensemble per inverse temperature
+beta_k runs the stretch move on beta_k ln L (all temperatures in the same batch
+call), and neighbouring temperatures propose walker swaps after every step.
+Only the beta = 1 ensemble is stored.
+
+Chains are thinned and written to memory-mapped .npy files
+(np.lib.format.open_memmap), so long runs do not have to fit in RAM:
+
+    <chain>.npy        (n_saved, n_walkers, n_params)  full parameter vectors
+    <chain>_lnl.npy    (n_saved, n_walkers)           ln L = -chi^2/2
+
+Usage:
+  python scripts/fdb_mcmc.py fdb_fit build/NGC2403_sparc.csv --steps 4000 --thin 10
+  python scripts/fdb_mcmc.py fdb_fit build/NGC2403_sparc.csv --model kernel --temps 4
+  python scripts/fdb_mcmc.py fdb2_fit build/NGC3198_sparc.csv
+  python scripts/fdb_mcmc.py fdb_fit_multi --walkers 64 --chain out/multi_chain.npy
+  python scripts/fdb_mcmc.py fdb_fit_multi --walkers 256 --shared-workers 4
+  python scripts/fdb_mcmc.py fdb2_fit_multi --check
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import os
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.optimize import minimize
+
+from fdb_optim import FreeParameters
+
+
+@dataclass
+class Target:
+    """A posterior to sample: scalar and batched chi^2 plus start vector and bounds."""
+    name: str
+    param_names: List[str]
+    x0: np.ndarray
+    bounds: List[Tuple[float, float]]
+    chi2: Callable[[np.ndarray], float]
+    chi2_batch: Callable[[np.ndarray], np.ndarray]
+    shared: Optional[Tuple[str, list]] = None  # (fdb_shared model, galaxies) for --shared-workers
+
+
+@dataclass
+class MCMCResult:
+    chain: np.ndarray           # (n_saved, n_walkers, n_params), beta = 1 ensemble
+    log_like: np.ndarray        # (n_saved, n_walkers)
+    betas: np.ndarray
+    acceptance: np.ndarray      # stretch-move acceptance per temperature
+    swap_acceptance: np.ndarray  # per adjacent temperature pair
+    free: np.ndarray            # boolean mask of sampled parameters
+    thin: int = 1
+    param_names: List[str] = field(default_factory=list)
+
+    def flat(self, burn: int = 0) -> np.ndarray:
+        """Samples after `burn` saved steps, flattened over walkers: (n, n_params)."""
+        return np.asarray(self.chain[burn:]).reshape(-1, self.chain.shape[-1])
+
+    def autocorr_time(self, burn: int = 0) -> np.ndarray:
+        """Integrated autocorrelation time per free parameter, in saved steps."""
+        x = np.asarray(self.chain[burn:])[:, :, self.free]
+        return np.array([integrated_time(x[:, :, k]) for k in range(x.shape[-1])])
+
+    def summary(self, burn: int = 0) -> str:
+        samples = self.flat(burn)
+        names = self.param_names or [f"x{i}" for i in range(samples.shape[1])]
+        q16, q50, q84 = np.percentile(samples, [16, 50, 84], axis=0)
+        tau = self.autocorr_time(burn)
+        lines = [
+            f"{samples.shape[0]} samples ({self.chain.shape[1]} walkers, thin={self.thin}, burn={burn}); "
+            f"acceptance {np.array2string(self.acceptance, precision=2)}"
+        ]
+        if len(self.betas) > 1:
+            lines.append(
+                f"  betas {np.array2string(self.betas, precision=3)}, "
+                f"swap acceptance {np.array2string(self.swap_acceptance, precision=2)}"
+            )
+        for k, i in enumerate(np.flatnonzero(self.free)):
+            lines.append(
+                f"  {names[i]:>12s} = {q50[i]:.5g} +{q84[i] - q50[i]:.3g} -{q50[i] - q16[i]:.3g}"
+                f"   (tau ~ {tau[k]:.1f} saved steps)"
+            )
+        lines.append(f"  max ln L = {np.max(self.log_like[burn:]):.5g}")
+        return "\n".join(lines)
+
+
+def integrated_time(x: np.ndarray, c: float = 5.0) -> float:
+    """
+    Integrated autocorrelation time of an (n_steps, n_walkers) chain, from the
+    walker-averaged autocorrelation function with Sokal's automatic window.
+    """
+    n = x.shape[0]
+    if n < 2:
+        return float("nan")
+    f = x - x.mean(axis=0)
+    m = 2 * n
+    ft = np.fft.rfft(f, n=m, axis=0)
+    acf = np.fft.irfft(ft * np.conj(ft), n=m, axis=0)[:n].mean(axis=1)
+    if acf[0] <= 0:
+        return float("nan")
+    acf /= acf[0]
+    taus = 2.0 * np.cumsum(acf) - 1.0
+    window = np.arange(n) < c * taus
+    w = int(np.argmin(window)) if not np.all(window) else n - 1
+    return float(taus[w])
+
+
+def temperature_ladder(n_temps: int, n_dim: int, max_temp: Optional[float] = None) -> np.ndarray:
+    """
+    Geometric ladder of inverse temperatures, beta_0 = 1.  By default the
+    spacing is T_{k+1}/T_k = 1 + sqrt(2/n_dim), which keeps swap rates
+    reasonable for near-Gaussian posteriors.
+    """
+    if n_temps <= 1:
+        return np.ones(1)
+    if max_temp is None:
+        return (1.0 + np.sqrt(2.0 / max(n_dim, 1))) ** -np.arange(n_temps, dtype=float)
+    return max_temp ** -np.linspace(0.0, 1.0, n_temps)
+
+
+def _log_like(chi2_batch, fp: FreeParameters, lo, hi, Z: np.ndarray) -> np.ndarray:
+    """ln L = -chi^2/2 for free-parameter rows Z, -inf outside the bounds or on rejected rows."""
+    inside = np.all((Z >= lo) & (Z <= hi), axis=1)
+    out = np.full(Z.shape[0], -np.inf)
+    if np.any(inside):
+        X = np.tile(fp.x_full, (int(inside.sum()), 1))
+        X[:, fp.free] = Z[inside]
+        chi2 = np.asarray(chi2_batch(X), dtype=float)
+        out[inside] = np.where(np.isfinite(chi2) & (chi2 < 1e29), -0.5 * chi2, -np.inf)
+    return out
+
+
+def _open_chain(path: Optional[str], shape: Tuple[int, ...]) -> np.ndarray:
+    if path is None:
+        return np.empty(shape)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=shape)
+
+
+def sample(
+    chi2_batch: Callable[[np.ndarray], np.ndarray],
+    x0: Sequence[float],
+    bounds: Sequence[Tuple[float, float]],
+    n_walkers: int = 32,
+    n_steps: int = 2000,
+    n_temps: int = 1,
+    max_temp: Optional[float] = None,
+    thin: int = 1,
+    chain_path: Optional[str] = None,
+    a: float = 2.0,
+    init_scale: float = 1e-2,
+    seed: Optional[int] = 0,
+    param_names: Optional[List[str]] = None,
+    progress: int = 0,
+) -> MCMCResult:
+    """
+    Run the (tempered) stretch-move ensemble sampler.
+
+    chi2_batch maps full parameter vectors (n, d) to chi^2 (n,).  Walkers start
+    in a ball of relative size init_scale (of the bound widths) around x0,
+    typically the L-BFGS-B optimum.  Every `thin`-th step of the beta = 1
+    ensemble is stored, in memory-mapped files if chain_path is given.
+    """
+    rng = np.random.default_rng(seed)
+    fp = FreeParameters.from_bounds(x0, bounds)
+    fb = fp.free_bounds
+    d = len(fb)
+    if d == 0:
+        raise ValueError("no free parameters to sample")
+    n_walkers += n_walkers % 2
+    if n_walkers < 2 * d:
+        raise ValueError(f"need at least {2 * d} walkers for {d} free parameters")
+    lo = np.array([b[0] for b in fb])
+    hi = np.array([b[1] for b in fb])
+    betas = temperature_ladder(n_temps, d, max_temp)
+    n_t = len(betas)
+    log_like = partial(_log_like, chi2_batch, fp, lo, hi)
+
+    # initial ensembles (n_t, n_walkers, d); redraw closer to x0 until all are valid
+    z0 = np.clip(fp.reduce(fp.x_full), lo, hi)
+    Z = np.empty((n_t, n_walkers, d))
+    L = np.full((n_t, n_walkers), -np.inf)
+    scale = init_scale * (hi - lo)
+    for attempt in range(50):
+        bad = ~np.isfinite(L)
+        if not np.any(bad):
+            break
+        trial = np.clip(z0 + scale * rng.standard_normal((int(bad.sum()), d)), lo, hi)
+        Z[bad] = trial
+        L[bad] = log_like(trial)
+        scale = scale * 0.5
+    else:
+        raise RuntimeError("could not initialise walkers with finite likelihood around x0")
+
+    n_saved = n_steps // thin
+    chain = _open_chain(chain_path, (n_saved, n_walkers, len(fp.x_full)))
+    lnl_path = None if chain_path is None else os.path.splitext(chain_path)[0] + "_lnl.npy"
+    lnl = _open_chain(lnl_path, (n_saved, n_walkers))
+
+    half = n_walkers // 2
+    halves = (np.arange(half), np.arange(half, n_walkers))
+    n_acc = np.zeros(n_t)
+    n_swap_acc = np.zeros(max(n_t - 1, 0))
+    for step in range(n_steps):
+        for k in (0, 1):
+            active, other = halves[k], halves[1 - k]
+            # stretch move for this half of every temperature in one batch
+            zz = ((a - 1.0) * rng.random((n_t, half)) + 1.0) ** 2 / a
+            partner = other[rng.integers(0, half, size=(n_t, half))]
+            Xc = np.take_along_axis(Z, partner[:, :, None], axis=1)
+            Y = Xc + zz[:, :, None] * (Z[:, active] - Xc)
+            L_new = log_like(Y.reshape(-1, d)).reshape(n_t, half)
+            with np.errstate(invalid="ignore"):
+                log_r = (d - 1) * np.log(zz) + betas[:, None] * (L_new - L[:, active])
+            accept = np.log(rng.random((n_t, half))) < log_r
+            Z[:, active] = np.where(accept[:, :, None], Y, Z[:, active])
+            L[:, active] = np.where(accept, L_new, L[:, active])
+            n_acc += accept.sum(axis=1)
+        # swaps between neighbouring temperatures, hottest pair first
+        for t in range(n_t - 1, 0, -1):
+            perm = rng.permutation(n_walkers)
+            log_s = (betas[t - 1] - betas[t]) * (L[t, perm] - L[t - 1])
+            swap = np.log(rng.random(n_walkers)) < log_s
+            i_cold = np.flatnonzero(swap)
+            i_hot = perm[swap]
+            Z[t - 1, i_cold], Z[t, i_hot] = Z[t, i_hot].copy(), Z[t - 1, i_cold].copy()
+            L[t - 1, i_cold], L[t, i_hot] = L[t, i_hot].copy(), L[t - 1, i_cold].copy()
+            n_swap_acc[t - 1] += swap.sum()
+        if (step + 1) % thin == 0 and (step + 1) // thin <= n_saved:
+            s = (step + 1) // thin - 1
+            chain[s] = fp.x_full
+            chain[s][:, fp.free] = Z[0]
+            lnl[s] = L[0]
+        if progress and (step + 1) % progress == 0:
+            print(f"  step {step + 1}/{n_steps}: max ln L = {L[0].max():.5g}, "
+                  f"acceptance = {n_acc[0] / ((step + 1) * n_walkers):.2f}")
+
+    if isinstance(chain, np.memmap):
+        chain.flush()
+        lnl.flush()
+    return MCMCResult(
+        chain=chain,
+        log_like=lnl,
+        betas=betas,
+        acceptance=n_acc / (n_steps * n_walkers),
+        swap_acceptance=n_swap_acc / max(n_steps * n_walkers, 1),
+        free=fp.free,
+        thin=thin,
+        param_names=list(param_names or []),
+    )
+
+
+def check_batch(target: Target, n: int = 64, seed: int = 0) -> float:
+    """Max relative difference between chi2_batch and the scalar chi2 on random points in the bounds."""
+    fp = FreeParameters.from_bounds(target.x0, target.bounds)
+    rng = np.random.default_rng(seed)
+    lo = np.array([b[0] for b in target.bounds])
+    hi = np.array([b[1] for b in target.bounds])
+    X = lo + rng.random((n, len(lo))) * (hi - lo)
+    X[:, ~fp.free] = fp.x_full[~fp.free]
+    batch = target.chi2_batch(X)
+    single = np.array([target.chi2(x) for x in X])
+    return float(np.max(np.abs(batch - single) / np.maximum(np.abs(single), 1.0)))
+
+
+# ---------------------------------------------------------------------------
+# targets
+
+
+def target_fdb_fit(csv_path: str, model: str = "rotmod", **kw) -> Target:
+    import fdb_fit
+
+    prob = fdb_fit.prepare_fit(csv_path, model=model, **kw)
+    kwargs = prob.objective_kwargs()
+    names = ["alpha", "eps", "ml_scale", "mu", "R_ev/Rd", "sigma_ev/Rd", "v0"]
+    return Target(
+        name=f"fdb_fit:{prob.tag}:{model}",
+        param_names=names,
+        x0=prob.x0,
+        bounds=prob.bounds,
+        chi2=partial(fdb_fit.chi2_model, **kwargs),
+        chi2_batch=partial(fdb_fit.chi2_model_batch, **kwargs),
+    )
+
+
+def target_fdb2_fit(csv_path: str) -> Target:
+    import fdb2_fit
+
+    tag, g = fdb2_fit.prepare_galaxy_v2(csv_path)
+    ctx = fdb2_fit.FitContext.from_galaxy(g)
+    outer = g.R_kpc > 3.0 * ctx.Rd
+    Vflat0 = max(float(np.median(g.Vobs[outer])) ** 2, 1.0) if np.any(outer) else 1.0
+    return Target(
+        name=f"fdb2_fit:{tag}",
+        param_names=["Vflat2"],
+        x0=np.array([Vflat0]),
+        bounds=[(1.0, 5e4)],
+        chi2=partial(fdb2_fit.chi2_v2, g=ctx),
+        chi2_batch=partial(fdb2_fit.chi2_v2_batch, g=ctx),
+    )
+
+
+def target_fdb_fit_multi(names: Optional[List[str]] = None) -> Target:
+    import fdb_fit_multi
+
+    gals = fdb_fit_multi.load_galaxies(names or fdb_fit_multi.DEFAULT_GALAXIES)
+    x0, bounds = fdb_fit_multi.initial_guess(len(gals))
+    pnames = ["alpha", "mu"]
+    for prefix in ("ML", "R_ev/Rd", "sigma_ev/Rd"):
+        pnames += [f"{prefix}[{g.name}]" for g in gals]
+    return Target(
+        name="fdb_fit_multi",
+        param_names=pnames,
+        x0=x0,
+        bounds=bounds,
+        chi2=partial(fdb_fit_multi.chi2_multi, gals=gals),
+        chi2_batch=partial(fdb_fit_multi.chi2_multi_batch, gals=gals),
+        shared=("fdb_multi", gals),
+    )
+
+
+def target_fdb2_fit_multi() -> Target:
+    import fdb2_fit_multi
+
+    galaxies = fdb2_fit_multi.load_galaxies()
+    x0, bounds = fdb2_fit_multi.initial_guess(galaxies)
+    contexts = fdb2_fit_multi.fit_contexts(galaxies)
+    return Target(
+        name="fdb2_fit_multi",
+        param_names=["Delta_v2", "eps"] + [f"kappa[{tag}]" for tag, _ in galaxies],
+        x0=x0,
+        bounds=bounds,
+        chi2=partial(fdb2_fit_multi.total_chi2_multi, galaxies=contexts),
+        chi2_batch=partial(fdb2_fit_multi.total_chi2_multi_batch, galaxies=contexts),
+        shared=("fdb2_multi", galaxies),
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Ensemble MCMC for the FDB fitters.")
+    ap.add_argument("target", choices=["fdb_fit", "fdb2_fit", "fdb_fit_multi", "fdb2_fit_multi"])
+    ap.add_argument("sparc_csv", nargs="?", help="galaxy CSV for the single-galaxy targets")
+    ap.add_argument("--model", choices=["rotmod", "kernel"], default="rotmod", help="fdb_fit model")
+    ap.add_argument("--galaxies", nargs="+", default=None, help="fdb_fit_multi galaxy names")
+    ap.add_argument("--walkers", type=int, default=32)
+    ap.add_argument("--steps", type=int, default=2000)
+    ap.add_argument("--temps", type=int, default=1, help="parallel-tempering temperatures")
+    ap.add_argument("--max-temp", type=float, default=None, help="hottest temperature (default: geometric ladder)")
+    ap.add_argument("--thin", type=int, default=1)
+    ap.add_argument("--burn", type=int, default=None, help="saved steps discarded in the summary (default 1/4)")
+    ap.add_argument("--chain", default=None, help="memory-mapped chain output (.npy)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--no-optimize", action="store_true", help="start the walkers at x0, not the L-BFGS-B optimum")
+    ap.add_argument("--check", action="store_true", help="compare batched and scalar chi^2 and exit")
+    ap.add_argument("--shared-workers", type=int, default=0,
+                    help="multi-galaxy targets: evaluate each half-ensemble batch in N processes over "
+                         "shared memory (fdb_shared.py; 0 = serial)")
+    args = ap.parse_args()
+
+    if args.target in ("fdb_fit", "fdb2_fit") and not args.sparc_csv:
+        ap.error(f"{args.target} needs a galaxy CSV")
+    if args.target == "fdb_fit":
+        target = target_fdb_fit(args.sparc_csv, model=args.model)
+    elif args.target == "fdb2_fit":
+        target = target_fdb2_fit(args.sparc_csv)
+    elif args.target == "fdb_fit_multi":
+        target = target_fdb_fit_multi(args.galaxies)
+    else:
+        target = target_fdb2_fit_multi()
+
+    if args.check:
+        print(f"{target.name}: max rel. |batch - scalar| = {check_batch(target):.2e}")
+        return
+
+    x_start = np.asarray(target.x0, dtype=float)
+    if not args.no_optimize:
+        res = minimize(target.chi2, x_start, method="L-BFGS-B", bounds=target.bounds)
+        x_start = res.x
+        print(f"{target.name}: L-BFGS-B chi2 = {res.fun:.6g}")
+
+    chi2_batch = target.chi2_batch
+    with contextlib.ExitStack() as stack:
+        if args.shared_workers > 1 and target.shared is not None:
+            from fdb_shared import SharedEvaluator
+
+            model, gals = target.shared
+            chi2_batch = stack.enter_context(SharedEvaluator(gals, model, n_workers=args.shared_workers)).fun_batch
+        result = sample(
+            chi2_batch,
+            x_start,
+            target.bounds,
+            n_walkers=args.walkers,
+            n_steps=args.steps,
+            n_temps=args.temps,
+            max_temp=args.max_temp,
+            thin=args.thin,
+            chain_path=args.chain,
+            seed=args.seed,
+            param_names=target.param_names,
+            progress=max(args.steps // 10, 1),
+        )
+    burn = args.burn if args.burn is not None else result.chain.shape[0] // 4
+    print(result.summary(burn=burn))
+    if args.chain:
+        print(f"Saved {args.chain}")
+
+
+if __name__ == "__main__":
+    main()
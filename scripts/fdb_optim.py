@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Optimization helpers shared by the FDB fitters.
+
+multistart_minimize() is a parallel multi-start driver for bounded objectives
+such as fdb_fit.chi2_model (7 parameters, two pinned to zero), fdb2_fit.chi2_v2
+and the multi-galaxy objectives:
+
+- parameters with equal lower/upper bounds are stripped from the search space
+  (FreeParameters maps between the full and the free vector);
+- starts are Sobol or Latin-hypercube points inside the bounds (the caller's
+  x0 is always the first start);
+- local L-BFGS-B runs go to a process pool, and pending starts are cancelled
+  once the best chi^2 has not improved by more than `ftol` for `patience`
+  consecutive starts; starts are counted in submission order (not completion
+  order), so a given seed gives the same result for any n_workers;
+- the local minima are clustered into basins (distance in bound-normalized
+  coordinates) and reported with hit counts.
+
+The objective must be picklable for n_workers > 1: a module-level function
+or a functools.partial of one, not a lambda.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures as cf
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.optimize import minimize
+from scipy.stats import qmc
+
+
+@dataclass
+class FreeParameters:
+    """Map between the full parameter vector and the free (non-fixed) subset."""
+    x_full: np.ndarray
+    free: np.ndarray  # boolean mask
+    bounds: List[Tuple[float, float]]
+
+    @classmethod
+    def from_bounds(cls, x0: Sequence[float], bounds: Sequence[Tuple[float, float]]) -> "FreeParameters":
+        x_full = np.asarray(x0, dtype=float).copy()
+        free = np.array([hi > lo for lo, hi in bounds], dtype=bool)
+        for i, (lo, hi) in enumerate(bounds):
+            if not free[i]:
+                x_full[i] = lo
+        return cls(x_full=x_full, free=free, bounds=[tuple(b) for b in bounds])
+
+    @property
+    def free_bounds(self) -> List[Tuple[float, float]]:
+        return [b for b, f in zip(self.bounds, self.free) if f]
+
+    def expand(self, z: np.ndarray) -> np.ndarray:
+        x = self.x_full.copy()
+        x[self.free] = z
+        return x
+
+    def reduce(self, x: np.ndarray) -> np.ndarray:
+        return np.asarray(x, dtype=float)[self.free]
+
+
+def _reduced_objective(z, fun, fp: FreeParameters):
+    return fun(fp.expand(z))
+
+
+def _reduced_objective_grad(z, fun, fp: FreeParameters):
+    f, g = fun(fp.expand(z))
+    return f, np.asarray(g)[fp.free]
+
+
+def _local_run(fun, z0, bounds, jac, options):
+    res = minimize(fun, z0, method="L-BFGS-B", bounds=bounds, jac=jac, options=options)
+    return np.asarray(res.x, dtype=float), float(res.fun), int(res.nfev), bool(res.success)
+
+
+@dataclass
+class Basin:
+    x: np.ndarray
+    fun: float
+    hits: int
+
+
+@dataclass
+class MultiStartResult:
+    x: np.ndarray
+    fun: float
+    basins: List[Basin]
+    starts: np.ndarray          # full-space start points that were run
+    minima: np.ndarray          # full-space local minima, same order as finished runs
+    fvals: np.ndarray
+    n_started: int
+    n_cancelled: int
+    nfev: int = 0
+    history: List[float] = field(default_factory=list)  # best chi^2 after each finished start
+
+    def summary(self, max_basins: int = 5) -> str:
+        lines = [
+            f"multi-start: best chi2 = {self.fun:.6g} after {len(self.fvals)} local runs "
+            f"({self.n_cancelled} cancelled, {self.nfev} evaluations), {len(self.basins)} basins"
+        ]
+        for b in self.basins[:max_basins]:
+            lines.append(f"  basin chi2={b.fun:.6g} hits={b.hits} x={np.array2string(b.x, precision=4)}")
+        return "\n".join(lines)
+
+
+def start_points(
+    bounds: Sequence[Tuple[float, float]],
+    n: int,
+    method: str = "sobol",
+    seed: Optional[int] = 0,
+) -> np.ndarray:
+    """n quasi-random points inside (free) bounds, shape (n, d)."""
+    lo = np.array([b[0] for b in bounds], dtype=float)
+    hi = np.array([b[1] for b in bounds], dtype=float)
+    d = lo.size
+    if n <= 0 or d == 0:
+        return np.empty((0, d))
+    if method == "sobol":
+        # draw a full power-of-two block to keep the balance properties, then truncate
+        m = int(np.ceil(np.log2(n)))
+        u = qmc.Sobol(d, scramble=True, seed=seed).random_base2(m)[:n]
+    elif method == "lhs":
+        u = qmc.LatinHypercube(d, seed=seed).random(n)
+    elif method == "random":
+        u = np.random.default_rng(seed).random((n, d))
+    else:
+        raise ValueError(f"unknown start method {method!r}")
+    return lo + u * (hi - lo)
+
+
+def cluster_basins(
+    minima: np.ndarray,
+    fvals: np.ndarray,
+    bounds: Sequence[Tuple[float, float]],
+    xtol: float = 0.02,
+) -> List[Basin]:
+    """Greedy clustering of local minima (best first) within xtol in unit-scaled coordinates."""
+    lo = np.array([b[0] for b in bounds], dtype=float)
+    span = np.array([b[1] - b[0] for b in bounds], dtype=float)
+    span[span <= 0] = 1.0
+    order = np.argsort(fvals)
+    basins: List[Basin] = []
+    centers: List[np.ndarray] = []
+    for i in order:
+        u = (minima[i] - lo) / span
+        for b, c in zip(basins, centers):
+            if np.max(np.abs(u - c)) <= xtol:
+                b.hits += 1
+                break
+        else:
+            basins.append(Basin(x=minima[i].copy(), fun=float(fvals[i]), hits=1))
+            centers.append(u)
+    return basins
+
+
+def multistart_minimize(
+    fun: Callable,
+    x0: Sequence[float],
+    bounds: Sequence[Tuple[float, float]],
+    n_starts: int = 32,
+    method: str = "sobol",
+    jac: bool = False,
+    n_workers: int = 1,
+    ftol: float = 1e-6,
+    patience: Optional[int] = None,
+    xtol: float = 0.02,
+    seed: Optional[int] = 0,
+    options: Optional[dict] = None,
+) -> MultiStartResult:
+    """
+    Minimize fun(x) over box bounds from x0 plus n_starts - 1 quasi-random starts.
+
+    jac=True means fun returns (value, gradient), as the fused objectives do.
+    patience defaults to max(4, n_starts // 4); set it >= n_starts to run all starts.
+    """
+    fp = FreeParameters.from_bounds(x0, bounds)
+    fb = fp.free_bounds
+    z0 = np.clip(fp.reduce(fp.x_full), [b[0] for b in fb], [b[1] for b in fb]) if fb else np.empty(0)
+    if fb:
+        z_starts = np.vstack([z0[None, :], start_points(fb, max(n_starts - 1, 0), method, seed)])
+    else:
+        z_starts = z0[None, :]
+    wrapped = partial(_reduced_objective_grad if jac else _reduced_objective, fun=fun, fp=fp)
+    if patience is None:
+        patience = max(4, n_starts // 4)
+
+    results: List[Tuple[int, np.ndarray, float, int]] = []
+    history: List[float] = []
+    best = np.inf
+    stall = 0
+    n_cancelled = 0
+
+    def record(k, out):
+        nonlocal best, stall
+        z, f, nfev, _ = out
+        results.append((k, z, f, nfev))
+        if f < best - ftol * max(1.0, abs(best) if np.isfinite(best) else 1.0):
+            best = f
+            stall = 0
+        else:
+            stall += 1
+        history.append(best)
+
+    if not fb:
+        f = wrapped(z0)
+        record(0, (z0, float(f[0] if jac else f), 1, True))
+    elif n_workers <= 1:
+        for k, z in enumerate(z_starts):
+            record(k, _local_run(wrapped, z, fb, jac, options))
+            if stall >= patience:
+                n_cancelled = len(z_starts) - k - 1
+                break
+    else:
+        with cf.ProcessPoolExecutor(max_workers=n_workers) as ex:
+            futures = [ex.submit(_local_run, wrapped, z, fb, jac, options) for z in z_starts]
+            # results are consumed in submission order, so the early stop (and
+            # the returned minimum) is the same as the serial run for a given seed
+            for k, fut in enumerate(futures):
+                record(k, fut.result())
+                if stall >= patience:
+                    for f in futures[k + 1 :]:
+                        f.cancel()
+                    n_cancelled = len(futures) - k - 1
+                    break
+
+    results.sort(key=lambda r: r[0])
+    minima = np.array([fp.expand(r[1]) for r in results])
+    fvals = np.array([r[2] for r in results])
+    basins = cluster_basins(minima, fvals, bounds, xtol=xtol)
+    i_best = int(np.argmin(fvals))
+    return MultiStartResult(
+        x=minima[i_best],
+        fun=float(fvals[i_best]),
+        basins=basins,
+        starts=np.array([fp.expand(z_starts[r[0]]) for r in results]),
+        minima=minima,
+        fvals=fvals,
+        n_started=len(results),
+        n_cancelled=n_cancelled,
+        nfev=int(sum(r[3] for r in results)),
+        history=history,
+    )
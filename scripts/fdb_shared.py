@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Shared-memory parallel evaluator for the batched multi-galaxy objectives.
+
+fdb_fit_multi.chi2_multi_batch and fdb2_fit_multi.total_chi2_multi_batch
+loop over galaxies for a whole batch of parameter vectors.  SharedEvaluator
+splits the galaxies into one contiguous chunk per worker (balanced by number
+of radial points) and evaluates the chunks in a persistent process pool:
+
+- every ndarray field of the galaxy records is copied once into a single
+  multiprocessing.shared_memory block; workers attach to it in the pool
+  initializer and rebuild the records as zero-copy views (the fdb2 workers
+  also build their FitContexts there), so no galaxy data is pickled per call;
+- per call the (n, d) batch goes out, restricted to each chunk's columns
+  (globals plus the chunk's local parameters), and each chunk returns its
+  (n,) chi^2 column, which is summed;
+- a chunk evaluates the unchanged serial batch objective, so the result
+  equals the serial call up to summation order.
+
+Every call pays one IPC round trip (submit, wake the workers, gather) of
+1-2 ms.  That is more than a single serial evaluation of the full sample
+(0.5-0.8 ms), so the evaluator only takes batches: a call should carry
+many vectors (about 0.03-0.1 ms each serially), e.g. the half-ensembles of
+fdb_mcmc.py (--shared-workers N, n_walkers/2 x n_temps rows per call).
+L-BFGS-B asks for one point at a time and stays serial.  Run the timing
+CLI below with the intended batch size on the target machine before
+turning it on.
+
+The pool and the shared block live until close() (use as a context manager).
+With n_workers <= 1 the serial batch objective is called directly.
+
+Models (MODELS): "fdb_multi" (vec = [alpha, mu, ML_i.., R_ev_i.., sigma_ev_i..]),
+"fdb2_multi" (vec = [Delta_v2, eps, kappa_i..]).
+
+Usage:
+  python scripts/fdb_shared.py --all --workers 4          # timing / consistency check
+  python scripts/fdb_shared.py --model fdb2_multi --workers 4 --batch 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures as cf
+import dataclasses
+import time
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+@dataclass
+class SharedModel:
+    """How to evaluate a chunk of galaxies and where its parameters sit in the full vector."""
+    name: str
+    batch: Callable  # (X (n, d_chunk), gals, sigma_model) -> chi2 (n,)
+    n_local: int     # per-galaxy parameters after the globals
+    n_glob: int = 2
+
+    def sub_index(self, n: int, lo: int, hi: int) -> np.ndarray:
+        """Indices of [globals, locals of galaxies lo..hi-1] in the full vector of n galaxies."""
+        idx = [np.arange(self.n_glob)]
+        for k in range(self.n_local):
+            idx.append(self.n_glob + k * n + np.arange(lo, hi))
+        return np.concatenate(idx)
+
+
+def _fdb_multi_batch(X, gals, sigma_model: float = 8.0):
+    from fdb_fit_multi import chi2_multi_batch
+
+    return chi2_multi_batch(X, gals, sigma_model)
+
+
+def _fdb2_multi_batch(X, gals, sigma_model: float = 8.0):
+    from fdb2_fit_multi import total_chi2_multi_batch
+
+    return total_chi2_multi_batch(X, gals)
+
+
+MODELS: Dict[str, SharedModel] = {
+    "fdb_multi": SharedModel("fdb_multi", _fdb_multi_batch, n_local=3),
+    "fdb2_multi": SharedModel("fdb2_multi", _fdb2_multi_batch, n_local=1),
+}
+
+
+def _records(gals: list) -> list:
+    """The dataclass records of a galaxy list ((tag, GalaxyData) pairs for fdb2)."""
+    return [g[1] if isinstance(g, tuple) else g for g in gals]
+
+
+def pack_arrays(records: list) -> Tuple[shared_memory.SharedMemory, list]:
+    """
+    Copy every float ndarray field of the dataclass records into one shared
+    block.  Returns (shm, layout); layout[i] = (cls, {field: value}, {field: (offset, shape, dtype)}).
+    """
+    layout = []
+    offset = 0
+    for rec in records:
+        scalars, arrays = {}, {}
+        for f in dataclasses.fields(rec):
+            val = getattr(rec, f.name)
+            if isinstance(val, np.ndarray):
+                arrays[f.name] = (offset, val.shape, val.dtype.str)
+                offset += val.nbytes
+            else:
+                scalars[f.name] = val
+        layout.append((type(rec), scalars, arrays))
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for rec, (_, _, arrays) in zip(records, layout):
+        for name, (off, shape, dtype) in arrays.items():
+            view = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=off)
+            view[...] = getattr(rec, name)
+    return shm, layout
+
+
+def unpack_arrays(shm: shared_memory.SharedMemory, layout: list) -> list:
+    """Rebuild the records with read-only ndarray views on the shared block."""
+    records = []
+    for cls, scalars, arrays in layout:
+        kw = dict(scalars)
+        for name, (off, shape, dtype) in arrays.items():
+            view = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=off)
+            view.flags.writeable = False
+            kw[name] = view
+        records.append(cls(**kw))
+    return records
+
+
+def balanced_chunks(sizes: Sequence[int], n_chunks: int) -> List[Tuple[int, int]]:
+    """Contiguous [lo, hi) ranges with roughly equal total size."""
+    sizes = np.asarray(sizes, dtype=float)
+    n_chunks = max(1, min(n_chunks, len(sizes)))
+    cum = np.concatenate(([0.0], np.cumsum(sizes)))
+    cuts = np.searchsorted(cum, cum[-1] * np.arange(1, n_chunks) / n_chunks)
+    edges = np.unique(np.concatenate(([0], np.clip(cuts, 1, len(sizes) - 1), [len(sizes)])))
+    return [(int(lo), int(hi)) for lo, hi in zip(edges[:-1], edges[1:])]
+
+
+# per-process state for the pool workers (set by _init_worker)
+_WORKER_SHM: Optional[shared_memory.SharedMemory] = None
+_WORKER_GALAXIES: Optional[list] = None
+_WORKER_MODEL: Optional[SharedModel] = None
+_WORKER_SIGMA_MODEL: float = 8.0
+
+
+def _init_worker(model: str, shm_name: str, layout: list, tags: Optional[List[str]], sigma_model: float) -> None:
+    global _WORKER_SHM, _WORKER_GALAXIES, _WORKER_MODEL, _WORKER_SIGMA_MODEL
+    # the resource tracker is shared with the parent, which unlinks the block in close()
+    _WORKER_SHM = shared_memory.SharedMemory(name=shm_name)
+    _WORKER_MODEL = MODELS[model]
+    _WORKER_SIGMA_MODEL = sigma_model
+    records = unpack_arrays(_WORKER_SHM, layout)
+    if tags is not None:
+        from fdb2_fit import FitContext
+
+        records = [(tag, FitContext.from_galaxy(g, sigma_model)) for tag, g in zip(tags, records)]
+    _WORKER_GALAXIES = records
+
+
+def _chunk_task(lo: int, hi: int, sub: np.ndarray) -> np.ndarray:
+    return _WORKER_MODEL.batch(sub, _WORKER_GALAXIES[lo:hi], _WORKER_SIGMA_MODEL)
+
+
+class SharedEvaluator:
+    """
+    Parallel chunked evaluation of a batched multi-galaxy objective.
+
+        with SharedEvaluator(gals, "fdb_multi", n_workers=4) as ev:
+            chi2 = ev.fun_batch(X)          # X: (n, d) -> (n,)
+
+    gals is what the serial objective takes: fdb_fit_multi.Galaxy records, or
+    (tag, GalaxyData) pairs for fdb2_multi.  ev.fun_batch can be passed
+    wherever a chi2_batch callable is expected (fdb_mcmc.sample).
+    """
+
+    def __init__(self, gals: list, model: str = "fdb_multi", n_workers: int = 1, sigma_model: float = 8.0):
+        self.model = MODELS[model]
+        self.gals = list(gals)
+        self.n = len(self.gals)
+        self.sigma_model = sigma_model
+        self.n_workers = n_workers
+        self.chunks = balanced_chunks([len(r.R_kpc if hasattr(r, "R_kpc") else r.R) for r in _records(self.gals)], n_workers)
+        self._sub_index = [self.model.sub_index(self.n, lo, hi) for lo, hi in self.chunks]
+        self._local = self.gals
+        if model == "fdb2_multi":
+            from fdb2_fit_multi import fit_contexts
+
+            self._local = fit_contexts(self.gals, sigma_model)
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._pool: Optional[cf.ProcessPoolExecutor] = None
+        self.n_calls = 0
+        self.n_rows = 0
+
+    def __enter__(self) -> "SharedEvaluator":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def start(self) -> None:
+        if self.n_workers <= 1 or len(self.chunks) <= 1 or self._pool is not None:
+            return
+        self._shm, layout = pack_arrays(_records(self.gals))
+        tags = [tag for tag, _ in self.gals] if self.model.name == "fdb2_multi" else None
+        self._pool = cf.ProcessPoolExecutor(
+            max_workers=len(self.chunks),
+            initializer=_init_worker,
+            initargs=(self.model.name, self._shm.name, layout, tags, self.sigma_model),
+        )
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def fun_batch(self, X: np.ndarray) -> np.ndarray:
+        """chi^2 of every row of X (n, d); 1e30 where any chunk rejects the row."""
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        self.n_calls += 1
+        self.n_rows += X.shape[0]
+        if self._pool is None:
+            return np.asarray(self.model.batch(X, self._local, self.sigma_model), dtype=float)
+        futures = [
+            self._pool.submit(_chunk_task, lo, hi, X[:, idx])
+            for (lo, hi), idx in zip(self.chunks, self._sub_index)
+        ]
+        parts = np.array([f.result() for f in futures], dtype=float)
+        return np.where(np.all(parts < 1e29, axis=0), parts.sum(axis=0), 1e30)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Time the shared-memory evaluator against the serial objective.")
+    ap.add_argument("--model", choices=sorted(MODELS), default="fdb_multi")
+    ap.add_argument("--galaxies", nargs="+", default=None)
+    ap.add_argument("--all", action="store_true", help="use every build/*_sparc.csv")
+    ap.add_argument("--build-dir", default="build")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--n-eval", type=int, default=2048, help="parameter vectors per timing")
+    ap.add_argument("--batch", type=int, default=32, help="vectors per call (e.g. n_walkers / 2)")
+    args = ap.parse_args()
+
+    import fdb_fit_multi
+
+    names = fdb_fit_multi.available_galaxies(args.build_dir) if args.all else args.galaxies
+    if args.model == "fdb_multi":
+        gals = fdb_fit_multi.load_galaxies(names or fdb_fit_multi.DEFAULT_GALAXIES, build_dir=args.build_dir)
+        x0, bounds = fdb_fit_multi.initial_guess(len(gals))
+    else:
+        import fdb2_fit_multi
+
+        gals = fdb2_fit_multi.load_galaxies(names, build_dir=args.build_dir)
+        x0, bounds = fdb2_fit_multi.initial_guess(gals)
+
+    rng = np.random.default_rng(0)
+    lo, hi = np.array(bounds).T
+    n_batches = max(args.n_eval // args.batch, 1)
+    batches = lo + (hi - lo) * rng.random((n_batches, args.batch, len(x0)))
+    batches[0, 0] = x0
+
+    results = {}
+    for n_workers in (1, args.workers):
+        with SharedEvaluator(gals, args.model, n_workers=n_workers) as ev:
+            ev.fun_batch(batches[0])  # warm up the pool
+            t0 = time.perf_counter()
+            out = np.array([ev.fun_batch(X) for X in batches])
+            dt = time.perf_counter() - t0
+        results[n_workers] = out
+        print(f"  workers={n_workers:2d} chunks={len(ev.chunks):2d}: {1e3 * dt / batches[:, :, 0].size:8.4f} ms / vector "
+              f"({1e3 * dt / n_batches:.3f} ms / batch of {args.batch})")
+    f1, fn = results[1], results[args.workers]
+    ok = (f1 < 1e29) & (fn < 1e29)
+    print(f"# {len(gals)} galaxies; max rel. |Δchi2| = {np.max(np.abs(f1 - fn)[ok] / np.maximum(f1[ok], 1.0)):.3g}, "
+          f"rejected rows agree: {bool(np.all((f1 >= 1e29) == (fn >= 1e29)))}")
+
+
+if __name__ == "__main__":
+    main()
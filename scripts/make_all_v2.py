@@ -6,17 +6,22 @@ Build SVG mosaics from all `out/*_v2_summary.svg` plots.
 - `all-best.svg`  : 外縁 χ² が小さい上位 16 銀河 (4x4)
 - `all-worst.svg` : 外縁 χ² が大きい下位 16 銀河 (4x4)
 
-best/worst の順位は `/tmp/fdb2_<tag>.log` に出力された
-`chi2_v2 (outer, ...)` を用いて決める。
+best/worst の順位は fdb2_batch.py の台帳 `out/fdb2_ledger.jsonl` の
+chi2_outer を用いて決める。台帳が無い場合は `/tmp/fdb2_<tag>.log` に出力された
+`chi2_v2 (outer, ...)` を用いる。
+
+モザイクは 1 タイルずつストリーム書き出しする (全タイルの DOM を保持しない)。
+  --mode inline (既定) : 各タイルを入れ子の <svg> としてコピー (id はタイル毎に接頭辞付け)
+  --mode ref           : <image href="<tag>_v2_summary.svg"> で参照のみ (出力は数 kB)
+  --raster             : 台帳の Vflat2 から直接描画した PNG モザイク (all.png など)
 """
 
+import argparse
 import glob
 import math
 import os
 import re
-import copy
 from typing import List, Tuple
-import xml.etree.ElementTree as ET
 
 
 def collect_tags(out_dir: str = "out") -> List[str]:
@@ -71,106 +76,234 @@ def load_outer_chi2_from_logs(tags: List[str]) -> List[Tuple[str, float]]:
     return res
 
 
+def load_outer_chi2_from_ledger(tags: List[str], ledger_path: str) -> List[Tuple[str, float]]:
+    """chi2_outer per tag from the fdb2_batch ledger (inf when missing or not fitted)."""
+    from fdb2_batch import read_ledger
+
+    ledger = read_ledger(ledger_path)
+    res: List[Tuple[str, float]] = []
+    for tag in tags:
+        rec = ledger.get(tag, {})
+        chi2 = rec.get("chi2_outer") if rec.get("status") == "ok" else None
+        res.append((tag, float(chi2) if chi2 is not None and math.isfinite(chi2) else float("inf")))
+    return res
+
+
+_SVG_ROOT_RE = re.compile(r"<svg\b[^>]*>", re.S)
+_METADATA_RE = re.compile(r"<metadata>.*?</metadata>", re.S)
+_ID_RE = re.compile(r'\bid="([^"]+)"')
+_URL_RE = re.compile(r"url\(#([^)]+)\)")
+_HREF_RE = re.compile(r'((?:xlink:)?href)="#([^"]+)"')
+
+
+def _root_attr(root_tag: str, name: str) -> str:
+    m = re.search(rf'\s{name}="([^"]*)"', root_tag)
+    return m.group(1) if m else ""
+
+
+def svg_tile(text: str, prefix: str, x: float, y: float, w: float, h: float) -> str:
+    """
+    One source SVG as a nested <svg> placed at (x, y) with size (w, h).
+    ids (and their url(#...) / href="#..." references) get `prefix` so that
+    matplotlib's clip-path and glyph ids do not collide between tiles.
+    """
+    m = _SVG_ROOT_RE.search(text)
+    if m is None:
+        raise ValueError("no <svg> root element")
+    root = m.group(0)
+    body = text[m.end() : text.rindex("</svg>")]
+    body = _METADATA_RE.sub("", body)
+    body = _ID_RE.sub(lambda k: f'id="{prefix}{k.group(1)}"', body)
+    body = _URL_RE.sub(lambda k: f"url(#{prefix}{k.group(1)})", body)
+    body = _HREF_RE.sub(lambda k: f'{k.group(1)}="#{prefix}{k.group(2)}"', body)
+    view_box = _root_attr(root, "viewBox")
+    if not view_box:
+        view_box = f"0 0 {parse_size(_root_attr(root, 'width'), w)} {parse_size(_root_attr(root, 'height'), h)}"
+    return (
+        f'<svg x="{x}" y="{y}" width="{w}" height="{h}" viewBox="{view_box}" preserveAspectRatio="none">'
+        f"{body}</svg>\n"
+    )
+
+
 def build_mosaic_for_tags(
     tags: List[str],
     out_path: str,
     out_dir: str = "out",
     ncols: int = 5,
     tile_px: float = 300.0,
+    mode: str = "inline",
 ) -> None:
+    """
+    Stream a grid of out/<tag>_v2_summary.svg tiles into out_path.
+
+    mode="inline" copies each tile into the output as a nested <svg> (self
+    contained; only one source file is held in memory at a time), mode="ref"
+    writes <image> references to the tile files (tiny output, but the tiles
+    must stay next to the mosaic).
+    """
     if not tags:
         print(f"No tags to build mosaic for {out_path}")
         return
 
-    ET.register_namespace("", "http://www.w3.org/2000/svg")
-
     n = len(tags)
     nrows = math.ceil(n / ncols)
     width = ncols * tile_px
     height = nrows * tile_px
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    n_tiles = 0
+    with open(out_path, "w", encoding="utf-8") as out:
+        out.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        out.write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            f'width="{width}" height="{height}" viewBox="0 0 {width} {height}">\n'
+        )
+        for idx, tag in enumerate(tags):
+            x = (idx % ncols) * tile_px
+            y = (idx // ncols) * tile_px
+            svg_path = os.path.join(out_dir, f"{tag}_v2_summary.svg")
+            if mode == "ref":
+                if not os.path.exists(svg_path):
+                    print(f"skip {svg_path}: missing")
+                    continue
+                href = os.path.relpath(svg_path, os.path.dirname(out_path) or ".")
+                out.write(
+                    f'<image x="{x}" y="{y}" width="{tile_px}" height="{tile_px}" preserveAspectRatio="none" '
+                    f'href="{href}" xlink:href="{href}"/>\n'
+                )
+            else:
+                try:
+                    with open(svg_path, "r", encoding="utf-8") as f:
+                        out.write(svg_tile(f.read(), f"t{idx}_", x, y, tile_px, tile_px))
+                except (OSError, ValueError) as e:
+                    print(f"skip {svg_path}: {e}")
+                    continue
+            n_tiles += 1
+        out.write("</svg>\n")
+    print(f"Saved SVG mosaic ({n_tiles} panels) to {out_path}")
 
-    root = ET.Element(
-        "{http://www.w3.org/2000/svg}svg",
-        attrib={
-            "width": f"{width}",
-            "height": f"{height}",
-            "viewBox": f"0 0 {width} {height}",
-        },
-    )
 
-    for idx, tag in enumerate(tags):
-        row = idx // ncols
-        col = idx % ncols
-        x = col * tile_px
-        y = row * tile_px
-
-        svg_path = os.path.join(out_dir, f"{tag}_v2_summary.svg")
-        try:
-            tree = ET.parse(svg_path)
-        except Exception as e:
-            print(f"skip {svg_path}: parse error {e}")
-            continue
-        src_root = tree.getroot()
-        w_src = parse_size(src_root.get("width"), tile_px)
-        h_src = parse_size(src_root.get("height"), tile_px)
-        sx = tile_px / w_src if w_src > 0 else 1.0
-        sy = tile_px / h_src if h_src > 0 else 1.0
-
-        g = ET.SubElement(
-            root,
-            "{http://www.w3.org/2000/svg}g",
-            attrib={"transform": f"translate({x},{y}) scale({sx},{sy})"},
-        )
-        for child in list(src_root):
-            g.append(copy.deepcopy(child))
+def build_raster_mosaic(
+    tags: List[str],
+    out_path: str,
+    ledger_path: str,
+    build_dir: str = "build",
+    ncols: int = 5,
+    tile_px: int = 300,
+    dpi: int = 100,
+) -> None:
+    """
+    PNG mosaic rendered straight from the fit results: each tile re-plots
+    Vobs, the Newtonian curve and the v2 model from the ledger's Vflat2 on one
+    reused Agg canvas and is pasted into the output pixel array.
+    """
+    import contextlib
+    import io
 
-    os.makedirs(out_dir, exist_ok=True)
-    ET.ElementTree(root).write(out_path, encoding="utf-8", xml_declaration=True)
-    print(f"Saved SVG mosaic ({len(tags)} panels) to {out_path}")
+    import matplotlib
 
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
 
-def main() -> None:
-    out_dir = "out"
-    tags = collect_tags(out_dir)
+    from fdb2_batch import read_ledger
+    from fdb2_fit import prepare_galaxy_v2, v2_model_curve
+
+    ledger = read_ledger(ledger_path)
+    tags = [t for t in tags if ledger.get(t, {}).get("status") == "ok"]
     if not tags:
-        print("No *_v2_summary.svg files found under", out_dir)
+        print(f"No fitted galaxies in {ledger_path}; skipping {out_path}")
         return
+    nrows = math.ceil(len(tags) / ncols)
+    canvas_px = np.full((nrows * tile_px, ncols * tile_px, 4), 255, dtype=np.uint8)
 
-    # all.svg: 全銀河 (5列)
-    build_mosaic_for_tags(
-        tags,
-        os.path.join(out_dir, "all.svg"),
-        out_dir=out_dir,
-        ncols=5,
-        tile_px=300.0,
+    fig = plt.figure(figsize=(tile_px / dpi, tile_px / dpi), dpi=dpi)
+    agg = FigureCanvasAgg(fig)
+    ax = fig.add_axes([0.16, 0.14, 0.8, 0.76])
+    for idx, tag in enumerate(tags):
+        rec = ledger[tag]
+        csv_path = rec.get("csv") or os.path.join(build_dir, f"{tag}_sparc.csv")
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, g = prepare_galaxy_v2(csv_path)
+        Vn, V_tot, R_star_edge = v2_model_curve(g, rec["Vflat2"])
+        ax.clear()
+        ax.errorbar(g.R_kpc, g.Vobs, yerr=g.eVobs, fmt="o", ms=2, lw=0.8)
+        ax.plot(g.R_kpc, Vn, lw=1.0)
+        ax.plot(g.R_kpc, V_tot, lw=1.2)
+        # limits from this tile's curves only: the reused axes must not carry
+        # the previous tile's y-range (axvspan would otherwise freeze it)
+        v_max = np.nanmax(np.concatenate([g.Vobs + g.eVobs, Vn, V_tot]))
+        ax.set_ylim(0.0, 1.08 * v_max if np.isfinite(v_max) and v_max > 0 else 1.0)
+        ax.axvspan(g.R_kpc.min(), R_star_edge, color="0.92", alpha=0.6, zorder=0)
+        ax.set_title(f"{tag}  χ²_out={rec['chi2_outer']:.2f}", fontsize=8)
+        ax.tick_params(labelsize=6)
+        agg.draw()
+        tile = np.asarray(agg.buffer_rgba())
+        y = (idx // ncols) * tile_px
+        x = (idx % ncols) * tile_px
+        canvas_px[y : y + tile.shape[0], x : x + tile.shape[1]] = tile[:tile_px, :tile_px]
+    plt.close(fig)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    plt.imsave(out_path, canvas_px)
+    print(f"Saved raster mosaic ({len(tags)} panels) to {out_path}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Build SVG mosaics of the v2 summary plots.")
+    ap.add_argument("--ledger", default=os.path.join("out", "fdb2_ledger.jsonl"), help="fdb2_batch.py ledger")
+    ap.add_argument(
+        "--mode",
+        choices=("inline", "ref"),
+        default="inline",
+        help="inline: copy tiles into the mosaic; ref: <image> links to out/<tag>_v2_summary.svg",
+    )
+    ap.add_argument(
+        "--raster",
+        action="store_true",
+        help="render all/all-best/all-worst as PNG directly from the ledger (no per-galaxy SVGs needed)",
     )
+    ap.add_argument("--build-dir", default="build", help="galaxy CSVs for --raster")
+    args = ap.parse_args()
+    out_dir = "out"
+    ext = "png" if args.raster else "svg"
+
+    if args.raster:
+        from fdb2_batch import read_ledger
+
+        tags = sorted(t for t, rec in read_ledger(args.ledger).items() if rec.get("status") == "ok")
+        if not tags:
+            print("No fitted galaxies in", args.ledger)
+            return
+    else:
+        tags = collect_tags(out_dir)
+        if not tags:
+            print("No *_v2_summary.svg files found under", out_dir)
+            return
 
-    # best / worst: ログの outer chi2 から上位/下位を抽出
-    chi2_list = load_outer_chi2_from_logs(tags)
+    def build(sel: List[str], name: str, ncols: int) -> None:
+        out_path = os.path.join(out_dir, f"{name}.{ext}")
+        if args.raster:
+            build_raster_mosaic(sel, out_path, args.ledger, build_dir=args.build_dir, ncols=ncols)
+        else:
+            build_mosaic_for_tags(sel, out_path, out_dir=out_dir, ncols=ncols, tile_px=300.0, mode=args.mode)
+
+    # all.svg: 全銀河 (5列)
+    build(tags, "all", 5)
+
+    # best / worst: 台帳 (無ければログ) の outer chi2 から上位/下位を抽出
+    if os.path.exists(args.ledger):
+        chi2_list = load_outer_chi2_from_ledger(tags, args.ledger)
+    else:
+        chi2_list = load_outer_chi2_from_logs(tags)
     chi2_valid = [(t, c) for (t, c) in chi2_list if c < float("inf")]
     if not chi2_valid:
-        print("No valid chi2_v2 (outer) in logs; skipping best/worst mosaics.")
+        print("No valid chi2_v2 (outer) in ledger/logs; skipping best/worst mosaics.")
         return
 
     chi2_sorted = sorted(chi2_valid, key=lambda x: x[1])
     k = min(16, len(chi2_sorted))
-    best_tags = [t for (t, _) in chi2_sorted[:k]]
-    worst_tags = [t for (t, _) in chi2_sorted[-k:]]
-
-    build_mosaic_for_tags(
-        best_tags,
-        os.path.join(out_dir, "all-best.svg"),
-        out_dir=out_dir,
-        ncols=4,
-        tile_px=300.0,
-    )
-    build_mosaic_for_tags(
-        worst_tags,
-        os.path.join(out_dir, "all-worst.svg"),
-        out_dir=out_dir,
-        ncols=4,
-        tile_px=300.0,
-    )
+    build([t for (t, _) in chi2_sorted[:k]], "all-best", 4)
+    build([t for (t, _) in chi2_sorted[-k:]], "all-worst", 4)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Mergeable weighted quantile sketch (merging t-digest).
+
+A sketch holds (mean, weight, count) centroids plus an insertion buffer.
+While the number of centroids stays below `exact_limit` nothing is merged
+and every centroid is a single sample: quantile() then equals the weighted
+median rule of estimate_mgamma_closedform.weighted_median (first sorted value
+whose cumulative weight reaches q * total), or np.median / np.quantile-like
+midpoints with midpoint=True.  Beyond that, centroids are merged along the
+k1 scale k(q) = delta / (2 pi) * asin(2q - 1), which keeps the tails fine
+and bounds the size to about delta / 2 centroids; quantiles are then
+interpolated between centroid centres.
+
+Sketches built on separate shards (processes, machines) merge by
+concatenating their centroids, so merging is lossless as long as the
+combined sketch stays below exact_limit, and otherwise carries the usual
+t-digest error.  save()/load() use .npz files.
+
+For sketches of galaxy medians written by estimate_mgamma_closedform.py
+--sketch_out, --interval prints (and --out_json writes) that script's
+lambda_C interval, median +- 1.4826 MAD floored at 1e-6 kpc, with m_gamma.
+
+Usage:
+  python scripts/quantile_sketch.py out/shard_*.npz --out out/merged.npz
+  python scripts/quantile_sketch.py out/merged.npz --q 0.16 0.5 0.84
+  python scripts/quantile_sketch.py out/shard_*.npz --interval --out_json out/merged.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from typing import Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class QuantileSketch:
+    def __init__(self, delta: float = 500.0, exact_limit: int = 4096, buffer_size: int = 8192):
+        self.delta = float(delta)
+        self.exact_limit = int(exact_limit)
+        self.buffer_size = int(buffer_size)
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.vmin, self.vmax = np.inf, -np.inf
+        self._buf_x: list = []
+        self._buf_w: list = []
+        self._n_buf = 0
+
+    @classmethod
+    def from_samples(cls, values: np.ndarray, weights: Optional[np.ndarray] = None, **kw) -> "QuantileSketch":
+        sk = cls(**kw)
+        sk.add(values, weights)
+        return sk
+
+    # ------------------------------------------------------------------ input
+    def add(self, values, weights=None) -> "QuantileSketch":
+        """Add samples (scalar or array); non-finite values and weights <= 0 are dropped."""
+        x = np.atleast_1d(np.asarray(values, dtype=float)).ravel()
+        w = np.ones_like(x) if weights is None else np.broadcast_to(np.asarray(weights, dtype=float), x.shape).ravel()
+        ok = np.isfinite(x) & np.isfinite(w) & (w > 0)
+        if not ok.all():
+            x, w = x[ok], w[ok]
+        if x.size == 0:
+            return self
+        self._buf_x.append(x)
+        self._buf_w.append(w)
+        self._n_buf += x.size
+        if self._n_buf >= self.buffer_size:
+            self._flush()
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Fold `other` into this sketch (other is left unchanged)."""
+        other._flush()
+        self._flush()
+        self._absorb(other.means, other.weights, other.counts)
+        self.vmin, self.vmax = min(self.vmin, other.vmin), max(self.vmax, other.vmax)
+        return self
+
+    def _flush(self) -> None:
+        if not self._n_buf:
+            return
+        x, w = np.concatenate(self._buf_x), np.concatenate(self._buf_w)
+        self._buf_x, self._buf_w, self._n_buf = [], [], 0
+        self.vmin, self.vmax = min(self.vmin, float(x.min())), max(self.vmax, float(x.max()))
+        self._absorb(x, w, np.ones(x.size, dtype=np.int64))
+
+    def _absorb(self, means: np.ndarray, weights: np.ndarray, counts: np.ndarray) -> None:
+        m = np.concatenate([self.means, means])
+        w = np.concatenate([self.weights, weights])
+        c = np.concatenate([self.counts, counts])
+        order = np.argsort(m, kind="stable")
+        m, w, c = m[order], w[order], c[order]
+        if m.size > self.exact_limit:
+            m, w, c = self._compress(m, w, c)
+        self.means, self.weights, self.counts = m, w, c
+
+    def _compress(self, m: np.ndarray, w: np.ndarray, c: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # centroids whose centres fall into the same unit interval of k(q) are merged
+        total = w.sum()
+        q_mid = (np.cumsum(w) - 0.5 * w) / total
+        k = self.delta / (2.0 * np.pi) * np.arcsin(np.clip(2.0 * q_mid - 1.0, -1.0, 1.0))
+        group = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        w_new = np.add.reduceat(w, starts)
+        m_new = np.add.reduceat(m * w, starts) / w_new
+        return m_new, w_new, np.add.reduceat(c, starts)
+
+    # ----------------------------------------------------------------- output
+    @property
+    def total_weight(self) -> float:
+        self._flush()
+        return float(self.weights.sum())
+
+    @property
+    def n(self) -> int:
+        self._flush()
+        return int(self.counts.sum())
+
+    @property
+    def exact(self) -> bool:
+        """True while every centroid is a single sample."""
+        self._flush()
+        return bool(np.all(self.counts <= 1))
+
+    def quantile(self, q: float, midpoint: bool = False) -> float:
+        """
+        Weighted q-quantile.  Exact sketches use the step rule (midpoint=True
+        averages the neighbours when the cumulative weight hits q * total
+        exactly, as np.median does for unit weights); compressed ones
+        interpolate between centroid centres, clamped to the sample range.
+        """
+        self._flush()
+        if self.means.size == 0:
+            raise ValueError("empty sketch")
+        m, w = self.means, self.weights
+        cum = np.cumsum(w)
+        target = q * cum[-1]
+        if self.exact:
+            idx = min(int(np.searchsorted(cum, target)), m.size - 1)
+            if midpoint and idx + 1 < m.size and np.isclose(cum[idx], target, rtol=1e-12, atol=0.0):
+                return float(0.5 * (m[idx] + m[idx + 1]))
+            return float(m[idx])
+        centres = cum - 0.5 * w
+        x = np.r_[self.vmin, m, self.vmax]
+        c = np.r_[0.0, centres, cum[-1]]
+        return float(np.interp(target, c, x))
+
+    def quantiles(self, qs: Iterable[float], midpoint: bool = False) -> np.ndarray:
+        return np.array([self.quantile(q, midpoint=midpoint) for q in qs])
+
+    def median(self) -> float:
+        return self.quantile(0.5, midpoint=True)
+
+    def mad(self, center: Optional[float] = None) -> float:
+        """Median absolute deviation about `center` (default: median()), from the centroids."""
+        self._flush()
+        if self.means.size == 0:
+            raise ValueError("empty sketch")
+        center = self.median() if center is None else center
+        dev = QuantileSketch(self.delta, self.exact_limit, self.buffer_size)
+        dev._absorb(np.abs(self.means - center), self.weights, self.counts)
+        dev.vmin, dev.vmax = float(dev.means[0]), float(dev.means[-1])
+        return dev.median()
+
+    # ---------------------------------------------------------------- storage
+    def save(self, path: str) -> None:
+        self._flush()
+        np.savez(
+            path, means=self.means, weights=self.weights, counts=self.counts,
+            vrange=np.array([self.vmin, self.vmax]),
+            params=np.array([self.delta, self.exact_limit, self.buffer_size]),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "QuantileSketch":
+        with np.load(path) as z:
+            delta, exact_limit, buffer_size = z["params"]
+            sk = cls(delta, int(exact_limit), int(buffer_size))
+            sk.means, sk.weights, sk.counts = z["means"], z["weights"], z["counts"]
+            sk.vmin, sk.vmax = (float(v) for v in z["vrange"])
+        return sk
+
+
+def merge_sketches(sketches: Sequence[QuantileSketch]) -> QuantileSketch:
+    if not sketches:
+        raise ValueError("nothing to merge")
+    first = sketches[0]
+    out = QuantileSketch(first.delta, first.exact_limit, first.buffer_size)
+    for sk in sketches:
+        out.merge(sk)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Merge weighted quantile sketches (.npz) and print quantiles.")
+    ap.add_argument("sketches", nargs="+", help=".npz files written by QuantileSketch.save")
+    ap.add_argument("--q", type=float, nargs="+", default=[0.16, 0.5, 0.84])
+    ap.add_argument("--out", default=None, help="write the merged sketch here")
+    ap.add_argument("--interval", action="store_true",
+                    help="closed-form lambda_C interval and m_gamma (estimate_mgamma_closedform.py shards)")
+    ap.add_argument("--out_json", default=None, help="with --interval: write its fields as JSON")
+    args = ap.parse_args()
+
+    sk = merge_sketches([QuantileSketch.load(p) for p in args.sketches])
+    print(f"# {len(args.sketches)} sketches, n = {sk.n}, total weight = {sk.total_weight:.6g}, "
+          f"{sk.means.size} centroids ({'exact' if sk.exact else 'compressed'})")
+    if sk.n == 0:
+        print("  empty: no quantiles")
+        return
+    for q, v in zip(args.q, sk.quantiles(args.q, midpoint=True)):
+        print(f"  q = {q:5.3f}: {v:.6g}")
+    print(f"  MAD = {sk.mad():.6g}")
+    if args.interval:
+        # imported here: estimate_mgamma_closedform itself imports this module
+        from estimate_mgamma_closedform import interval_summary
+
+        summary = interval_summary(sk)
+        print(f"  lambda_C = {summary['lambdaC_kpc_median']:.6g} kpc "
+              f"[{summary['lambdaC_kpc_lo']:.6g}, {summary['lambdaC_kpc_hi']:.6g}]")
+        print(f"  m_gamma  = {summary['m_gamma_kg_median']:.4g} kg "
+              f"[{summary['m_gamma_kg_lo']:.4g}, {summary['m_gamma_kg_hi']:.4g}], "
+              f"{summary['m_gamma_eV_median']:.4g} eV")
+        if args.out_json:
+            with open(args.out_json, "w") as f:
+                json.dump({"n_sketches": len(args.sketches), "N_galaxies": sk.n, **summary}, f, indent=2)
+            print(f"Saved {args.out_json}")
+    if args.out:
+        sk.save(args.out)
+        print(f"Saved merged sketch to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
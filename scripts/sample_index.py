@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Sample-wide statistics index for the fdb2 runs.
+
+The fitters need a few aggregates over the whole sample (the global Sigma_gas
+maximum for plot normalization, the SPARC HSB list) plus cheap per-galaxy
+numbers (Rd, bulge edge, Vmax; fdb2_fit.attach_index_scales hands these to
+GalaxyData.scales for FitContext and fit_galaxy_v2).  Recomputing them from every
+build/*_sparc.csv in every per-galaxy process is O(N^2) in file reads, so
+they live in one structured .npy file, build/sample_index.npy:
+
+  kind="galaxy"  one row per <tag>_sparc.csv: file mtime/size signature,
+                 n_points, Sigma_gas/Sigma_star maxima, Vmax, Rd, bulge
+                 edge, HSB flag
+  kind="hsb"     one row per tag listed in data/sparc/sets/hsb.txt
+  kind="source"  signature row of hsb.txt itself (mtime -1 if missing)
+
+update_index() stats the inputs and re-reads only CSVs whose (mtime, size)
+changed, drops rows for deleted files, and rebuilds the HSB rows when hsb.txt
+changed.  The new index is written to a temporary file and os.replace'd, so
+concurrent fitters never see a partial index.  load_index() memory-maps it
+once per process (module-level cache); if the build directory is not
+writable the index is kept in memory only.
+
+Usage:
+  python scripts/sample_index.py            # update build/sample_index.npy and print it
+  python scripts/sample_index.py --rebuild
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import tempfile
+from typing import Dict, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+INDEX_NAME = "sample_index.npy"
+
+INDEX_DTYPE = np.dtype(
+    [
+        ("kind", "U8"),
+        ("tag", "U32"),
+        ("mtime_ns", "i8"),
+        ("size", "i8"),
+        ("n_points", "i4"),
+        ("sigma_gas_max", "f8"),
+        ("sigma_star_max", "f8"),
+        ("vmax", "f8"),
+        ("Rd", "f8"),
+        ("R_bulge_edge", "f8"),
+        ("hsb", "?"),
+    ]
+)
+
+# (build_dir, sparc_dir) -> index array (memory-mapped when on disk)
+_INDEX_CACHE: Dict[Tuple[str, str], np.ndarray] = {}
+
+
+def _signature(path: str) -> Tuple[int, int]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return -1, -1
+    return int(st.st_mtime_ns), int(st.st_size)
+
+
+def _read_hsb_list(sparc_dir: str) -> Set[str]:
+    tags: Set[str] = set()
+    try:
+        with open(os.path.join(sparc_dir, "sets", "hsb.txt"), "r", encoding="utf-8") as f:
+            for line in f:
+                name = line.strip()
+                if name:
+                    # SPARC names may include spaces; our tags drop spaces.
+                    tags.add(name.replace(" ", "").upper())
+    except FileNotFoundError:
+        pass
+    return tags
+
+
+def _galaxy_row(path: str, tag: str, hsb: Set[str]) -> np.ndarray:
+    from fdb2_fit import estimate_Rd_and_bulge_edge, load_sparc_csv
+
+    row = np.zeros(1, dtype=INDEX_DTYPE)[0]
+    row["kind"] = "galaxy"
+    row["tag"] = tag
+    row["mtime_ns"], row["size"] = _signature(path)
+    row["hsb"] = tag.upper() in hsb
+    for name in ("sigma_gas_max", "sigma_star_max", "vmax", "Rd", "R_bulge_edge"):
+        row[name] = np.nan
+    try:
+        df = pd.read_csv(path)
+    except Exception:
+        return row
+    row["n_points"] = len(df)
+    with np.errstate(all="ignore"):
+        if "Sigma_gas" in df.columns and len(df):
+            row["sigma_gas_max"] = np.nanmax(df["Sigma_gas"].to_numpy())
+        if "Sigma_star" in df.columns and len(df):
+            row["sigma_star_max"] = np.nanmax(df["Sigma_star"].to_numpy())
+        if "Vobs" in df.columns and len(df):
+            row["vmax"] = np.nanmax(df["Vobs"].to_numpy())
+    try:
+        g = load_sparc_csv(path)
+        row["Rd"], row["R_bulge_edge"] = estimate_Rd_and_bulge_edge(g.R_kpc, g.Sigma_star, g.Vbul, g.Vdisk)
+    except Exception:
+        pass
+    return row
+
+
+def index_path(build_dir: str = "build") -> str:
+    return os.path.join(build_dir, INDEX_NAME)
+
+
+def _read_index(path: str) -> Optional[np.ndarray]:
+    try:
+        idx = np.load(path, mmap_mode="r")
+    except (FileNotFoundError, ValueError, OSError):
+        return None
+    return idx if idx.dtype == INDEX_DTYPE else None
+
+
+def update_index(build_dir: str = "build", sparc_dir: str = "data/sparc", rebuild: bool = False) -> np.ndarray:
+    """Bring build/sample_index.npy up to date with the inputs and return it."""
+    path = index_path(build_dir)
+    old = None if rebuild else _read_index(path)
+    hsb_sig = _signature(os.path.join(sparc_dir, "sets", "hsb.txt"))
+
+    old_src = old[old["kind"] == "source"] if old is not None else np.empty(0, dtype=INDEX_DTYPE)
+    hsb_changed = len(old_src) != 1 or (int(old_src[0]["mtime_ns"]), int(old_src[0]["size"])) != hsb_sig
+    if hsb_changed:
+        hsb = _read_hsb_list(sparc_dir)
+    else:
+        hsb = {str(t) for t in old["tag"][old["kind"] == "hsb"]}
+
+    old_gal = {}
+    if old is not None:
+        for row in old[old["kind"] == "galaxy"]:
+            old_gal[str(row["tag"])] = row
+
+    changed = hsb_changed
+    rows = []
+    files = sorted(glob.glob(os.path.join(build_dir, "*_sparc.csv")))
+    for f in files:
+        tag = os.path.basename(f)[: -len("_sparc.csv")]
+        prev = old_gal.get(tag)
+        if prev is not None and (int(prev["mtime_ns"]), int(prev["size"])) == _signature(f):
+            row = np.array(prev, dtype=INDEX_DTYPE)[()]
+            row["hsb"] = tag.upper() in hsb
+        else:
+            row = _galaxy_row(f, tag, hsb)
+            changed = True
+        rows.append(row)
+    if len(rows) != len(old_gal):
+        changed = True
+    if old is not None and not changed:
+        return old
+
+    src = np.zeros(1, dtype=INDEX_DTYPE)[0]
+    src["kind"] = "source"
+    src["tag"] = "hsb.txt"
+    src["mtime_ns"], src["size"] = hsb_sig
+    hsb_rows = np.zeros(len(hsb), dtype=INDEX_DTYPE)
+    hsb_rows["kind"] = "hsb"
+    hsb_rows["tag"] = sorted(hsb)
+    idx = np.concatenate([np.array([src]), np.array(rows, dtype=INDEX_DTYPE), hsb_rows])
+
+    try:
+        fd, tmp = tempfile.mkstemp(dir=build_dir, prefix=".sample_index.", suffix=".npy")
+        with os.fdopen(fd, "wb") as fh:
+            np.save(fh, idx)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except OSError:
+        # read-only or missing build dir: keep the index in memory
+        return idx
+    return np.load(path, mmap_mode="r")
+
+
+def load_index(build_dir: str = "build", sparc_dir: str = "data/sparc") -> np.ndarray:
+    """The (updated) index, memory-mapped once per process."""
+    key = (os.path.abspath(build_dir), os.path.abspath(sparc_dir))
+    idx = _INDEX_CACHE.get(key)
+    if idx is None:
+        idx = update_index(build_dir, sparc_dir)
+        _INDEX_CACHE[key] = idx
+    return idx
+
+
+def galaxy_rows(build_dir: str = "build", sparc_dir: str = "data/sparc") -> np.ndarray:
+    idx = load_index(build_dir, sparc_dir)
+    return idx[idx["kind"] == "galaxy"]
+
+
+def galaxy_stats(tag: str, build_dir: str = "build", sparc_dir: str = "data/sparc") -> Optional[np.void]:
+    """The index row of one galaxy, or None."""
+    rows = galaxy_rows(build_dir, sparc_dir)
+    hit = np.flatnonzero(rows["tag"] == tag)
+    return rows[hit[0]] if hit.size else None
+
+
+def csv_stats(csv_path: str, sparc_dir: str = "data/sparc") -> Optional[np.void]:
+    """
+    Index row of <build_dir>/<tag>_sparc.csv, or None when the file is not
+    indexed or changed since (mtime/size signature differs).
+    """
+    build_dir = os.path.dirname(csv_path) or "."
+    tag = os.path.basename(csv_path)[: -len("_sparc.csv")] if csv_path.endswith("_sparc.csv") else None
+    if tag is None:
+        return None
+    row = galaxy_stats(tag, build_dir, sparc_dir)
+    if row is None or (int(row["mtime_ns"]), int(row["size"])) != _signature(csv_path):
+        return None
+    return row
+
+
+def hsb_tags(build_dir: str = "build", sparc_dir: str = "data/sparc") -> Set[str]:
+    """Upper-case, space-free tags from sets/hsb.txt."""
+    idx = load_index(build_dir, sparc_dir)
+    return {str(t) for t in idx["tag"][idx["kind"] == "hsb"]}
+
+
+def sigma_gas_max(build_dir: str = "build", sparc_dir: str = "data/sparc") -> float:
+    """Max Sigma_gas over the sample (1.0 if nothing usable)."""
+    vals = galaxy_rows(build_dir, sparc_dir)["sigma_gas_max"]
+    vals = vals[np.isfinite(vals)]
+    max_val = float(np.max(vals)) if vals.size else 0.0
+    return max_val if max_val > 0.0 else 1.0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Update and print the fdb2 sample statistics index.")
+    ap.add_argument("--build-dir", default="build")
+    ap.add_argument("--sparc-dir", default="data/sparc")
+    ap.add_argument("--rebuild", action="store_true", help="recompute every row")
+    args = ap.parse_args()
+
+    idx = update_index(args.build_dir, args.sparc_dir, rebuild=args.rebuild)
+    rows = idx[idx["kind"] == "galaxy"]
+    print(f"{index_path(args.build_dir)}: {len(rows)} galaxies, {int(np.sum(idx['kind'] == 'hsb'))} HSB tags")
+    print(f"  {'tag':12s} {'n':>4s} {'Sgas_max':>9s} {'Vmax':>7s} {'Rd':>6s} {'R_bul':>6s}  hsb")
+    for r in rows:
+        print(f"  {r['tag']:12s} {r['n_points']:4d} {r['sigma_gas_max']:9.3g} {r['vmax']:7.1f} "
+              f"{r['Rd']:6.2f} {r['R_bulge_edge']:6.2f}  {'y' if r['hsb'] else ''}")
+    print(f"global Sigma_gas max = {sigma_gas_max(args.build_dir, args.sparc_dir):.4g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import argparse
 import numpy as np
 import pandas as pd
 from pathlib import Path
@@ -51,7 +52,12 @@ def load_all():
     return df
 
 
-def compute_ratio(df: pd.DataFrame, re_range=(0.7, 2.0)):
+def _log_ratio(df: pd.DataFrame, re_range=(0.7, 2.0)):
+    """Per-lens log10 R for one frame (or one chunk of a larger catalog).
+
+    Returns full-length arrays (logR is NaN where R is not finite/positive)
+    so that chunks can be filtered and grouped without losing alignment.
+    """
     Ds = COSMO.angular_diameter_distance(df.z_s).to(u.kpc).value
     Dls = COSMO.angular_diameter_distance_z1z2(df.z_l, df.z_s).to(u.kpc).value
     theta_p = df.theta_Ein * ARCSEC_TO_RAD * (Ds / Dls)
@@ -68,10 +74,10 @@ def compute_ratio(df: pd.DataFrame, re_range=(0.7, 2.0)):
         np.sqrt(2) * sigma_corr,
     )
     # 横軸を v_c に取るので分母は 2π v_c^2
-    R = theta_p * (C_KMS**2) / (2 * np.pi * v_c**2)
+    R = np.asarray(theta_p * (C_KMS**2) / (2 * np.pi * v_c**2), dtype=float)
+    logR = np.full(R.shape, np.nan)
     mask = np.isfinite(R) & (R > 0)
-    R = R[mask]
-    logR = np.log10(R)
+    logR[mask] = np.log10(R[mask])
     logR_low = np.full_like(logR, np.nan)
     logR_high = np.full_like(logR, np.nan)
     if missing.any():
@@ -81,16 +87,184 @@ def compute_ratio(df: pd.DataFrame, re_range=(0.7, 2.0)):
         Re_high[missing] = re_range[1]
         sigma_low = df.veldisp * (r_ap / Re_low) ** (ALPHA_AP)
         sigma_high = df.veldisp * (r_ap / Re_high) ** (ALPHA_AP)
-        R_low = theta_p * (C_KMS**2) / (2 * np.pi * (np.sqrt(2) * sigma_low) ** 2)
-        R_high = theta_p * (C_KMS**2) / (2 * np.pi * (np.sqrt(2) * sigma_high) ** 2)
+        R_low = np.asarray(theta_p * (C_KMS**2) / (2 * np.pi * (np.sqrt(2) * sigma_low) ** 2), dtype=float)
+        R_high = np.asarray(theta_p * (C_KMS**2) / (2 * np.pi * (np.sqrt(2) * sigma_high) ** 2), dtype=float)
         mask = np.isfinite(R_low) & (R_low > 0)
         logR_low[mask] = np.log10(R_low[mask])
         mask = np.isfinite(R_high) & (R_high > 0)
         logR_high[mask] = np.log10(R_high[mask])
+    return logR, logR_low, logR_high, missing
+
+
+def compute_ratio(df, re_range=(0.7, 2.0), reservoir_size=0, seed=0):
+    """Median/scatter of log10 R.
+
+    `df` is either a single DataFrame or an iterable of DataFrame chunks
+    (e.g. ``pd.read_csv(path, chunksize=...)``).  In the chunked case only a
+    streaming sketch is kept, so the returned per-lens arrays are a uniform
+    reservoir sample of at most `reservoir_size` lenses (empty by default).
+    """
+    if not isinstance(df, pd.DataFrame):
+        return stream_ratio(df, re_range, reservoir_size=reservoir_size, seed=seed)["all"].result()
+    logR, logR_low, logR_high, missing = _log_ratio(df, re_range)
+    logR = logR[np.isfinite(logR)]
     med = np.median(logR)
     mad = np.median(np.abs(logR - med))
     s = 1.4826 * mad
-    return med, s, R.size, logR, logR_low, logR_high, missing
+    return med, s, logR.size, logR, logR_low, logR_high, missing
+
+
+class LogRSketch:
+    """Fixed-resolution streaming quantile sketch for log10 R.
+
+    Values are binned on a uniform grid of width `resolution` dex, so memory
+    does not depend on the number of lenses and two sketches merge exactly by
+    adding counts.  Median and MAD are accurate to ~`resolution`; values
+    outside [lo, hi] are clipped into the edge bins and counted in `n_clipped`.
+    """
+
+    def __init__(self, lo: float = -4.0, hi: float = 4.0, resolution: float = 1e-4):
+        self.lo = float(lo)
+        self.resolution = float(resolution)
+        n_bins = int(np.ceil((hi - lo) / resolution))
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.n = 0
+        self.n_clipped = 0
+
+    @property
+    def centers(self) -> np.ndarray:
+        return self.lo + (np.arange(self.counts.size) + 0.5) * self.resolution
+
+    def update(self, values: np.ndarray) -> None:
+        v = np.asarray(values, dtype=float)
+        v = v[np.isfinite(v)]
+        if v.size == 0:
+            return
+        idx = np.floor((v - self.lo) / self.resolution).astype(np.int64)
+        clipped = (idx < 0) | (idx >= self.counts.size)
+        self.n_clipped += int(clipped.sum())
+        np.clip(idx, 0, self.counts.size - 1, out=idx)
+        self.counts += np.bincount(idx, minlength=self.counts.size)
+        self.n += int(v.size)
+
+    def merge(self, other: "LogRSketch") -> None:
+        if other.counts.size != self.counts.size or other.lo != self.lo or other.resolution != self.resolution:
+            raise ValueError("cannot merge sketches with different binning")
+        self.counts += other.counts
+        self.n += other.n
+        self.n_clipped += other.n_clipped
+
+    @staticmethod
+    def _median_of(values: np.ndarray, counts: np.ndarray, n: int) -> float:
+        # same convention as np.median: mean of the two middle order statistics
+        cum = np.cumsum(counts)
+        lo = values[np.searchsorted(cum, (n - 1) // 2, side="right")]
+        hi = values[np.searchsorted(cum, n // 2, side="right")]
+        return float(0.5 * (lo + hi))
+
+    def median(self) -> float:
+        if self.n == 0:
+            return float("nan")
+        return self._median_of(self.centers, self.counts, self.n)
+
+    def mad(self, med: float | None = None) -> float:
+        if self.n == 0:
+            return float("nan")
+        if med is None:
+            med = self.median()
+        nz = self.counts > 0
+        dev = np.abs(self.centers[nz] - med)
+        order = np.argsort(dev, kind="stable")
+        return self._median_of(dev[order], self.counts[nz][order], self.n)
+
+
+class Reservoir:
+    """Uniform reservoir sample (Algorithm R) of fixed-width float rows."""
+
+    def __init__(self, size: int, n_fields: int, rng: np.random.Generator):
+        self.size = int(size)
+        self.rows = np.full((self.size, n_fields), np.nan)
+        self.seen = 0
+        self.rng = rng
+
+    def update(self, rows: np.ndarray) -> None:
+        m = rows.shape[0]
+        if self.size == 0 or m == 0:
+            self.seen += m
+            return
+        t = self.seen + np.arange(m)
+        n_fill = max(0, min(self.size - self.seen, m))
+        if n_fill:
+            self.rows[self.seen : self.seen + n_fill] = rows[:n_fill]
+        if n_fill < m:
+            j = self.rng.integers(0, t[n_fill:] + 1)
+            acc = np.nonzero(j < self.size)[0]
+            if acc.size:
+                # later rows win when several replace the same slot
+                slots = j[acc][::-1]
+                src = (acc + n_fill)[::-1]
+                slots, first = np.unique(slots, return_index=True)
+                self.rows[slots] = rows[src[first]]
+        self.seen += m
+
+    def sample(self) -> np.ndarray:
+        return self.rows[: min(self.size, self.seen)]
+
+
+class RatioStream:
+    """Streaming state for one lens group: sketch, counters, optional sample."""
+
+    def __init__(self, reservoir_size: int, rng: np.random.Generator):
+        self.sketch = LogRSketch()
+        self.n_missing = 0
+        self.n_missing_support = 0
+        self.reservoir = Reservoir(reservoir_size, 4, rng)
+
+    def update(self, logR, logR_low, logR_high, missing) -> None:
+        ok = np.isfinite(logR)
+        self.sketch.update(logR[ok])
+        miss = missing & ok
+        self.n_missing += int(miss.sum())
+        self.n_missing_support += int(((logR_low[miss] <= 0) & (logR_high[miss] >= 0)).sum())
+        rows = np.column_stack([logR, logR_low, logR_high, missing.astype(float)])[ok]
+        self.reservoir.update(rows)
+
+    def result(self):
+        med = self.sketch.median()
+        s = 1.4826 * self.sketch.mad(med)
+        rows = self.reservoir.sample()
+        return med, s, self.sketch.n, rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3].astype(bool)
+
+
+def stream_ratio(chunks, re_range=(0.7, 2.0), reservoir_size=0, seed=0) -> dict:
+    """Single pass over catalog chunks; returns {"all": ..., <survey>: ...} RatioStreams."""
+    rng = np.random.default_rng(seed)
+    streams = {"all": RatioStream(reservoir_size, rng)}
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        logR, logR_low, logR_high, missing = _log_ratio(chunk, re_range)
+        streams["all"].update(logR, logR_low, logR_high, missing)
+        survey = chunk.survey.to_numpy()
+        for surv in np.unique(survey):
+            sel = survey == surv
+            if surv not in streams:
+                streams[surv] = RatioStream(reservoir_size, rng)
+            streams[surv].update(logR[sel], logR_low[sel], logR_high[sel], missing[sel])
+    return streams
+
+
+def iter_catalog_chunks(path: Path, chunksize: int = 100_000):
+    """Read a (forecast) lens catalog CSV chunk by chunk with the columns used by compute_ratio."""
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        if "sigma_SIS" not in chunk.columns:
+            chunk["sigma_SIS"] = np.nan
+        if "Reff_arcsec" not in chunk.columns:
+            chunk["Reff_arcsec"] = np.nan
+        if "survey" not in chunk.columns:
+            chunk["survey"] = "unknown"
+        chunk["survey"] = chunk["survey"].fillna("unknown").astype(str)
+        yield chunk
 
 
 def per_survey(df):
@@ -102,7 +276,46 @@ def per_survey(df):
     return rows
 
 
+def main_streaming(catalog: Path, chunksize: int, reservoir_size: int, seed: int = 0):
+    """Survey-scale variant of main(): one pass over the catalog, flat memory."""
+    streams = stream_ratio(iter_catalog_chunks(catalog, chunksize), reservoir_size=reservoir_size, seed=seed)
+    med, s, n, *_ = streams["all"].result()
+    print(f"Total N={n}, median(log10 R)={med:.4f} dex, scatter={s:.4f} dex")
+    rows = []
+    for surv in sorted(k for k in streams if k != "all"):
+        med_s, s_s, n_s, *_ = streams[surv].result()
+        rows.append((surv, n_s, med_s, s_s))
+        print(f"  {surv}: N={n_s}, median={med_s:.4f} dex, scatter={s_s:.4f} dex")
+    scale_factors = {}
+    for surv, _, med_s, _ in rows:
+        f = 10 ** (0.5 * med_s)
+        scale_factors[surv] = f
+        print(f"Suggested v_c scale for {surv}: divide by {f:.3f} (to zero median)")
+    if "boss" in scale_factors:
+        # a constant shift leaves the MAD unchanged
+        med_b, s_b, *_ = streams["boss"].result()
+        med_b -= 2 * np.log10(scale_factors["boss"])
+        print(f"BOSS after internal scale: median={med_b:.4f} dex, scatter={s_b:.4f} dex")
+        boss = streams["boss"]
+        if boss.n_missing:
+            print(f"BOSS Re-missing lenses supportive via interval: {boss.n_missing_support}/{boss.n_missing}")
+    clipped = streams["all"].sketch.n_clipped
+    if clipped:
+        print(f"[warn] {clipped} lenses outside the sketch range were clipped")
+    return streams
+
+
 def main():
+    ap = argparse.ArgumentParser(description="H1 ratio test (log10 R = theta_p c^2 / 2π v_c^2).")
+    ap.add_argument("--catalog", type=Path, default=None,
+                    help="forecast lens catalog CSV; processed in chunks instead of load_all()")
+    ap.add_argument("--chunksize", type=int, default=100_000)
+    ap.add_argument("--reservoir", type=int, default=0,
+                    help="keep a uniform sample of this many lenses per survey (for plotting)")
+    args = ap.parse_args()
+    if args.catalog is not None:
+        main_streaming(args.catalog, args.chunksize, args.reservoir)
+        return
     df = load_all()
     med, s, n, logR, logR_low, logR_high, missing = compute_ratio(df)
     print(f"Total N={n}, median(log10 R)={med:.4f} dex, scatter={s:.4f} dex")